@@ -0,0 +1,109 @@
+"""
+SiEPIC Analysis Package benchmark.
+
+Module:     Run time of analysis.calibrate_envelope against the original
+            implementation (a new quadratic polyfit for every rejected
+            segment) on the example Bragg grating sweep, for N_seg of 25,
+            325 and 2000, one device at a time and as a block of devices,
+            and of the full resolution 'rolling' envelope method.
+
+Usage:      python benchmarks/bench_calibrate_envelope.py [repeat]
+
+"""
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+import siepic_analysis_package as siap
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), '..', 'examples')
+DATA = os.path.join(EXAMPLES, 'ex_Bragg_analysis', 'SOI_SiO2_cband', 'data')
+
+
+def calibrate_envelope_reference(wavl, data_envelope, data, tol=3.0, N_seg=25,
+                                 fitOrder=4, direction='left'):
+    """Original implementation, kept as the benchmark reference."""
+    idxSteps = int(np.floor(np.size(data_envelope)/N_seg))
+    x = []
+    y = []
+    for i in range(N_seg):
+        idx = i * idxSteps
+        y.append(data_envelope[idx])
+        x.append(wavl[idx])
+
+    x_envelope = []
+    y_envelope = []
+    if direction == 'left':
+        tracker = y[0]
+        for idx, val in enumerate(y):
+            if np.abs(val-tracker) < tol:
+                x_envelope.append(x[idx])
+                y_envelope.append(val)
+                tracker = val
+            else:
+                oracle = np.poly1d(np.polyfit(x_envelope, y_envelope, 2))
+                y_oracle = oracle(x)
+                if np.abs(val-y_oracle[idx]) < tol:
+                    tracker = val
+    else:
+        tracker = y[-1]
+    for idx, val in reversed(list(enumerate(y))):
+        if np.abs(val-tracker) < tol:
+            x_envelope.append(x[idx])
+            y_envelope.append(val)
+            tracker = val
+        else:
+            oracle = np.poly1d(np.polyfit(x_envelope, y_envelope, 2))
+            y_oracle = oracle(x)
+            if np.abs(val-y_oracle[idx]) < tol:
+                tracker = val
+
+    envelope = np.poly1d(np.polyfit(x_envelope, y_envelope, fitOrder))
+    ref = envelope(wavl)
+    return np.array(data)-np.array(ref), ref, x_envelope, y_envelope
+
+
+def run(func, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(repeat=3):
+    warnings.simplefilter('ignore', np.exceptions.RankWarning)
+    devices, _ = siap.analysis.load_directory(DATA, workers=1)
+    wavl = devices[0].wavl
+    envelopes = np.array([device.pwr[0] for device in devices])
+    data = np.array([device.pwr[1] for device in devices])
+    print("%d devices, %d points" % envelopes.shape)
+
+    for N_seg in [25, 325, 2000]:
+        # check both implementations agree before timing them
+        calibrated, _, x_envelope, _ = siap.analysis.calibrate_envelope(
+            wavl, envelopes, data, N_seg=N_seg)
+        for i in range(len(devices)):
+            ref = calibrate_envelope_reference(wavl, envelopes[i], data[i], N_seg=N_seg)
+            assert np.array_equal(x_envelope[i], ref[2]), (N_seg, i)
+            assert np.allclose(calibrated[i], ref[0], atol=1e-3), (N_seg, i)
+
+        t_ref = run(lambda: [calibrate_envelope_reference(wavl, envelopes[i], data[i], N_seg=N_seg)
+                             for i in range(len(devices))], repeat)
+        t_new = run(lambda: [siap.analysis.calibrate_envelope(wavl, envelopes[i], data[i], N_seg=N_seg)
+                             for i in range(len(devices))], repeat)
+        t_block = run(lambda: siap.analysis.calibrate_envelope(wavl, envelopes, data, N_seg=N_seg),
+                      repeat)
+        t_rolling = run(lambda: siap.analysis.calibrate_envelope(wavl, envelopes, data, N_seg=N_seg,
+                                                                 method='rolling'), repeat)
+        print("N_seg = %4d  reference %8.2f ms  per device %7.2f ms  block %7.2f ms  speedup %6.1fx"
+              "  rolling block %7.2f ms"
+              % (N_seg, 1e3 * t_ref, 1e3 * t_new, 1e3 * t_block, t_ref / t_block, 1e3 * t_rolling))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
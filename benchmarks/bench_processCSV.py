@@ -0,0 +1,100 @@
+"""
+SiEPIC Analysis Package benchmark.
+
+Module:     Throughput of analysis.processCSV, cold and from the parse cache,
+            against the original row-by-row parser on the example Fotonica
+            CSV files.
+
+Usage:      python benchmarks/bench_processCSV.py [repeat]
+
+"""
+import glob
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import siepic_analysis_package as siap
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+
+def processCSV_reference(f_name):
+    """Original csv.reader based parser, kept as the benchmark reference."""
+    import csv
+    with open(f_name, newline='') as csvfile:
+        cursor = csv.reader(csvfile, delimiter=',', quotechar='"')
+        pwr = None
+        for row in cursor:
+            row = ' '.join(row).strip("#").strip()
+            if "Device ID:" in row:
+                deviceID = row.split('\t')[1].strip()
+            if "Device coordinates (gds):" in row:
+                coordsGDS = row.split('\t')[1].strip()
+            if "Sweep speed:" in row:
+                sweepSpd = float(row.split('\t')[1].strip(' nm/s'))
+            if "Laser power:" in row:
+                sweepPwr = float(row.split('\t')[1].strip(' dBm'))
+            if "Wavelength step-size:" in row:
+                wavlStep = float(row.split('\t')[1].strip(' nm'))
+            if "Start wavelength:" in row:
+                wavlStart = float(row.split('\t')[1].strip(' nm'))
+            if "Stop wavelength:" in row:
+                wavlStop = float(row.split('\t')[1].strip(' nm'))
+            if "wavelength " in row:
+                wavl = row.split(' ')
+                wavl = [float(i) for i in wavl[1:]]
+            if "channel_" in row:
+                if pwr is not None:
+                    channel = row.split(' ')
+                    channel = [float(i) for i in channel[1:]]
+                    pwr.append(channel)
+                else:
+                    pwr = row.split(' ')
+                    pwr = [[float(i) for i in pwr[1:]]]
+    return dict(deviceID=deviceID, coordsGDS=coordsGDS, sweepSpd=sweepSpd,
+                sweepPwr=sweepPwr, wavlStep=wavlStep, wavlStart=wavlStart,
+                wavlStop=wavlStop, wavl=wavl, pwr=pwr)
+
+
+def run(parser, files, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for f in files:
+            parser(f)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(repeat=3):
+    files = sorted(glob.glob(os.path.join(EXAMPLES, '**', '*.csv'), recursive=True))
+    size = sum(os.path.getsize(f) for f in files) / 1e6
+
+    # check both parsers agree before timing them, and fill the parse cache
+    siap.cache.parse_cache.directory = tempfile.mkdtemp(prefix='siap_bench_')
+    for f in files:
+        siap.analysis.processCSV(f)
+    for f in files:
+        ref = processCSV_reference(f)
+        device = siap.analysis.processCSV(f, use_cache=False)
+        for key in ['deviceID', 'coordsGDS', 'sweepSpd', 'sweepPwr',
+                    'wavlStep', 'wavlStart', 'wavlStop']:
+            assert getattr(device, key) == ref[key], (f, key)
+        assert np.array_equal(device.wavl, ref['wavl']), f
+        assert np.array_equal(device.pwr, ref['pwr'], equal_nan=True), f
+
+    t_ref = run(processCSV_reference, files, repeat)
+    t_new = run(lambda f: siap.analysis.processCSV(f, use_cache=False), files, repeat)
+    t_warm = run(siap.analysis.processCSV, files, repeat)  # cache filled above
+    print("%d files, %.1f MB" % (len(files), size))
+    print("reference parser : %8.3f s  (%6.1f MB/s)" % (t_ref, size / t_ref))
+    print("processCSV       : %8.3f s  (%6.1f MB/s)" % (t_new, size / t_new))
+    print("processCSV cached: %8.3f s  (%6.2f ms/file)" % (t_warm, 1e3 * t_warm / len(files)))
+    print("speedup          : %8.1fx" % (t_ref / t_new))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
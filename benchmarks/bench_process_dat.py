@@ -0,0 +1,144 @@
+"""
+SiEPIC Analysis Package benchmark.
+
+Module:     Run time of lumerical.process_dat against the original
+            implementation (line by line parsing into Python lists) on the
+            example grating coupler .dat file, scaled up synthetically to a
+            multi-port, multi-mode component with thousands of frequency
+            points per S-parameter block, and of writing the component back
+            with sparameters.to_dat. Also times loading the component lazily,
+            from the memory-mapped .dat file and from its binary sidecar,
+            with one and with every dataset accessed.
+
+Usage:      python benchmarks/bench_process_dat.py [ports] [modes] [points] [repeat]
+
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import siepic_analysis_package as siap
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), '..', 'examples')
+DAT = os.path.join(EXAMPLES, 's_param_file', 'grating_coupler.dat')
+
+
+def process_dat_reference(file_path, name):
+    """Original implementation, kept as the benchmark reference."""
+    spar = siap.lumerical.sparameters(name=name)
+    port_pattern = re.compile(r'\["(.*?)","(.*?)"\]')
+    data_pattern = re.compile(r'\("(.*?)","(.*?)",(\d+),"(.+?)",(\d+),"(.+?)",?(.*?)\)')
+
+    with open(file_path, "r") as f:
+        lines = f.readlines()
+        i = 0
+        while i < len(lines):
+            line = lines[i].strip()
+            port_match = port_pattern.match(line)
+            data_match = data_pattern.match(line)
+            if port_match:
+                port_name, port_direction = port_match.groups()
+                spar.add_port(port_name, port_direction)
+            elif data_match:
+                (out_port, mode_label, out_modeid, in_port, in_modeid, data_type,
+                 group_delay) = data_match.groups()
+                i += 1
+                num_points, _ = map(int, lines[i].strip().strip("()").split(","))
+                freq_data = []
+                for _ in range(num_points):
+                    i += 1
+                    f, s_mag, s_phase = map(float, lines[i].strip().split())
+                    freq_data.append((f, s_mag, s_phase))
+                f = [i[0] for i in freq_data]
+                s_mag = [i[1] for i in freq_data]
+                s_phase = [i[2] for i in freq_data]
+                spar.add_data(in_port, out_port, mode_label, in_modeid, out_modeid,
+                              data_type, group_delay, f, s_mag, s_phase)
+            i += 1
+    return spar
+
+
+def write_scaled(path, ports, modes, points):
+    """Write a synthetic component built from the grating coupler response."""
+    gc = siap.lumerical.process_dat(DAT, verbose=False)
+    f_gc = np.asarray(gc.data[1].f)
+    f = np.linspace(f_gc[0], f_gc[-1], points)
+    rng = np.random.default_rng(0)
+    with open(path, 'w') as file:
+        for p in range(ports):
+            file.write('["port %d","%s"]\n' % (p + 1, 'LEFT' if p % 2 == 0 else 'RIGHT'))
+        for out_port in range(ports):
+            for in_port in range(ports):
+                for out_mode in range(modes):
+                    for in_mode in range(modes):
+                        source = gc.data[rng.integers(len(gc.data))]
+                        mag = np.interp(f, f_gc, source.s_mag) * rng.uniform(0.5, 1)
+                        phase = np.interp(f, f_gc, source.s_phase) + rng.uniform(-np.pi, np.pi)
+                        file.write('("port %d","TE",%d,"port %d",%d,"transmission",%.5e)\n'
+                                   % (out_port + 1, out_mode + 1, in_port + 1, in_mode + 1,
+                                      rng.uniform(0, 1e-13)))
+                        file.write('(%d, 3)\n' % points)
+                        np.savetxt(file, np.column_stack([f, mag, phase]), fmt='%.16e')
+
+
+def run(function, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(ports=8, modes=2, points=2000, repeat=3):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'component.dat')
+        write_scaled(path, ports, modes, points)
+        blocks = (ports * modes)**2
+        print("%d blocks x %d points, %.1f MB" % (blocks, points, os.path.getsize(path) / 1e6))
+
+        # check both implementations agree before timing them
+        spar = siap.lumerical.process_dat(path, verbose=False)
+        ref = process_dat_reference(path, 'component.dat')
+        assert [p.name for p in spar.ports] == [p.name for p in ref.ports]
+        for new, old in zip(spar.data, ref.data):
+            assert new.idn == old.idn and new.group_delay == old.group_delay
+            for field in ['f', 's_mag', 's_phase']:
+                assert np.array_equal(getattr(new, field), getattr(old, field)), field
+
+        t_ref = run(lambda: process_dat_reference(path, 'component.dat'), repeat)
+        t_new = run(lambda: siap.lumerical.process_dat(path, verbose=False), repeat)
+        print("reference %8.1f ms  process_dat %8.1f ms  speedup %5.1fx"
+              % (1e3 * t_ref, 1e3 * t_new, t_ref / t_new))
+
+        lazy = lambda: siap.lumerical.process_dat(path, verbose=False, lazy=True)
+        assert np.array_equal(lazy().to_array(), spar.to_array())
+        t_open = run(lazy, repeat)
+        t_s21 = run(lambda: lazy().S(1, 2).s_mag, repeat)
+        t_all = run(lambda: lazy().to_array(), repeat)
+        print("lazy:    open %6.1f ms  open + S21 %6.1f ms  open + all datasets %6.1f ms"
+              % (1e3 * t_open, 1e3 * t_s21, 1e3 * t_all))
+
+        # writing back reproduces the file exactly
+        copy = os.path.join(tmp, 'copy.dat')
+        t_write = run(lambda: spar.to_dat(copy), repeat)
+        with open(path, 'rb') as a, open(copy, 'rb') as b:
+            assert a.read() == b.read()
+        print("to_dat %8.1f ms" % (1e3 * t_write))
+
+        siap.lumerical.write_sidecar(path)
+        sidecar = siap.lumerical.process_dat(path, verbose=False)
+        assert np.array_equal(sidecar.to_array(), spar.to_array())
+        t_open = run(lambda: siap.lumerical.process_dat(path, verbose=False), repeat)
+        t_s21 = run(lambda: siap.lumerical.process_dat(path, verbose=False).S(1, 2).s_mag, repeat)
+        t_all = run(lambda: siap.lumerical.process_dat(path, verbose=False).to_array(), repeat)
+        print("sidecar: open %6.1f ms  open + S21 %6.1f ms  open + all datasets %6.1f ms"
+              % (1e3 * t_open, 1e3 * t_s21, 1e3 * t_all))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
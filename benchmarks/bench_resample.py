@@ -0,0 +1,76 @@
+"""
+SiEPIC Analysis Package benchmark.
+
+Module:     Run time of sparameters.resample against the original approach
+            (a Python loop over the entries of each component, interpolating
+            magnitude and unwrapped phase with np.interp) when converting a
+            library of multi-port, multi-mode components to a measurement grid.
+
+Usage:      python benchmarks/bench_resample.py [components] [ports] [modes] [points] [repeat]
+
+"""
+import sys
+import time
+
+import numpy as np
+
+import siepic_analysis_package as siap
+
+
+def resample_reference(spar, f_new):
+    """Original approach, kept as the benchmark reference."""
+    new = siap.lumerical.sparameters(name=spar.name)
+    for p in spar.ports:
+        new.add_port(p.name, p.direction)
+    for d in spar.data:
+        order = np.argsort(d.f, kind='stable')
+        f = np.asarray(d.f)[order]
+        s_mag = np.interp(f_new, f, np.asarray(d.s_mag)[order], left=np.nan, right=np.nan)
+        s_phase = np.interp(f_new, f, np.unwrap(np.asarray(d.s_phase)[order]),
+                            left=np.nan, right=np.nan)
+        new.add_data(d.in_port, d.out_port, d.mode_label, d.in_modeid, d.out_modeid,
+                     d.data_type, d.group_delay, f_new, s_mag, s_phase)
+    return new
+
+
+def library(components, ports, modes, points):
+    """Random components on a shared simulation grid."""
+    rng = np.random.default_rng(0)
+    f = np.linspace(1.8e14, 2.0e14, points)
+    shape = (points, ports, modes, ports, modes)
+    return [siap.lumerical.sparameters.from_array(
+        rng.uniform(0, 1, shape) * np.exp(1j * rng.uniform(-np.pi, np.pi, shape)), f,
+        name='component %d' % i) for i in range(components)]
+
+
+def run(function, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(components=20, ports=4, modes=2, points=2000, repeat=3):
+    spars = library(components, ports, modes, points)
+    # measurement grid, in frequency
+    f_new = np.sort(299792458 / np.linspace(1.5e-6, 1.6e-6, 10001))
+    print("%d components x %d entries x %d points -> %d points"
+          % (components, len(spars[0].data), points, f_new.size))
+
+    # check both implementations agree before timing them
+    for spar in spars[:2]:
+        new, ref = spar.resample(f_new), resample_reference(spar, f_new)
+        for a, b in zip(new.data, ref.data):
+            np.testing.assert_allclose(a.s_mag, b.s_mag, rtol=1e-12, atol=1e-15)
+            np.testing.assert_allclose(a.s_phase, b.s_phase, rtol=1e-12, atol=1e-12)
+
+    t_ref = run(lambda: [resample_reference(spar, f_new) for spar in spars], repeat)
+    t_new = run(lambda: [spar.resample(f_new) for spar in spars], repeat)
+    print("reference %8.1f ms  resample %8.1f ms  speedup %5.1fx"
+          % (1e3 * t_ref, 1e3 * t_new, t_ref / t_new))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:]])
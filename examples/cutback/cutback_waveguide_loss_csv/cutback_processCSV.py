@@ -39,14 +39,9 @@ def getDeviceParameter(deviceID, devicePrefix, deviceSuffix = ''):
 #%% crawl available data to choose file
 
 lengths = []
-devices = []
-for root, dirs, files in os.walk('data'):
-    if os.path.basename(root).startswith(device_prefix):
-        for file in files:
-            if file.endswith(".csv"):
-                device = siap.analysis.processCSV(root+r'\\'+file)
-                devices.append(device)
-                lengths.append(getDeviceParameter(device.deviceID, device_prefix, device_suffix))
+devices, errors = siap.analysis.load_directory('data', prefix=device_prefix, workers=1)
+for device in devices:
+    lengths.append(getDeviceParameter(device.deviceID, device_prefix, device_suffix))
 
 #%%
 # download .mat files from GitHub repo and parse it to a variable (data)
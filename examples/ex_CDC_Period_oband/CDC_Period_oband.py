@@ -42,26 +42,19 @@ def getDeviceParameter(deviceID, devicePrefix, deviceSuffix = ''):
 #%% crawl available data to choose files from the dataset
 tol = 3 # calibrate_envelope parameter
 N_seg = 25 # calibrate_envelope parameter
-period = []
-BW = []
-WL = []
-devices = []
-for root, dirs, files in os.walk('data'):
-    if os.path.basename(root).startswith(device_prefix):
-        for file in files:
-            if file.endswith(".csv"):
-                device = siap.analysis.processCSV(root+r'\\'+file)
-
-                device.dropCalib, device.ThruEnvelope, x, y = siap.analysis.calibrate_envelope( 
-                    device.wavl, device.pwr[port_thru], device.pwr[port_drop], 
-                    N_seg = N_seg, tol = tol, verbose = False)
-
-                [device.BW, device.WL] = siap.analysis.bandwidth(device.wavl, device.dropCalib)
-
-                devices.append(device)
-                period.append(getDeviceParameter(device.deviceID, device_prefix, device_suffix))
-                WL.append(device.WL)
-                BW.append(device.BW)
+devices, errors = siap.analysis.load_directory('data', prefix=device_prefix, workers=1)
+period = [getDeviceParameter(device.deviceID, device_prefix, device_suffix) for device in devices]
+
+# calibrate and extract the bandwidth of the whole family at once
+family = siap.analysis.MeasurementSet.from_measurements(devices)
+dropCalib, ThruEnvelope, x, y = siap.analysis.calibrate_envelope(
+    family.wavl, family.channel(port_thru), family.channel(port_drop),
+    N_seg = N_seg, tol = tol, verbose = False)
+[BW, WL] = siap.analysis.bandwidth(family.wavl, dropCalib)
+
+for idx, device in enumerate(devices):
+    device.dropCalib, device.ThruEnvelope = dropCalib[idx], ThruEnvelope[idx]
+    device.BW, device.WL = BW[idx], WL[idx]
 
 #%%
 # plot all devices and overlay
@@ -50,19 +50,16 @@ plt.ylabel('Transmission (dB)', color = 'black')
 plt.xlabel('Wavelength (nm)', color = 'black')
 plt.title("Calibrated data (using baseline correction)")
 plt.savefig('data_calibrated.pdf')
-#%% apply SIAP getExtinctionRatio, getFSR, and getGroupIndex functions
+#%% apply SIAP extract_features function (extinction ratio, FSR, and group index)
 
-er_wavl_arr = []
-er_arr = []
-DL = 155.564e-6
+DL = 155.564e3 # length imbalance (nm)
 
 for device in devices:
-    device.er_wavl, device.er = siap.analysis.getExtinctionRatio(device.wavl, device.pwrCalib, prominence = 6)
-    device.fsr_wavl, device.fsr, _ = siap.analysis.getFSR(device.wavl, device.pwrCalib, prominence = 6)
-    device.ng = siap.analysis.getGroupIndex([i*1e-9 for i in device.fsr_wavl], [i*1e-9 for i in device.fsr], delta_length = DL)
-    device.couplingCoeff = []
-    for er in device.er:
-        device.couplingCoeff.append(0.5 + 0.5 * np.sqrt( 1/10**(er/10)))
+    features = siap.analysis.extract_features(device.wavl, device.pwrCalib, prominence = 6, delta_length = DL, kappa = True)
+    device.er_wavl, device.er = features['er_wavl'], features['er']
+    device.fsr_wavl, device.fsr = features['fsr_wavl'], features['fsr']
+    device.ng = features['ng']
+    device.couplingCoeff = 1 - features['kappa']
 
 plt.figure()
 for device in devices:
@@ -10,7 +10,6 @@ import os
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
-from scipy.interpolate import interp1d
 font = {'family': 'normal',
         'size': 18}
 
@@ -99,74 +98,23 @@ def extract_periods(wavelength, transmission, min_prominence=.25, plot=False):
         
     return midpoints, periods, extinction_ratios
 
-def average_arrays(x_values, y_values_list, x_new, plot=False):
-    """
-    x_values: list of arrays, each containing the x-values for one of the y-value arrays
-    y_values_list: list of arrays, the y-value arrays to be averaged
-    x_new: array, the new common x-grid to interpolate onto
-    plot: boolean, if True the function will create a plot of the averaged data with error bars
-    """
-    from scipy.interpolate import interp1d
-    import numpy as np
-    # List to store the interpolated y-values
-    y_values_interp_list = []
-    
-    # Interpolate each y-value array onto the new x-grid
-    for x, y in zip(x_values, y_values_list):
-        f = interp1d(x, y, bounds_error=False, fill_value=np.nan)
-        y_new = f(x_new)
-        y_values_interp_list.append(y_new)
-    
-    # Convert the list of interpolated y-value arrays into a 2D array
-    y_values_interp_array = np.array(y_values_interp_list)
-    
-    # Compute the mean of the interpolated y-value arrays, ignoring NaNs
-    y_average = np.nanmean(y_values_interp_array, axis=0)
-    
-    # Replace any remaining NaNs in the average with the closest valid value
-    mask = np.isnan(y_average)
-    y_average[mask] = np.interp(np.flatnonzero(mask), np.flatnonzero(~mask), y_average[~mask])
-    
-    # Compute the standard deviation of the interpolated y-value arrays, ignoring NaNs
-    y_std = np.nanstd(y_values_interp_array, axis=0)
+#%% crawl available data to choose data files
+devices, errors = siap.analysis.load_directory('data', prefix=device_prefix, workers=1)
+# smooth the cross port of all the devices in one pass
+family = siap.analysis.MeasurementSet.from_measurements(devices)
+smoothed = siap.core.smooth(family.wavl, family.channel(port_cross), window=window)
+for device, pwr_smooth in zip(devices, smoothed):
+    device.length = getDeviceParameter(device.deviceID, device_prefix, device_suffix)
+    device.wavl, pwr_cross = siap.analysis.truncate_data(device.wavl, pwr_smooth, wavl_range[0], wavl_range[1])
+    [device.cross_T, device.fit] = siap.analysis.baseline_correction([device.wavl, pwr_cross])
+    midpoints, fsr, extinction_ratios = extract_periods(device.wavl, device.cross_T, min_prominence=peak_prominence, plot=False)
     
-    # Replace any NaNs in the standard deviation with the closest valid value
-    mask_std = np.isnan(y_std)
-    y_std[mask_std] = np.interp(np.flatnonzero(mask_std), np.flatnonzero(~mask_std), y_std[~mask_std])
+    device.ng_wavl = midpoints
+    device.ng = siap.analysis.getGroupIndex([i*1e-9 for i in device.ng_wavl], [i*1e-9 for i in fsr], delta_length = DL)
 
-    if plot:
-        plt.figure(figsize=(10,6))
-        plt.plot(x_new, y_average, 'k-', label='Average')
-        plt.fill_between(x_new, y_average - y_std, y_average + y_std, color='gray', alpha=0.2, label='Std dev')
-        plt.title('Averaged Data')
-        plt.xlabel('X')
-        plt.ylabel('Y')
-        plt.legend(loc='best')
-        plt.grid(True)
-        plt.show()
-
-    return x_new, y_average, y_std, y_average
-
-#%% crawl available data to choose data files
-devices = []
-
-for root, dirs, files in os.walk('data'):
-    if os.path.basename(root).startswith(device_prefix):
-        for file in files:
-            if file.endswith(".csv"):
-                device = siap.analysis.processCSV(root+r'\\'+file)
-                devices.append(device)
-                device.length = getDeviceParameter(device.deviceID, device_prefix, device_suffix)
-                device.wavl, device.pwr[port_cross] = siap.analysis.truncate_data(device.wavl, siap.core.smooth(device.wavl, device.pwr[port_cross], window=window), wavl_range[0], wavl_range[1])
-                [device.cross_T, device.fit] = siap.analysis.baseline_correction([device.wavl, device.pwr[port_cross]])
-                midpoints, fsr, extinction_ratios = extract_periods(device.wavl, device.cross_T, min_prominence=peak_prominence, plot=False)
-                
-                device.ng_wavl = midpoints
-                device.ng = siap.analysis.getGroupIndex([i*1e-9 for i in device.ng_wavl], [i*1e-9 for i in fsr], delta_length = DL)
-
-                device.kappa = []
-                for er in extinction_ratios:
-                    device.kappa.append(0.5 - 0.5 * np.sqrt( 1/10**(er/10)))
+    device.kappa = []
+    for er in extinction_ratios:
+        device.kappa.append(0.5 - 0.5 * np.sqrt( 1/10**(er/10)))
 
 
 #%% Group index plotting
@@ -181,9 +129,10 @@ for device in devices:
     ax1.scatter(device.ng_wavl, device.ng, color='black', linewidth=0.1)
 ax1.plot(wavl_sim, ng_500nm, color='blue', label='Simulated 350 nm X 220 nm')
 ax1.set_xlim(np.min([np.min(i.ng_wavl) for i in devices]), np.max([np.max(i.ng_wavl) for i in devices]))
-ng_avg_wavl, ng_avg, ng_std, ng_std_avg = average_arrays([i.ng_wavl for i in devices], [i.ng for i in devices], np.linspace(wavl_range[0], wavl_range[1]))
+# average of the devices covering each wavelength (NaN where none does)
+ng_avg_wavl, ng_avg, ng_std, ng_count = siap.analysis.average_responses([i.ng_wavl for i in devices], [i.ng for i in devices], np.linspace(wavl_range[0], wavl_range[1]))
 ax1.plot(ng_avg_wavl, ng_avg, '--', color='black', label='Average')
-ax1.fill_between(np.linspace(wavl_range[0], wavl_range[1]), ng_std_avg - ng_std, ng_std_avg + ng_std, color='gray', alpha=0.2, label='Std dev')
+ax1.fill_between(ng_avg_wavl, ng_avg - ng_std, ng_avg + ng_std, color='gray', alpha=0.2, label='Std dev')
 ax1.legend()
 ax1.set_ylabel('Group index')
 ax1.set_xlabel('Wavelength [nm]')
@@ -197,7 +146,7 @@ def sort_devices_by_length(devices):
 devices = sort_devices_by_length(devices)
 
 # Extracting wavelength and device length data
-ng_wavl = np.array([device.ng_wavl for device in devices])
+ng_wavl = [device.ng_wavl for device in devices]
 device_lengths = np.array([device.length for device in devices])
 
 # Creating a common wavelength grid
@@ -206,13 +155,8 @@ common_ng_wavl = np.unique(np.concatenate(ng_wavl))
 # Creating meshgrid for wavelength and device length
 X, Y = np.meshgrid(common_ng_wavl, device_lengths)
 
-# Creating an empty 2D array for coupling coefficient data
-Z = np.empty_like(X)
-
-# Populating the 2D array with coupling coefficient data
-for i, device in enumerate(devices):
-    interp_func = interp1d(device.ng_wavl, device.kappa, kind='linear', fill_value='extrapolate')
-    Z[i, :] = interp_func(common_ng_wavl)
+# Coupling coefficient of all the devices on the common grid, in one pass
+Z = siap.analysis.resample(ng_wavl, [device.kappa for device in devices], common_ng_wavl, fill_value='extrapolate')
 
 # Plotting the contour map.0
 plt.contourf(X, Y, Z, cmap='viridis')
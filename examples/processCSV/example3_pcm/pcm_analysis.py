@@ -133,27 +133,15 @@ def getWaveguideLoss(device_prefix, device_suffix, port, wavl, pol, plot=True):
         return parameter
 
     lengths = []
-    devices = []
 
-    # loopty loop to go through data structure
     # data structure: (all data folder) ->
     # (polarization and wavelength folder) ->
     # (measurements folders) -> (csv file in the measurement folder)
-    # iterate through folders in directory to find (all data folder, fname_data)
-    for root, dirs, files in os.walk(fname_data):
-        # identify correct subfolder with intended polarization and wavelength
-        for dir in dirs:
-            if dir == pol + '_' + str(wavl):
-                # iterate through the folder to find the data
-                for root, dirs, files in os.walk(fname_data+r'\\'+dir):
-                    if os.path.basename(root).startswith(device_prefix):
-                        for file in files:
-                            if file.endswith(".csv"):
-                                device = siap.analysis.processCSV(root+r'\\'+file)
-                                devices.append(device)
-                                lengths.append(getDeviceParameter(
-                                    device.deviceID, device_prefix,
-                                    device_suffix))
+    devices, errors = siap.analysis.load_directory(
+        os.path.join(fname_data, pol + '_' + str(wavl)), prefix=device_prefix)
+    for device in devices:
+        lengths.append(getDeviceParameter(device.deviceID, device_prefix,
+                                          device_suffix))
 
     print(devices)
     # create a subdirectory to place plots in
@@ -225,13 +213,14 @@ def getWaveguideLoss(device_prefix, device_suffix, port, wavl, pol, plot=True):
 # %% Generate waveguide loss plots
 
 
-for devices in device_sets:
-    for set in devices:
-        getWaveguideLoss(
-            set["device_prefix"],
-            set["device_suffix"],
-            set["port"],
-            set["wavl"],
-            set["pol"], plot=True)
+if __name__ == '__main__':
+    for devices in device_sets:
+        for set in devices:
+            getWaveguideLoss(
+                set["device_prefix"],
+                set["device_suffix"],
+                set["port"],
+                set["wavl"],
+                set["pol"], plot=True)
 
 # %%
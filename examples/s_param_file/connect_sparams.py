@@ -0,0 +1,43 @@
+"""
+SiEPIC Analysis Package
+
+Author:     Mustafa Hammood
+            Mustafa@siepic.com
+
+Example:    Link budget of a grating coupler -> waveguide -> grating coupler
+            circuit, cascading S-parameters loaded from a Lumerical .dat file
+"""
+#%%
+import os
+import numpy as np
+import matplotlib.pyplot as plt
+import siepic_analysis_package as siap
+
+if __name__ == "__main__":
+    sparams_dir = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "grating_coupler.dat",
+    )
+    gc = siap.lumerical.process_dat(file_path=sparams_dir, name="grating_coupler", verbose=False)
+
+    # 1 cm waveguide with 3 dB/cm loss and a group index of 4.2
+    c = 299792458
+    length = 1e-2
+    f, _, _ = gc.array_axes()
+    S_wg = np.zeros((f.size, 2, 1, 2, 1), dtype=complex)
+    S_wg[:, 1, 0, 0, 0] = S_wg[:, 0, 0, 1, 0] = (
+        10 ** (-3 / 20) * np.exp(-1j * 2 * np.pi * f * 4.2 * length / c))
+    waveguide = siap.lumerical.sparameters.from_array(S_wg, f, name="waveguide")
+
+    # fiber -> grating coupler (port 1 -> port 2) -> waveguide -> grating coupler -> fiber
+    link = siap.lumerical.netlist(
+        {"gc_in": gc, "wg": waveguide, "gc_out": gc},
+        [(("gc_in", 2), ("wg", 1)), (("wg", 2), ("gc_out", 2))],
+        name="link",
+        external=[("gc_in", 1), ("gc_out", 1)],
+    )
+    link.plot()
+
+    transmission = link.S(in_port=1, out_port=2)
+    print("Peak link transmission: %.2f dB" % np.max(10 * np.log10(transmission.s_mag**2)))
+    plt.show()
@@ -7,9 +7,13 @@ Author:     Mustafa Hammood
 Module: Data processing and analysis functionalities of the analysis package
 
 """
+import collections
 import numpy as np
 import math
 
+from siepic_analysis_package import cache
+from siepic_analysis_package.grid import WavelengthGrid
+
 
 class measurement(object):
     """
@@ -56,9 +60,12 @@ class measurement(object):
         Number of stitched wavelength ranges in the sweep.
     initRange : float
         Initial range of the detector. Units : dBm
-    wavl : list
+    wavl : list, ndarray or WavelengthGrid
         Wavelength points in the sweep. Units : nm
-    pwr : list
+        processCSV stores a WavelengthGrid shared by the devices of the same
+        sweep settings, so its points are read-only: use np.array(wavl) for
+        a writable copy.
+    pwr : list or ndarray
         List of detector readout of each channel at each wavelength
         and applied voltage in the case of active measurements.
         Format: [ [ch1_v1, ch1_v2, ...], [ch2_v1, ch2_v2, ...], ...]
@@ -469,22 +476,281 @@ class measurement(object):
         return fig, ax
 
 
-def measurementEHVA(desiredDevice):
+_MEASUREMENT_FIELDS = measurement.__init__.__code__.co_varnames[
+    1:measurement.__init__.__code__.co_argcount]
+
+
+def _where(meta, size, criteria):
+    """Indices of the rows of a columnar metadata table matching all criteria."""
+    mask = np.ones(size, dtype=bool)
+    for field, criterion in criteria.items():
+        if field not in meta:
+            raise KeyError("Unknown metadata field: " + field)
+        column = meta[field]
+        if callable(criterion):
+            mask &= np.array([bool(criterion(i)) for i in column], dtype=bool)
+        elif isinstance(criterion, (list, tuple, set)):
+            mask &= np.isin(column, list(criterion))
+        else:
+            mask &= column == criterion
+    return np.flatnonzero(mask)
+
+
+class MeasurementSet(object):
     """
-    Creates a measurement object out of the pandas dataframe containing only 1 component ID
+    A set of measurements sharing the same wavelength grid, stored in columns.
 
-    Parameters
+    Attributes
     ----------
-    desiredDevice : pandas dataframe
-        dataframe containing all information regarding a single device
+    wavl : ndarray
+        Wavelength points shared by all the devices. Units : nm
+        Format: (points,)
+    pwr : ndarray
+        Detector readout of every device.
+        Format: (devices, channels, points)
+    meta : dict
+        Columnar metadata table, one array of length devices per field in
+        MeasurementSet.fields (deviceID, dieID, coordsGDS, sweep settings, ...).
 
-    Returns
+    Methods
     -------
-    device : measurement object
-        DESCRIPTION.
+    from_measurements(devices)
+        Build a set from a list of measurement objects.
+    columns(meta, size)
+        Convert per-field metadata lists into the columnar table format.
+    channel(channel)
+        Returns the (devices, points) block of a channel.
+    where(**criteria)
+        Returns the indices of the devices matching the metadata criteria.
+    select(**criteria)
+        Returns the subset of devices matching the metadata criteria.
+    """
+
+    fields = ['deviceID', 'deviceDescription', 'dieID', 'user', 'start',
+              'finish', 'coordsGDS', 'coordsMotor', 'date', 'laser',
+              'detector', 'sweepSpd', 'sweepPwr', 'wavlStep', 'wavlStart',
+              'wavlStop', 'stitch', 'initRange']
+    numeric_fields = ['sweepSpd', 'sweepPwr', 'wavlStep', 'wavlStart',
+                      'wavlStop', 'stitch', 'initRange']
+
+    def __init__(self, wavl, pwr, meta=None):
+        self.wavl = np.asarray(wavl, dtype=float)
+        self.pwr = np.asarray(pwr, dtype=float)
+        if self.pwr.ndim != 3 or self.pwr.shape[2] != self.wavl.size:
+            raise ValueError("pwr must be shaped (devices, channels, points) "
+                             "with points matching wavl.")
+        self.meta = self.columns(meta or {}, len(self))
+
+    @classmethod
+    def columns(cls, meta, size):
+        """
+        Convert per-field lists of metadata into the columnar table format.
+
+        Numeric fields become float arrays (None as NaN), the others object
+        arrays. Missing fields are filled with None.
+
+        Parameters
+        ----------
+        meta : dict
+            Lists of metadata values keyed by field name.
+        size : int
+            Number of devices.
+
+        Returns
+        -------
+        dict
+            Metadata column arrays keyed by field name.
+
+        """
+        columns = {}
+        for field in cls.fields:
+            column = meta.get(field, [None] * size)
+            if field in cls.numeric_fields:
+                column = np.array([np.nan if i is None else i for i in column],
+                                  dtype=float)
+            else:
+                column = np.array(column, dtype=object)
+            if column.shape != (size,):
+                raise ValueError("Metadata column " + field +
+                                 " does not match the number of devices.")
+            columns[field] = column
+        return columns
+
+    @classmethod
+    def from_measurements(cls, devices):
+        """
+        Build a measurement set from a list of measurement objects.
+
+        Parameters
+        ----------
+        devices : list
+            Measurement objects, all sampled on the same wavelength grid
+            with the same number of channels.
+
+        Returns
+        -------
+        MeasurementSet
+            Set holding the spectra of all the devices in a single block.
+
+        """
+        devices = list(devices)
+        if not devices:
+            raise ValueError("Cannot build a measurement set without devices.")
+        grid = devices[0].wavl
+        wavl = np.asarray(grid, dtype=float)
+        channels = np.shape(devices[0].pwr)[0]
+        pwr = np.empty((len(devices), channels, wavl.size))
+        for idx, device in enumerate(devices):
+            # devices sharing an interned grid skip the comparison
+            if device.wavl is not grid and not np.array_equal(device.wavl, wavl):
+                raise ValueError("Device " + str(device.deviceID) +
+                                 " is not on the shared wavelength grid.")
+            pwr[idx] = device.pwr
+        meta = {field: [getattr(device, field, None) for device in devices]
+                for field in cls.fields}
+        return cls(wavl, pwr, meta)
+
+    def __len__(self):
+        return self.pwr.shape[0]
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __getitem__(self, key):
+        """Device view for an integer index, sub-set for slices, masks or index arrays."""
+        if isinstance(key, (int, np.integer)):
+            return self.device(key)
+        pwr = self.pwr[key]
+        if pwr.ndim != 3:
+            raise IndexError("Invalid measurement set index.")
+        meta = {field: column[key] for field, column in self.meta.items()}
+        return MeasurementSet(self.wavl, pwr, meta)
+
+    def device(self, idx):
+        """
+        Zero-copy measurement object of a single device of the set.
+
+        The returned object's wavl and pwr are views into the set's arrays.
+
+        Parameters
+        ----------
+        idx : int
+            Index of the device in the set.
+
+        Returns
+        -------
+        device : measurement object
+
+        """
+        fields = dict.fromkeys(_MEASUREMENT_FIELDS)
+        for field, column in self.meta.items():
+            value = column[idx]
+            if field in self.numeric_fields:
+                value = None if np.isnan(value) else float(value)
+            fields[field] = value
+        fields['wavl'] = self.wavl
+        fields['pwr'] = self.pwr[idx]
+        return measurement(**fields)
+
+    def channel(self, channel):
+        """
+        Spectra of a single channel across all the devices of the set.
+
+        Parameters
+        ----------
+        channel : int
+            Channel index.
+
+        Returns
+        -------
+        ndarray
+            View of the (devices, points) data block of the channel.
+
+        """
+        return self.pwr[:, channel, :]
+
+    def where(self, **criteria):
+        """
+        Find the devices whose metadata matches all the given criteria.
+
+        Each criterion is a metadata field name set to either a value to be
+        equal to, a list/tuple/set of accepted values, or a callable
+        returning a boolean for a column value.
+        Example: where(dieID='12', sweepSpd=lambda v: v > 10)
+
+        Returns
+        -------
+        ndarray
+            Indices of the matching devices.
+
+        """
+        return _where(self.meta, len(self), criteria)
+
+    def select(self, **criteria):
+        """
+        Subset of the devices whose metadata matches all the given criteria.
+
+        See where() for the criteria format.
+
+        Returns
+        -------
+        MeasurementSet
+            Set containing only the matching devices.
+
+        """
+        return self[self.where(**criteria)]
+
+
+_EHVA_RESPONSIVITY = 'Measured output current (A), multiplied by the polarity of the photodiode'
+_EHVA_S21_RAW = 'S21 raw on-chip photodetector and external modulator'
+_EHVA_S21_CAL = 'S21 of calibrated photodetector and external modulator'
+
+
+def _fromstrings(strings):
+    """Decode a sequence of comma-separated value strings with a single parse."""
+    strings = list(strings)
+    counts = [s.count(',') + 1 for s in strings]
+    values = np.fromstring(','.join(strings), dtype=float, sep=',')
+    if values.size != sum(counts):
+        # malformed or empty cells, fall back to the per-string behaviour
+        return [np.fromstring(s, dtype=float, sep=',') for s in strings]
+    # copies, so that a small cell does not keep the whole joined buffer alive
+    return [i.copy() for i in np.split(values, np.cumsum(counts)[:-1])]
+
+
+def _decodeEHVA(columns):
+    """Decode the array cells of an EHVA export, one batched parse per result type.
 
+    Returns a dictionary of object arrays (one entry per row, None for
+    undecoded cells) for the ResultDomain, ResultValue and EXPpwr columns.
     """
-    
+    metric = columns['ResultMetricName']
+    name = columns['ResultName']
+    domain = columns['DomainMetricName']
+    description = columns.get('ResultDescription', np.full(len(metric), None))
+    arrays = ((metric == 'optical power')
+              | ((metric == 'uCurrent') & (domain == 'voltage') & (name == 'Current'))
+              | ((metric == 'optical return loss') & (name == 'PolarizationDependentLoss'))
+              | ((metric == 'power') & ((name == _EHVA_S21_RAW) | (name == _EHVA_S21_CAL))))
+    responsivity = ((metric == 'current') & (name != 'Dark current')
+                    & (description == _EHVA_RESPONSIVITY))
+
+    decoded = {}
+    for column, mask in [('ResultDomain', arrays | responsivity),
+                         ('ResultValue', arrays | responsivity),
+                         ('EXPpwr', responsivity)]:
+        decoded[column] = np.empty(len(metric), dtype=object)
+        for result_type in np.unique(metric[mask]):
+            rows = np.flatnonzero(mask & (metric == result_type))
+            values = _fromstrings(columns[column][rows])
+            for row, value in zip(rows, values):
+                decoded[column][row] = value
+    return decoded
+
+
+def _assembleEHVA(columns, decoded, rows):
+    """Build the measurement object of the given rows of a decoded EHVA export."""
     # Pre-initializing everything to None in case there is no data for it?
     componentName = None
     timestamp = None
@@ -494,15 +760,16 @@ def measurementEHVA(desiredDevice):
     wavl = None
     coordsGDS = None
     pwr = None
-    
-    componentName = desiredDevice.ComponentName.at[0]
-    deviceDescription = desiredDevice.ComponentDescription.at[0]
-    componentID = desiredDevice.ComponentId.at[0]
+
+    first = rows[0]
+    componentName = columns['ComponentName'][first]
+    deviceDescription = columns['ComponentDescription'][first]
+    componentID = columns['ComponentId'][first]
     deviceID = componentName + '_ID_' + str(componentID)
-    timestamp = desiredDevice.ResultCreated.at[0]     
-    dieID = str(desiredDevice.DieId.at[0])
-    coordsGDS = desiredDevice.OpticalPortPosition.at[0]
-    coordsGDS = coordsGDS.replace(","," ")  
+    timestamp = columns['ResultCreated'][first]
+    dieID = str(columns['DieId'][first])
+    coordsGDS = columns['OpticalPortPosition'][first]
+    coordsGDS = coordsGDS.replace(","," ")
 
     pwr = [[]]
     voltageExperimental = [[]]
@@ -517,129 +784,108 @@ def measurementEHVA(desiredDevice):
     IV_Bright =[[],[]]
     IV_Dark =[[],[]]
     IV_refPower = None
-    for ii in range(len(desiredDevice)): 
-        resultType = desiredDevice.ResultMetricName.at[ii]
-        domainType = desiredDevice.DomainMetricName.at[ii] 
-        if (resultType == 'optical power'):  
-            wavlString = desiredDevice.ResultDomain.at[ii]
-            wavl = np.fromstring(wavlString, dtype=float, sep=',')
+    for ii in rows:
+        resultType = columns['ResultMetricName'][ii]
+        domainType = columns['DomainMetricName'][ii]
+        if (resultType == 'optical power'):
+            wavl = decoded['ResultDomain'][ii]
             wavlStart = wavl[0]
             wavlStop = wavl[-1]
             wavlStep = wavl[1] - wavl[0]
-            pwerString = desiredDevice.ResultValue.at[ii]
-            resultName = desiredDevice.ResultName.at[ii]
-            channel = np.fromstring(pwerString, dtype=float, sep=',')
+            resultName = columns['ResultName'][ii]
+            channel = decoded['ResultValue'][ii]
             channel = channel.astype(float)
             channel[channel > 0] = np.nan
             if (resultName == 'opticalPowerFirstOPM'):
                 pwr[0].append(channel)
-                voltageExperimental[0].append(round(desiredDevice.EXPvoltage.at[ii],3))
-                currentExperimental[0].append(round(desiredDevice.EXPcurrent.at[ii],3))
+                voltageExperimental[0].append(round(columns['EXPvoltage'][ii],3))
+                currentExperimental[0].append(round(columns['EXPcurrent'][ii],3))
             elif (resultName == 'opticalPowerSecondOPM'):
                 if (len(pwr) == 1):
                     pwr.append([channel])
-                    voltageExperimental.append([round(desiredDevice.EXPvoltage.at[ii],3)])
-                    currentExperimental.append([round(desiredDevice.EXPcurrent.at[ii],3)])
-                else:                       
+                    voltageExperimental.append([round(columns['EXPvoltage'][ii],3)])
+                    currentExperimental.append([round(columns['EXPcurrent'][ii],3)])
+                else:
                     pwr[1].append(channel)
-                    voltageExperimental[1].append(round(desiredDevice.EXPvoltage.at[ii],3))
-                    currentExperimental[1].append(round(desiredDevice.EXPcurrent.at[ii],3))
-            elif (resultName == 'opticalPowerThirdOPM'): 
+                    voltageExperimental[1].append(round(columns['EXPvoltage'][ii],3))
+                    currentExperimental[1].append(round(columns['EXPcurrent'][ii],3))
+            elif (resultName == 'opticalPowerThirdOPM'):
                 if (len(pwr) == 2):
                     pwr.append([channel])
-                    voltageExperimental.append([round(desiredDevice.EXPvoltage.at[ii],3)])
-                    currentExperimental.append([round(desiredDevice.EXPcurrent.at[ii],3)])
-                else:    
+                    voltageExperimental.append([round(columns['EXPvoltage'][ii],3)])
+                    currentExperimental.append([round(columns['EXPcurrent'][ii],3)])
+                else:
                     pwr[2].append(channel)
-                    voltageExperimental[2].append(round(desiredDevice.EXPvoltage.at[ii],3))
-                    currentExperimental[2].append(round(desiredDevice.EXPcurrent.at[ii],3))
+                    voltageExperimental[2].append(round(columns['EXPvoltage'][ii],3))
+                    currentExperimental[2].append(round(columns['EXPcurrent'][ii],3))
             else:
                 print("Unkown optical power result name")
-                
+
         elif (resultType == 'uCurrent') and (domainType == 'voltage'):
-            resultName = desiredDevice.ResultName.at[ii]
-            resultDescription = desiredDevice.ResultDescription.at[ii]
+            resultName = columns['ResultName'][ii]
+            resultDescription = columns['ResultDescription'][ii]
             if (resultName == 'Current'):
+                currentData = decoded['ResultValue'][ii]
+                voltageData = decoded['ResultDomain'][ii]
                 if "IV Curve, Bright" in resultDescription:
-                    currentString = desiredDevice.ResultValue.at[ii]
-                    currentData = np.fromstring(currentString, dtype=float, sep=',')
-                    voltageString = desiredDevice.ResultDomain.at[ii]
-                    voltageData = np.fromstring(voltageString, dtype=float, sep=',')
                     IV_Bright[1].append(currentData)
                     IV_Bright[0].append(voltageData)
                 elif "IV Curve, Dark" in resultDescription:
-                    currentString = desiredDevice.ResultValue.at[ii]
-                    currentData = np.fromstring(currentString, dtype=float, sep=',')
-                    voltageString = desiredDevice.ResultDomain.at[ii]
-                    voltageData = np.fromstring(voltageString, dtype=float, sep=',')
                     IV_Dark[1].append(currentData)
                     IV_Dark[0].append(voltageData)
                 else: #TODO(Integrate this old format into the new one above when EHVA fixes their convention)
-                    currentString = desiredDevice.ResultValue.at[ii]
-                    currentData = np.fromstring(currentString, dtype=float, sep=',')
-                    voltageString = desiredDevice.ResultDomain.at[ii]
-                    voltageData = np.fromstring(voltageString, dtype=float, sep=',')
                     IV_current.append(currentData)
                     IV_voltage.append(voltageData)
-                
+
         elif (resultType == 'current'):
-            resultName = desiredDevice.ResultName.at[ii]
-            resultDescription = desiredDevice.ResultDescription.at[ii]
+            resultName = columns['ResultName'][ii]
+            resultDescription = columns['ResultDescription'][ii]
             if (resultName == 'Dark current'):
-                darkCurrent[0].append(float(desiredDevice.ResultValue.at[ii]))
-                darkCurrent[1].append(float(desiredDevice.ResultDomain.at[ii]))
-            elif (resultDescription == 'Measured output current (A), multiplied by the polarity of the photodiode'): #TODO(need to deal with EHVA and their ambigious naming)
-                wavlString = desiredDevice.ResultDomain.at[ii]
-                res_wavl = np.fromstring(wavlString, dtype=float, sep=',')    
-                bias = desiredDevice.EXPbias2.at[ii]
-                meterRange = desiredDevice.EXPmeterRange.at[ii]
-                currentString = desiredDevice.ResultValue.at[ii]
-                current = np.fromstring(currentString, dtype=float, sep=',')
-                pwrString = desiredDevice.EXPpwr.at[ii]
-                pwr = np.fromstring(pwrString, dtype=float, sep=',')
+                darkCurrent[0].append(float(columns['ResultValue'][ii]))
+                darkCurrent[1].append(float(columns['ResultDomain'][ii]))
+            elif (resultDescription == _EHVA_RESPONSIVITY): #TODO(need to deal with EHVA and their ambigious naming)
+                res_wavl = decoded['ResultDomain'][ii]
+                bias = columns['EXPbias2'][ii]
+                meterRange = columns['EXPmeterRange'][ii]
+                current = decoded['ResultValue'][ii]
+                pwr = decoded['EXPpwr'][ii]
                 responsivity[0] = res_wavl
                 responsivity[1].append(bias)
                 responsivity[2].append(meterRange)
                 responsivity[3].append(current)
                 responsivity[4].append(pwr)
-                 
+
         elif (resultType == 'optical return loss'):
-            resultName = desiredDevice.ResultName.at[ii]
-            if (resultName == 'PolarizationDependentLoss'): 
-                wavlString = desiredDevice.ResultDomain.at[ii]
-                pol_wavl = np.fromstring(wavlString, dtype=float, sep=',')
-                polString = desiredDevice.ResultValue.at[ii]
-                loss = np.fromstring(polString, dtype=float, sep=',')
+            resultName = columns['ResultName'][ii]
+            if (resultName == 'PolarizationDependentLoss'):
+                pol_wavl = decoded['ResultDomain'][ii]
+                loss = decoded['ResultValue'][ii]
                 loss = loss.astype(float)
-                measuredPort = desiredDevice.MeasuredPorts.at[ii]
-                pol_loss[0].append(pol_wavl) 
-                pol_loss[1].append(loss) 
+                measuredPort = columns['MeasuredPorts'][ii]
+                pol_loss[0].append(pol_wavl)
+                pol_loss[1].append(loss)
                 pol_loss[2].append(measuredPort)
 
-            else:               
+            else:
                 print("NOT HANDLING THE FOLLOWING CASE:")
                 print(resultName)
         elif (resultType == 'power'):
-            resultName = desiredDevice.ResultName.at[ii]
-            if (resultName == 'S21 raw on-chip photodetector and external modulator'):
-                freqString = desiredDevice.ResultDomain.at[ii]
-                freq = np.fromstring(freqString, dtype=float, sep=',')
-                pwerString = desiredDevice.ResultValue.at[ii]
-                S21 = np.fromstring(pwerString, dtype=float, sep=',')
-                biasVolt = desiredDevice.EXPbias.at[ii]
+            resultName = columns['ResultName'][ii]
+            if (resultName == _EHVA_S21_RAW):
+                freq = decoded['ResultDomain'][ii]
+                S21 = decoded['ResultValue'][ii]
+                biasVolt = columns['EXPbias'][ii]
                 s_parameters[0] = freq
                 s_parameters[1].append(biasVolt)
                 s_parameters[2][1][0].append(S21)
-            elif (resultName == 'S21 of calibrated photodetector and external modulator'):
-                wavlString = desiredDevice.ResultDomain.at[ii]
-                cal_wavl = np.fromstring(wavlString, dtype=float, sep=',')
-                calString = desiredDevice.ResultValue.at[ii]
-                cal = np.fromstring(calString, dtype=float, sep=',')
+            elif (resultName == _EHVA_S21_CAL):
+                cal_wavl = decoded['ResultDomain'][ii]
+                cal = decoded['ResultValue'][ii]
                 external_calibration[0] = cal_wavl
                 external_calibration[1] = cal
             else:
                 print("Unhandled power type: " + resultName )
-                    
+
 
     device = measurement(deviceID=deviceID, deviceDescription=deviceDescription,
                          user=None, start=None,
@@ -649,187 +895,754 @@ def measurementEHVA(desiredDevice):
                          sweepPwr=None, wavlStep=wavlStep,
                          wavlStart=wavlStart, wavlStop=wavlStop, stitch=None,
                          initRange=None, wavl=wavl, pwr=pwr, dieID=dieID,
-                         voltageExperimental=voltageExperimental, 
+                         voltageExperimental=voltageExperimental,
                          currentExperimental=currentExperimental,
                          IV_current=IV_current, IV_voltage=IV_voltage,
                          darkCurrent=darkCurrent, pol_loss = pol_loss,
-                         s_parameters=s_parameters, 
+                         s_parameters=s_parameters,
                          external_calibration=external_calibration,
                          responsivity=responsivity,
                          IV_Bright=IV_Bright,IV_Dark=IV_Dark,
                          IV_refPower=IV_refPower)
-    
+
     return device
 
 
-def processCSV(f_name):
+def _columnsEHVA(data):
+    """Column arrays of an EHVA dataframe."""
+    return {column: data[column].to_numpy() for column in data.columns}
+
+
+def measurementEHVA(desiredDevice):
     """
-    Process a MapleLeaf Photonics Fotonica CSV measurement file into a measurement object.
+    Creates a measurement object out of the pandas dataframe containing only 1 component ID
 
     Parameters
     ----------
-    f_name : csv file location string (include directory + file)
-        CSV measurement file from MLP system.
+    desiredDevice : pandas dataframe
+        dataframe containing all information regarding a single device
 
     Returns
     -------
     device : measurement object
-        Measurement object created from parsed CSV file.
+        DESCRIPTION.
 
     """
-    import csv
-    with open(f_name, newline='') as csvfile:
-        cursor = csv.reader(csvfile, delimiter=',', quotechar='"')
-        pwr = None  # measurement power array initialization
-        # iterate over each row and parse its data to the proper variable
-        for row in cursor:
-            row = ' '.join(row).strip("#").strip()
+    columns = _columnsEHVA(desiredDevice)
+    return _assembleEHVA(columns, _decodeEHVA(columns),
+                         range(len(desiredDevice)))
 
-            if "User:" in row:
-                user = row.split('\t')[1].strip()
 
-            if "Start:" in row:
-                start = row.split('\t')[1].strip()
+def measurementsEHVA(data):
+    """
+    Creates the measurement objects of every component of a full EHVA export.
 
-            if "Finish:" in row:
-                finish = row.split('\t')[1].strip()
+    The export is grouped by ComponentId once and the comma-separated value
+    strings are decoded with one batched parse per result type, instead of
+    filtering and decoding the dataframe component by component.
 
-            if "Device ID:" in row:
-                deviceID = row.split('\t')[1].strip()
+    Parameters
+    ----------
+    data : pandas dataframe
+        dataframe of the full EHVA export, any number of component IDs.
+
+    Returns
+    -------
+    devices : dict
+        measurement objects keyed by ComponentId, in order of first appearance.
+
+    """
+    columns = _columnsEHVA(data)
+    decoded = _decodeEHVA(columns)
+    groups = data.groupby('ComponentId', sort=False).indices
+    return {componentID: _assembleEHVA(columns, decoded, rows)
+            for componentID, rows in groups.items()}
 
-            if "Device coordinates (gds):" in row:
-                coordsGDS = row.split('\t')[1].strip()
 
-            if "Device coordinates (motor):" in row:
-                coordsMotor = row.split('\t')[1].strip()
+def streamEHVA(f_name, memory_budget=256e6, **kwargs):
+    """
+    Stream the measurement objects of an EHVA export file with bounded memory.
+
+    The export is read in row chunks sized from the memory budget. A first
+    pass reads only the ComponentId column to count the rows of every
+    component, so that each component is assembled and yielded as soon as
+    its last row has been read, and its rows are then released.
+
+    Parameters
+    ----------
+    f_name : string
+        EHVA export csv file location (include directory + file).
+    memory_budget : float, optional
+        Approximate peak memory allowed for the rows being processed.
+        Units : bytes. The default is 256e6.
+    **kwargs
+        Additional arguments passed to pandas.read_csv.
+
+    Yields
+    ------
+    device : measurement object
+        Measurement of each component, in order of completion.
 
-            if "Chip test start:" in row:
-                date = row.split('\t')[1].strip()
+    Raises
+    ------
+    MemoryError
+        If the rows of the incomplete components exceed the memory budget,
+        which happens when the rows of many components are interleaved in
+        the export. Sort the export by ComponentId or raise the budget.
 
-            if "Laser:" in row:
-                laser = row.split('\t')[1].strip()
+    """
+    import os
+    import pandas as pd
+
+    counts = {}
+    n_rows = 0
+    for chunk in pd.read_csv(f_name, usecols=['ComponentId'], chunksize=2**20,
+                             **kwargs):
+        for componentID, n in chunk['ComponentId'].value_counts(sort=False).items():
+            counts[componentID] = counts.get(componentID, 0) + n
+        n_rows += len(chunk)
+    if not n_rows:
+        return
+
+    # split the budget between the chunk being read and the pending rows
+    row_size = os.path.getsize(f_name) / n_rows
+    chunksize = max(1, int(memory_budget / (4 * row_size)))
+    dtype = {column: str for column in ['ResultDomain', 'ResultValue', 'EXPpwr']}
+    dtype.update(kwargs.pop('dtype', {}))
+
+    pending = {}
+    pending_rows = 0
+    for chunk in pd.read_csv(f_name, chunksize=chunksize, dtype=dtype, **kwargs):
+        complete = []
+        for componentID, rows in chunk.groupby('ComponentId', sort=False).indices.items():
+            pending.setdefault(componentID, []).append(chunk.iloc[rows])
+            pending_rows += len(rows)
+            counts[componentID] -= len(rows)
+            if counts[componentID] == 0:
+                complete.append(componentID)
+
+        if complete:
+            frame = pd.concat([piece for componentID in complete
+                               for piece in pending.pop(componentID)],
+                              ignore_index=True)
+            pending_rows -= len(frame)
+            for device in measurementsEHVA(frame).values():
+                yield device
+
+        if pending_rows * row_size > memory_budget / 2:
+            raise MemoryError("Incomplete components of " + str(f_name) +
+                              " exceed the memory budget, sort the export by "
+                              "ComponentId or raise memory_budget.")
+
+
+# Fotonica CSV header keys mapped to (measurement attribute, value decoder)
+_CSV_HEADER_FIELDS = {
+    'User:': ('user', str.strip),
+    'Start:': ('start', str.strip),
+    'Finish:': ('finish', str.strip),
+    'Device ID:': ('deviceID', str.strip),
+    'Device coordinates (gds):': ('coordsGDS', str.strip),
+    'Device coordinates (motor):': ('coordsMotor', str.strip),
+    'Chip test start:': ('date', str.strip),
+    'Laser:': ('laser', str.strip),
+    'Detector:': ('detector', str.strip),
+    'Sweep speed:': ('sweepSpd', lambda v: float(v.strip(' nm/s'))),
+    'Laser power:': ('sweepPwr', lambda v: float(v.strip(' dBm'))),
+    'Wavelength step-size:': ('wavlStep', lambda v: float(v.strip(' nm'))),
+    'Start wavelength:': ('wavlStart', lambda v: float(v.strip(' nm'))),
+    'Stop wavelength:': ('wavlStop', lambda v: float(v.strip(' nm'))),
+    'Stitch count:': ('stitch', lambda v: float(v.strip())),
+    'Init Range:': ('initRange', lambda v: float(v.strip())),
+}
+
+
+def _parse_csv_header(line, fields):
+    """Decode a single '#' header line of a Fotonica CSV file into fields."""
+    import csv
+    if '"' in line:
+        cells = next(csv.reader([line], delimiter=',', quotechar='"'))
+    else:
+        cells = line.split(',')
+    row = ' '.join(cells).strip("#").strip()
+    cells = row.split('\t')
+    if len(cells) < 2:
+        return
+    field = _CSV_HEADER_FIELDS.get(cells[0].strip())
+    if field is not None:
+        name, decode = field
+        fields[name] = decode(cells[1])
 
-            if "Detector:" in row:
-                detector = row.split('\t')[1].strip()
 
-            if "Sweep speed:" in row:
-                sweepSpd = float(row.split('\t')[1].strip(' nm/s'))
+_PROCESSCSV_VERSION = 'processCSV-1'  # bump whenever the parsed content changes
 
-            if "Laser power:" in row:
-                sweepPwr = float(row.split('\t')[1].strip(' dBm'))
 
-            if "Wavelength step-size:" in row:
-                wavlStep = float(row.split('\t')[1].strip(' nm'))
+def _parseCSV(f_name):
+    """Parse a Fotonica CSV file into its (fields, arrays) dictionaries."""
+    fields = dict.fromkeys(name for name, _ in _CSV_HEADER_FIELDS.values())
+    tags = []
+    rows = []
+    with open(f_name, newline='') as csvfile:
+        for line in csvfile:
+            if line.startswith(('#', '"')):
+                _parse_csv_header(line, fields)
+                continue
+            tag, _, values = line.partition(',')
+            tag = tag.strip()
+            if tag == 'wavelength' or tag.startswith('channel_'):
+                tags.append(tag)
+                rows.append(values.rstrip(',\r\n'))
+
+    arrays = {}
+    if rows:
+        # decode every numeric row in a single pass into one 2D block
+        block = np.loadtxt(rows, dtype=float, delimiter=',', ndmin=2)
+        is_wavl = np.array(tags) == 'wavelength'
+        if is_wavl.any():
+            arrays['wavl'] = block[is_wavl][-1]
+        if not is_wavl.all():
+            arrays['pwr'] = block[~is_wavl]
 
-            if "Start wavelength:" in row:
-                wavlStart = float(row.split('\t')[1].strip(' nm'))
+    # if the .csv is not from an automated measurement (if exported from figure)
+    if fields['deviceID'] is None:
+        for name in ['start', 'finish', 'coordsGDS', 'coordsMotor', 'date']:
+            fields[name] = None
+    return fields, arrays
 
-            if "Stop wavelength:" in row:
-                wavlStop = float(row.split('\t')[1].strip(' nm'))
 
-            if "Stitch count:" in row:
-                stitch = float(row.split('\t')[1].strip())
+def processCSV(f_name, use_cache=True):
+    """
+    Process a MapleLeaf Photonics Fotonica CSV measurement file into a measurement object.
 
-            if "Init Range:" in row:
-                initRange = float(row.split('\t')[1].strip())
+    Header lines are decoded once through a key lookup table and the numeric
+    rows are decoded in bulk by NumPy. Parsed files are kept in the on-disk
+    cache.parse_cache and reloaded from it while the file is unchanged.
 
-            if "wavelength " in row:
-                wavl = row.split(' ')
-                wavl = [float(i) for i in wavl[1:]]
+    Parameters
+    ----------
+    f_name : csv file location string (include directory + file)
+        CSV measurement file from MLP system.
+    use_cache : Boolean, optional
+        Flag to read and write the parse cache. The default is True.
 
-            if "channel_" in row:
-                if pwr is not None:
-                    channel = row.split(' ')
-                    channel = [float(i) for i in channel[1:]]
-                    pwr.append(channel)
-                else:
-                    pwr = row.split(' ')
-                    pwr = [[float(i) for i in pwr[1:]]]
+    Returns
+    -------
+    device : measurement object
+        Measurement object created from parsed CSV file.
+        wavl is a WavelengthGrid shared by the files of the same sweep settings
+        (a 1D ndarray if the points are not on a uniform grid), read-only
+        (np.array(device.wavl) is a writable copy), and pwr a contiguous
+        (channels, points) ndarray.
 
-    # if the .csv is not from an automated measurement (if exported from figure)
-    if 'deviceID' in locals():
-        deviceID = deviceID
-    else:
-        deviceID = None
-        start = None
-        finish = None
-        coordsGDS = None
-        coordsMotor = None
-        date = None
-
-    device = measurement(deviceID=deviceID, deviceDescription= None,
-                         user=user, start=start,
-                         finish=finish, coordsGDS=coordsGDS,
-                         coordsMotor=coordsMotor, date=date, laser=laser,
-                         detector=detector, sweepSpd=sweepSpd,
-                         sweepPwr=sweepPwr, wavlStep=wavlStep,
-                         wavlStart=wavlStart, wavlStop=wavlStop, stitch=stitch,
-                         initRange=initRange, wavl=wavl, pwr=pwr, dieID=None, 
+    """
+    fields, arrays = cache.cached(f_name, _PROCESSCSV_VERSION, _parseCSV,
+                                  use_cache=use_cache)
+    wavl = arrays.get('wavl')
+    if wavl is not None:
+        wavl = WavelengthGrid.from_array(wavl) or wavl
+    device = measurement(deviceDescription=None, wavl=wavl,
+                         pwr=arrays.get('pwr'), dieID=None,
                          voltageExperimental=None, currentExperimental=None,
-                         IV_current=None, IV_voltage=None, darkCurrent=None, 
-                         pol_loss=None, s_parameters = None,
+                         IV_current=None, IV_voltage=None, darkCurrent=None,
+                         pol_loss=None, s_parameters=None,
                          external_calibration=None, responsivity=None,
-                         IV_Bright=None, IV_Dark=None, IV_refPower =None)
+                         IV_Bright=None, IV_Dark=None, IV_refPower=None,
+                         **fields)
     return device
 
 
-def find_nearest(array, value):
+def _load_file(job):
+    """Parse a single file for load_directory, capturing any failure."""
+    parser, path = job
+    try:
+        return parser(path), None
+    except Exception:
+        import traceback
+        return None, traceback.format_exc()
+
+
+def find_files(root, prefix='', suffix='.csv'):
+    """Find measurement files in a directory tree.
+
+    Args:
+        root (str): Top directory of the measurement data.
+        prefix (str, optional): Prefix of the name of the folder containing
+            each measurement file (typically the device ID). Defaults to ''.
+        suffix (str, optional): File name ending. Defaults to '.csv'.
+
+    Returns:
+        list: Paths of the matching files, in sorted (deterministic) order.
+    """
+    import os
+    paths = []
+    for dirpath, dirs, files in os.walk(root):
+        dirs.sort()
+        if os.path.basename(dirpath).startswith(prefix):
+            paths.extend(os.path.join(dirpath, file) for file in sorted(files)
+                         if file.endswith(suffix))
+    return paths
+
+
+def load_directory(root, prefix='', suffix='.csv', workers=None, parser=None):
+    """Find and parse all the measurement files in a directory tree.
+
+    Files are parsed in a pool of worker processes. When workers > 1 on
+    platforms that spawn processes (Windows, macOS), the calling script must
+    be protected by an ``if __name__ == '__main__':`` guard.
+
+    Args:
+        root (str): Top directory of the measurement data.
+        prefix (str, optional): Prefix of the name of the folder containing
+            each measurement file (typically the device ID). Defaults to ''.
+        suffix (str, optional): File name ending. Defaults to '.csv'.
+        workers (int, optional): Number of worker processes.
+            Defaults to the number of available cores, 1 parses serially.
+        parser (callable, optional): Module level function that turns a file
+            path into a measurement object. Defaults to processCSV.
+
+    Returns:
+        devices (list): Parsed measurement objects, in sorted file path order.
+        errors (dict): Traceback of every file that failed to parse, keyed by path.
+    """
+    import os
+    if parser is None:
+        parser = processCSV
+    paths = find_files(root, prefix=prefix, suffix=suffix)
+    jobs = [(parser, path) for path in paths]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        chunksize = max(1, len(jobs) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_load_file, jobs, chunksize=chunksize))
+    else:
+        results = [_load_file(job) for job in jobs]
+
+    devices = []
+    errors = {}
+    for path, (device, error) in zip(paths, results):
+        if error is None:
+            devices.append(device)
+        else:
+            errors[path] = error
+    return devices, errors
+
+
+def find_nearest(array, value, assume_sorted=False):
     """Find the array index that's nearest to an input value
 
     Args:
         array (nparray): Input list to search.
-        value (float): Target value to search for.
+        value (float): Target value to search for, or an array of values.
+        assume_sorted (bool, optional): The array is sorted (ascending or descending),
+            search it by bisection in O(log n). Defaults to False.
+            A WavelengthGrid is always searched in O(1). NaN or infinite
+            values give index 0 in every case, as np.abs(array - value).argmin().
 
     Returns:
-        int: index of the arra
+        int: index of the array element nearest to the value,
+            or an array of indices for an array of values.
     """
+    if isinstance(array, WavelengthGrid):
+        if np.ndim(value) == 0:
+            return array.index(value)
+        assume_sorted = True
     array = np.asarray(array)
-    idx = (np.abs(array - value)).argmin()
-    return idx
+    value = np.asarray(value)
+    if not assume_sorted:
+        idx = (np.abs(array - value[..., None])).argmin(axis=-1)
+        return idx[()]
+
+    if array.size < 2:
+        return np.zeros(value.shape, dtype=int)[()]
+    if array[0] > array[-1]:
+        # descending grid, ties go to the first index of the array as with argmin
+        grid = array[::-1]
+        idx = np.clip(np.searchsorted(grid, value), 1, grid.size - 1)
+        idx = idx - (value - grid[idx - 1] < grid[idx] - value)
+        idx = np.searchsorted(grid, grid[idx], side='right') - 1  # repeated values
+        idx = grid.size - 1 - idx
+    else:
+        idx = np.clip(np.searchsorted(array, value), 1, array.size - 1)
+        # step back to the lower neighbour when it is at least as close
+        idx = idx - (value - array[idx - 1] <= array[idx] - value)
+        idx = np.searchsorted(array, array[idx])  # first of repeated values
+    # NaN or infinite values give index 0, as with argmin
+    return np.where(np.isfinite(value), idx, 0)[()]
 
 
 def bandwidth(wavl, data, threshold=3):
     """Calculates the bandwidth of an input result
 
+    The band edges are the threshold crossings on each side of the maximum,
+    linearly interpolated between the wavelength points. Several thresholds
+    and several devices are computed at once.
+
     Args:
         wavl (list): Wavelength data domain
-        data (list): Transmission (or power?) data to analyze
-        threshold (int, optional): bandwidth threshold. Defaults to 3 dB.
+        data (list): Transmission (or power?) data to analyze, or a (devices, points) block.
+        threshold (int, optional): bandwidth threshold, or list of thresholds (e.g. [1, 3, 10]).
+            Defaults to 3 dB.
+
+    Returns:
+        list: Calculated bandwidth and wavelength [bandwidth, central_wavelength],
+            of shape (devices, thresholds) with a block of devices and a list of thresholds.
+            NaN where the band reaches the edge of the sweep.
+    """
+    wavelength = np.asarray(wavl, dtype=float)
+    response = np.asarray(data, dtype=float)
+    thresholds = np.asarray(threshold, dtype=float)
+
+    # (..., thresholds, points) in-band masks around the maximum of each response
+    center_index = np.argmax(response, axis=-1)[..., None, None]
+    level = np.max(response, axis=-1)[..., None] - thresholds.reshape(-1)
+    isInBand = response[..., None, :] > level[..., None]
+    index = np.arange(response.shape[-1])
+
+    # first out of band point on each side of the maximum
+    outLeft = ~isInBand & (index < center_index)
+    outRight = ~isInBand & (index > center_index)
+    edge = ~outLeft.any(axis=-1) | ~outRight.any(axis=-1)
+    leftBound = np.clip(index.size - 1 - np.argmax(outLeft[..., ::-1], axis=-1), 0, index.size - 2)
+    rightBound = np.clip(np.argmax(outRight, axis=-1), 1, index.size - 1)
+
+    def crossing(outer, inner):
+        y0 = np.take_along_axis(response[..., None, :], outer[..., None], axis=-1)[..., 0]
+        y1 = np.take_along_axis(response[..., None, :], inner[..., None], axis=-1)[..., 0]
+        return wavelength[outer] + (level - y0) / (y1 - y0) * (wavelength[inner] - wavelength[outer])
+
+    left = crossing(leftBound, leftBound + 1)
+    right = crossing(rightBound, rightBound - 1)
+    bandwidth = np.where(edge, np.nan, np.abs(right - left))
+    central_wavelength = np.where(edge, np.nan, (right + left)/2)
+
+    shape = response.shape[:-1] + thresholds.shape
+    return [bandwidth.reshape(shape)[()], central_wavelength.reshape(shape)[()]]
+
+
+class _InterpKernel(object):
+    """Linear interpolation of ragged responses onto a common grid, indexed once.
+
+    The sample points of all the responses are located in a single pass: the
+    points are ranked together with the target grid and every response is
+    offset to its own range of integer keys, so that one np.searchsorted finds
+    the interval of every (response, target point) pair exactly.
+    """
+
+    def __init__(self, xs, x_new):
+        self.sizes = np.array([x.size for x in xs])
+        self.x = np.concatenate(xs)
+        self.x_new = x_new
+        stops = np.cumsum(self.sizes)
+        starts = stops - self.sizes
+
+        ranks = np.unique(np.concatenate([self.x, x_new]), return_inverse=True)[1]
+        n_keys = int(ranks.max()) + 1
+        responses = np.arange(len(xs))
+        keys = np.repeat(responses, self.sizes) * n_keys + ranks[:self.x.size]
+        query = responses[:, None] * n_keys + ranks[self.x.size:]
+        pos = np.searchsorted(keys, query, side='right') - 1
+
+        self.lo = np.clip(pos, starts[:, None], np.maximum(stops - 2, starts)[:, None])
+        self.hi = np.minimum(self.lo + 1, stops[:, None] - 1)
+        self.offset = x_new - self.x[self.lo]
+        self.dx = self.x[self.hi] - self.x[self.lo]
+        self.inside = (x_new >= self.x[starts][:, None]) & (x_new <= self.x[stops - 1][:, None])
+
+    def apply(self, y, fill_value=np.nan):
+        """Interpolate y (concatenated responses, or a (..., points) block on a
+        single shared grid) onto the target grid."""
+        lo, hi, offset, dx = self.lo, self.hi, self.offset, self.dx
+        if self.sizes.size == 1:
+            lo, hi, offset, dx = lo[0], hi[0], offset[0], dx[0]
+        y0, y1 = y[..., lo], y[..., hi]
+        # same arithmetic as np.interp, sample points are reproduced exactly
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(offset == 0, y0, np.where(offset == dx, y1,
+                                                        (y1 - y0) / dx * offset + y0))
+        if not (isinstance(fill_value, str) and fill_value == 'extrapolate'):
+            inside = self.inside[0] if self.sizes.size == 1 else self.inside
+            values = np.where(inside, values, fill_value)
+        return values
+
+
+_INTERP_KERNELS = collections.OrderedDict()
+_INTERP_KERNELS_SIZE = 32  # number of (sample grids, target grid) indices kept
+
+
+def _interp_kernel(xs, x_new):
+    """Cached interpolation index of (sample grids, target grid), least recently used eviction."""
+    x = np.concatenate(xs)
+    key = (tuple(i.size for i in xs), hash(x.tobytes()), hash(x_new.tobytes()))
+    kernel = _INTERP_KERNELS.get(key)
+    if (kernel is not None and np.array_equal(kernel.x, x)
+            and np.array_equal(kernel.x_new, x_new)):
+        _INTERP_KERNELS.move_to_end(key)
+        return kernel
+    kernel = _InterpKernel([i.copy() for i in xs], x_new.copy())
+    _INTERP_KERNELS[key] = kernel
+    if len(_INTERP_KERNELS) > _INTERP_KERNELS_SIZE:
+        _INTERP_KERNELS.popitem(last=False)
+    return kernel
+
+
+def resample(x, y, x_new, fill_value=np.nan):
+    """Linear interpolation of one or many responses onto a common grid.
+
+    Responses sharing a grid are interpolated as one block, and responses
+    measured on different (ragged) grids are all located in a single
+    vectorized pass. The interpolation index of a (sample grids, target grid)
+    pair is cached, so resampling repeated grids only gathers the data.
+
+    Args:
+        x (array or list): Ascending sample points. Either a grid shared by all
+            the responses, shape (points,), or a list with the grid of each
+            response (the grids can have different lengths).
+        y (array or list): Responses, shape (points,) or (devices, points) for a
+            shared grid, or a list with the response on each grid.
+        x_new (array): Common grid to interpolate onto.
+        fill_value (float or str, optional): Value outside of the sample range
+            of a response. 'extrapolate' extends the end segments linearly.
+            Defaults to NaN.
+
+    Returns:
+        ndarray: Responses on the common grid, shape (len(x_new),) for a single
+            response, (devices, len(x_new)) otherwise.
+    """
+    x_new = np.asarray(x_new, dtype=float)
+    shared = isinstance(x, WavelengthGrid) or np.ndim(x[0]) == 0
+    if shared:
+        xs = [np.asarray(x, dtype=float)]
+    else:
+        xs = [np.asarray(i, dtype=float) for i in x]
+        if len(xs) != len(y):
+            raise ValueError("Number of responses does not match the number of grids.")
+        if all(i is x[0] or np.array_equal(np.asarray(i, dtype=float), xs[0]) for i in x):
+            shared, xs = True, xs[:1]
+
+    for i in xs:
+        if i.ndim != 1 or i.size == 0:
+            raise ValueError("Sample points must be non-empty 1D arrays.")
+        if np.any(np.diff(i) < 0):
+            raise ValueError("Sample points must be ascending.")
+
+    if shared:
+        y = np.asarray(y, dtype=float)
+        if y.shape[-1] != xs[0].size:
+            raise ValueError("Responses do not match the sample points.")
+        if np.array_equal(xs[0], x_new):
+            return y.copy()
+        return _interp_kernel(xs, x_new).apply(y, fill_value)
+
+    ys = [np.asarray(i, dtype=float) for i in y]
+    if any(i.shape != j.shape for i, j in zip(xs, ys)):
+        raise ValueError("Responses do not match the sample points.")
+    return _interp_kernel(xs, x_new).apply(np.concatenate(ys), fill_value)
+
+
+def aggregate(data, axis=0):
+    """NaN-aware mean, standard deviation and count of responses.
+
+    NaN entries, e.g. points outside of the range of a resampled response,
+    are left out. Points without any valid value get a NaN mean and standard
+    deviation (without the warnings of np.nanmean).
+
+    Args:
+        data (array): Responses, e.g. shape (devices, points).
+        axis (int, optional): Axis to aggregate over. Defaults to 0.
+
+    Returns:
+        mean (ndarray): Mean of the valid values.
+        std (ndarray): Standard deviation (population, as np.nanstd) of the valid values.
+        count (ndarray): Number of valid values.
+    """
+    data = np.asarray(data, dtype=float)
+    valid = ~np.isnan(data)
+    count = np.sum(valid, axis=axis)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.sum(np.where(valid, data, 0), axis=axis) / count
+        deviation = np.where(valid, data - np.expand_dims(mean, axis), 0)
+        std = np.sqrt(np.sum(deviation**2, axis=axis) / count)
+    return mean, std, count
+
+
+def average_responses(x, y, x_new=None):
+    """Average responses measured on different grids.
+
+    Args:
+        x (list): Ascending sample points of each response.
+        y (list): Responses.
+        x_new (array, optional): Common grid to average on. Defaults to the
+            union of all the sample points.
 
     Returns:
-        list: Calculated bandwidth and wavelength [bandwidth, central_wavelength]
+        x_new (ndarray): Common grid.
+        mean (ndarray): Mean of the responses covering each point of the grid.
+        std (ndarray): Standard deviation of the responses at each point.
+        count (ndarray): Number of responses covering each point.
+    """
+    if x_new is None:
+        x_new = np.unique(np.concatenate([np.ravel(i) for i in x]))
+    x_new = np.asarray(x_new, dtype=float)
+    mean, std, count = aggregate(resample(x, y, x_new))
+    return x_new, mean, std, count
+
+
+class _PolyFitKernel(object):
+    """Least squares polynomial fit on a fixed grid, factorized once.
+
+    The grid is mapped onto [-1, 1] and the fit uses a Chebyshev basis
+    factorized by QR, which stays well conditioned at high orders where the
+    monomial Vandermonde matrix of np.polyfit does not.
     """
 
-    # input list format:
-    #                    bandwidth threshold, default 3 dB
-    # output list format: [bandwidth of threshold, central wavelength]
+    def __init__(self, x, fitOrder):
+        self.x = x
+        self.fitOrder = fitOrder
+        self.center = (x.max() + x.min()) / 2
+        self.scale = (x.max() - x.min()) / 2 or 1.0
+        self.vander = np.polynomial.chebyshev.chebvander(self._map(x), fitOrder)
+        if np.unique(x).size > fitOrder:
+            q, r = np.linalg.qr(self.vander)
+            self.solve = np.linalg.solve(r, q.T)  # coefficients = solve @ y
+        else:
+            # under-determined fit, minimum norm solution like np.polyfit
+            self.solve = np.linalg.pinv(self.vander)
+
+    def _map(self, x):
+        return (np.asarray(x, dtype=float) - self.center) / self.scale
 
-    wavelength = wavl
-    response = data
+    def fit(self, y):
+        """Fitted values on the grid of every row of y, shape (..., points)."""
+        return (np.asarray(y, dtype=float) @ self.solve.T) @ self.vander.T
 
-    center_index = find_nearest(response, max(response))
-    isInBand = response > max(response) - threshold
+    def evaluate(self, y, x):
+        """Fit every row of y and evaluate the polynomials on new points x."""
+        y = np.asarray(y, dtype=float)
+        vander = np.polynomial.chebyshev.chebvander(self._map(x), self.fitOrder)
+        return (y @ self.solve.T) @ vander.T
 
-    leftBound = center_index
 
-    while isInBand[leftBound] == 1:
-        leftBound = leftBound-1
+_POLYFIT_KERNELS = collections.OrderedDict()
+_POLYFIT_KERNELS_SIZE = 32  # number of (grid, order) factorizations kept
 
-    rightBound = center_index
 
-    while isInBand[rightBound] == 1:
-        rightBound = rightBound+1
+def _polyfit_kernel(x, fitOrder):
+    """Cached fitting kernel of a (grid, order) pair, least recently used eviction."""
+    x = np.asarray(x, dtype=float)
+    key = (fitOrder, x.size, hash(x.tobytes()))
+    kernel = _POLYFIT_KERNELS.get(key)
+    if kernel is not None and np.array_equal(kernel.x, x):
+        _POLYFIT_KERNELS.move_to_end(key)
+        return kernel
+    kernel = _PolyFitKernel(x.copy(), fitOrder)
+    _POLYFIT_KERNELS[key] = kernel
+    if len(_POLYFIT_KERNELS) > _POLYFIT_KERNELS_SIZE:
+        _POLYFIT_KERNELS.popitem(last=False)
+    return kernel
 
-    bandwidth = wavelength[rightBound] - wavelength[leftBound]
 
-    central_wavelength = (wavelength[rightBound] + wavelength[leftBound])/2
+def fit_polynomial(x, y, fitOrder, x_eval=None, cache=True):
+    """Least squares polynomial fit of one or many responses sharing a grid.
 
-    return [bandwidth, central_wavelength]
+    Equivalent to np.polyval(np.polyfit(x, y, fitOrder), x) for every row of y,
+    but the fit is factorized once per (grid, order) and cached, and a whole
+    (devices, points) block is fitted with a single matrix product.
+
+    Args:
+        x (array): Grid of the responses, shape (points,).
+        y (array): Responses, shape (points,) or (..., points).
+        fitOrder (int): Order of the polynomial.
+        x_eval (array, optional): Points to evaluate the fitted polynomials at.
+            Defaults to the fitting grid x.
+        cache (bool, optional): Keep the factorization of the grid for later
+            fits. Disable it for one-off grids. Defaults to True.
+
+    Returns:
+        ndarray: Fitted polynomials evaluated at x_eval, shape (..., len(x_eval)).
+    """
+    if cache:
+        kernel = _polyfit_kernel(x, fitOrder)
+    else:
+        kernel = _PolyFitKernel(np.asarray(x, dtype=float), fitOrder)
+    if x_eval is None:
+        return kernel.fit(y)
+    return kernel.evaluate(y, x_eval)
+
+
+def linear_regression(x, y):
+    """Least squares straight line fit of y versus x, batched over all other axes.
+
+    Solves every regression at once in closed form, e.g. one per wavelength
+    point and per cutback family.
+
+    Args:
+        x (array): Independent values, shape (..., N).
+        y (array): Dependent values, shape (..., N, points). Each trailing
+            column is regressed against x.
+
+    Returns:
+        slope (ndarray): Slope of each regression, shape (..., points).
+        intercept (ndarray): Intercept of each regression, shape (..., points).
+        stderr (ndarray): Standard error of the slope, shape (..., points).
+            NaN when there are only two data points.
+    """
+    x = np.asarray(x, dtype=float)[..., None]
+    y = np.asarray(y, dtype=float)
+    n = x.shape[-2]
+
+    x_mean = x.mean(axis=-2, keepdims=True)
+    y_mean = y.mean(axis=-2, keepdims=True)
+    dx = x - x_mean
+    sxx = np.sum(dx**2, axis=-2)
+    slope = np.sum(dx * (y - y_mean), axis=-2) / sxx
+    intercept = y_mean[..., 0, :] - slope * x_mean[..., 0, :]
+
+    if n > 2:
+        residuals = y - (x * slope[..., None, :] + intercept[..., None, :])
+        stderr = np.sqrt(np.sum(residuals**2, axis=-2) / (n - 2) / sxx)
+    else:
+        stderr = np.full_like(slope, np.nan)
+    return slope, intercept, stderr
+
+
+def cutback_batch(wavelength, power, count, fitOrder=8):
+    """Cutback insertion loss of one or many families of structures at every wavelength.
+
+    All the per-wavelength linear regressions of all the families are solved
+    in a single batched operation.
+
+    Args:
+        wavelength (array): Wavelength points shared by all the devices (nm).
+        power (array): Power (dBm) of each device, shape (devices, points),
+            or (families, devices, points) for several cutback families.
+        count (array): Unit count (or length) of each device, shape (devices,),
+            or (families, devices).
+        fitOrder (int or None): order of the polynomial fitted to each device
+            response before the regression. None regresses the raw data.
+            Optional, default = 8.
+
+    Returns:
+        slope (ndarray): Insertion loss (dB/unit) vs wavelength, shape (points,)
+            or (families, points).
+        intercept (ndarray): Intercept (dBm) of each regression.
+        stderr (ndarray): Standard error of the slope (dB/unit).
+    """
+    power = np.asarray(power, dtype=float)
+    if fitOrder is not None:
+        power = fit_polynomial(wavelength, power, fitOrder)
+    return linear_regression(count, power)
 
 
 def cutback(input_data_response, input_data_count, wavelength, fitOrder=8):
     """Extract insertion losses of a structure using cutback method.
 
+    The devices can be measured on different wavelength grids: the responses
+    are resampled onto the points of the first device's grid that are covered
+    by all the devices.
+
     Args:
         input_data_response (list): input_data_response (list) [wavelength (nm), power (dBm)]
         input_data_count (array): input_data_count (array) [array of unit count]
@@ -839,30 +1652,20 @@ def cutback(input_data_response, input_data_count, wavelength, fitOrder=8):
     Returns:
         list: [insertion loss (fit) at wavelength (dB/unit), insertion loss (dB) vs wavelength (nm)]
     """
-    # fit the responses to a polynomial
-    wavelength_data = np.array(input_data_response[0][0])
-    power = []
-    pfit = []
-    power_fit = []
-    for i in range(len(input_data_count)):
-        power.append(input_data_response[i][1])
-        pfit.append(np.polyfit(wavelength_data-np.mean(wavelength_data), power[i], fitOrder))
-        power_fit.append(np.polyval(pfit[i], wavelength_data-np.mean(wavelength_data)))
-
-    power_fit_transpose = np.transpose(power_fit)
-    power_transpose = np.transpose(power)
+    grids = [i[0] for i in input_data_response]
+    wavelength_data = np.array(grids[0], dtype=float)
+    overlap = ((wavelength_data >= max(np.min(i) for i in grids))
+               & (wavelength_data <= min(np.max(i) for i in grids)))
+    wavelength_data = wavelength_data[overlap]
+    power = resample(grids, [i[1] for i in input_data_response], wavelength_data)
+
+    insertion_loss = cutback_batch(wavelength_data, power, input_data_count, fitOrder)[0]
+    insertion_loss_raw = cutback_batch(wavelength_data, power, input_data_count, None)[0]
 
     # find index of wavelength of interest
     index = find_nearest(wavelength_data, wavelength)
 
-    # find insertion loss vs wavelength
-    insertion_loss = []
-    insertion_loss_raw = []
-    for i in range(len(wavelength_data)):
-        insertion_loss.append(np.polyfit(input_data_count, power_fit_transpose[i], 1))
-        insertion_loss_raw.append(np.polyfit(input_data_count, power_transpose[i], 1))
-
-    return [insertion_loss[index][0], np.transpose(insertion_loss)[0], np.transpose(insertion_loss_raw)[0]]
+    return [insertion_loss[index], insertion_loss, insertion_loss_raw]
 
 
 def calibrate(input_response, reference_response, fitOrder=8):
@@ -871,7 +1674,9 @@ def calibrate(input_response, reference_response, fitOrder=8):
 
     Args:
         input_response (list): list of measurement data, format: [wavelength, value].
+            value can be a (devices, points) block.
         reference_response (list): list of reference data, format: [wavelength, value].
+            value can be a (devices, points) block.
         fitOrder (int): order of the polynomial fit. Optional, default = 8.
 
     Returns:
@@ -882,10 +1687,9 @@ def calibrate(input_response, reference_response, fitOrder=8):
     wavelength = reference_response[0]
     power = reference_response[1]
 
-    pfit = np.polyfit(wavelength-np.mean(wavelength), power, fitOrder)
-    power_calib_fit = np.polyval(pfit, wavelength-np.mean(wavelength))
+    power_calib_fit = fit_polynomial(wavelength, power, fitOrder)
 
-    power_corrected = input_response[1] - power_calib_fit
+    power_corrected = np.asarray(input_response[1]) - power_calib_fit
 
     return [power_corrected, power_calib_fit]
 
@@ -896,134 +1700,283 @@ def baseline_correction(input_response, fitOrder=4):
     Args:
         input_response (list): list containing the response to be corrected. 
             input list format: input_response[wavelength (nm), power (dBm)]
+            power can be a (devices, points) block.
         fitOrder (int): order of the polynomial fit. Optional, default = 4.
 
     Returns:
         list: output list format: [input power (dBm) with baseline correction, baseline correction fit]
     """
     wavelength = input_response[0]
-    power = input_response[1]
+    power = np.asarray(input_response[1], dtype=float)
 
-    pfit = np.polyfit(wavelength-np.mean(wavelength), power, fitOrder)
-    power_baseline = np.polyval(pfit, wavelength-np.mean(wavelength))
+    power_baseline = fit_polynomial(wavelength, power, fitOrder)
 
     power_corrected = power - power_baseline
-    power_corrected = power_corrected + max(power_baseline) - max(power)
+    power_corrected = power_corrected + np.max(power_baseline, axis=-1, keepdims=True) \
+        - np.max(power, axis=-1, keepdims=True)
 
     return [power_corrected, power_baseline]
 
 
+def _envelope_points(x, y, tol, direction='left'):
+    """Select the envelope points of one sampled response.
+
+    Walks the samples with the tol tracker of calibrate_envelope. A sample
+    that jumps away from the tracker is still accepted as the new tracker
+    value if it is within tol of the quadratic "oracle" fitted to the
+    envelope points selected so far. The QR factorization of the oracle fit
+    is updated by a Givens rotation for every selected point, so each step
+    costs O(1) instead of a new fit.
+
+    Args:
+        x (array): Sample positions.
+        y (array): Sample values.
+        tol (float): Dip threshold tolerance.
+        direction (str): 'left' walks the samples forward then backward,
+            anything else only walks them backward.
+
+    Returns:
+        list: Indices of the envelope points, in the order they were selected.
+    """
+    # positions mapped to [-1, 1] for conditioning
+    center = (np.max(x) + np.min(x)) / 2
+    scale = (np.max(x) - np.min(x)) / 2 or 1.0
+    x_raw, x, y = x, ((np.asarray(x) - center) / scale).tolist(), np.asarray(y).tolist()
+
+    selected = []
+    used = [False] * len(y)
+    distinct = 0
+    r = [0.0] * 6  # upper triangle of R in the QR factorization of [1, x, x**2], by rows
+    z = [0.0] * 3  # Q.T @ y
+    oracle = None
+
+    def walk(indices, tracker):
+        nonlocal distinct, oracle
+        for idx in indices:
+            val = y[idx]
+            if abs(val - tracker) < tol:
+                selected.append(idx)
+                if not used[idx]:
+                    used[idx] = True
+                    distinct += 1
+                # Givens rotations of the new row [1, x, x**2 | y] into R
+                xi = x[idx]
+                v1, v2, w = xi, xi * xi, val
+                h = math.hypot(r[0], 1.0)
+                c, s = r[0] / h, 1.0 / h
+                r[0] = h
+                r[1], v1 = c * r[1] + s * v1, c * v1 - s * r[1]
+                r[2], v2 = c * r[2] + s * v2, c * v2 - s * r[2]
+                z[0], w = c * z[0] + s * w, c * w - s * z[0]
+                if v1 != 0.0:
+                    h = math.hypot(r[3], v1)
+                    c, s = r[3] / h, v1 / h
+                    r[3] = h
+                    r[4], v2 = c * r[4] + s * v2, c * v2 - s * r[4]
+                    z[1], w = c * z[1] + s * w, c * w - s * z[1]
+                if v2 != 0.0:
+                    h = math.hypot(r[5], v2)
+                    c, s = r[5] / h, v2 / h
+                    r[5] = h
+                    z[2] = c * z[2] + s * w
+                oracle = None
+                tracker = val
+            else:
+                if oracle is None:
+                    if distinct < 3:
+                        # rank deficient quadratic, defer to polyfit's solution
+                        a, b, c = np.polyfit([x_raw[i] for i in selected],
+                                             [y[i] for i in selected], 2)
+                        oracle = [float((a * center + b) * center + c),
+                                  float((2 * a * center + b) * scale), float(a * scale**2)]
+                    else:
+                        c2 = z[2] / r[5]
+                        c1 = (z[1] - r[4] * c2) / r[3]
+                        oracle = [(z[0] - r[1] * c1 - r[2] * c2) / r[0], c1, c2]
+                c0, c1, c2 = oracle
+                xi = x[idx]
+                if abs(val - (c0 + (c1 + c2 * xi) * xi)) < tol:
+                    tracker = val
+        return tracker
+
+    indices = range(len(y))
+    tracker = y[0]
+    if direction == 'left':
+        tracker = walk(indices, tracker)
+    else:
+        tracker = y[-1]
+    walk(reversed(indices), tracker)
+    return selected
+
+
+def _rolling_envelope_points(x, y, tol, window):
+    """Mask of the segment peaks that are on the envelope, not in a dip.
+
+    A peak is in a dip if it lies more than tol below the chord between the
+    highest peaks within window segments on its left and on its right (the
+    highest peak on the only side at the ends). This only assumes that the
+    envelope is close to linear across a window, not that it is concave.
+
+    Args:
+        x (ndarray): Positions of the peaks, shape (devices, segments).
+        y (ndarray): Values of the peaks, shape (devices, segments).
+        tol (float): Dip threshold tolerance.
+        window (int): Number of segments on each side of a peak.
+
+    Returns:
+        ndarray: Boolean mask of the envelope peaks, shape (devices, segments).
+    """
+    n = y.shape[-1]
+    j = np.arange(n)
+    fill = np.full((len(y), window), -np.inf)
+    windows = np.lib.stride_tricks.sliding_window_view(
+        np.concatenate([fill, y, fill], axis=-1), window, axis=-1)
+    # highest peak of y[j - window:j] and of y[j + 1:j + window + 1]
+    left = np.clip(windows[:, j].argmax(axis=-1) + j - window, 0, n - 1)
+    right = np.clip(windows[:, j + window + 1].argmax(axis=-1) + j + 1, 0, n - 1)
+    x_left, x_right = np.take_along_axis(x, left, -1), np.take_along_axis(x, right, -1)
+    y_left, y_right = np.take_along_axis(y, left, -1), np.take_along_axis(y, right, -1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chord = y_left + (y_right - y_left) * (x - x_left) / (x_right - x_left)
+    reference = np.where(j == 0, y_right, np.where(j == n - 1, y_left, chord))
+    return (y >= reference - tol) | (n == 1)
+
+
+def _fit_envelope(x, y, selected, fitOrder, wavl):
+    """Fit the selected envelope points (with their multiplicity) of every device.
+
+    Args:
+        x (ndarray): Positions of the candidate points, shape (samples,).
+        y (ndarray): Values of the candidate points, shape (devices, samples).
+        selected (list): Index array of the envelope points of each device.
+        fitOrder (int): Polynomial order of the envelope fit.
+        wavl (ndarray): Points to evaluate the envelope fits at.
+
+    Returns:
+        ndarray: Envelope fit of every device, shape (devices, len(wavl)).
+    """
+    # envelope points are one-off grids, fitted without evicting the cached kernels
+    return np.array([fit_polynomial(x[points], y[i, points], fitOrder, wavl, cache=False)
+                     for i, points in enumerate(selected)]).reshape(len(y), -1)
+
+
 def calibrate_envelope(wavl, data_envelope, data, tol=3.0, N_seg=25, fitOrder=4,
-                       direction='left', verbose=False):
+                       direction='left', verbose=False, method='tracker'):
     """Calibrate an input response by using the envelope of another response.
         Ideal for Bragg gratings and contra-directional couplers
         Can be useful mainy for responses that contain dips.
 
+    Several devices sharing the same wavelength points can be calibrated in
+    one call by passing (devices, points) blocks as data_envelope and data.
+
     Args:
         wavl (list): List of wavelength data points
-        data_envelope (list): List of the values of the envelope response data
-        data (list): List of input data values to be calibrated
-        tol (float, optional): Dip threshold tolerance, i.e., what dips to consider as not dip. Defaults to 2.0.
-        N_seg (int, optional): Number of segments to dice an array into. Defautls to 100.
-        fitOrder(int, optional): Polynomial order used to fit the envelope spectrum. Defautls to 8.
-        verbose (bool, optional): Flag to help debugging by plotting detected peaks. Defaults to False.
+        data_envelope (list): List of the values of the envelope response data,
+            or a (devices, points) block.
+        data (list): List of input data values to be calibrated, or a
+            (devices, points) block.
+        tol (float, optional): Dip threshold tolerance, i.e., what dips to consider as not dip. Defaults to 3.0.
+        N_seg (int, optional): Number of segments to dice an array into. Defautls to 25.
+        fitOrder(int, optional): Polynomial order used to fit the envelope spectrum. Defautls to 4.
+        direction (str, optional): 'left' walks the segments from the start then back from the end,
+            'right' only walks back from the end. Defaults to 'left'.
+        verbose (bool, optional): Flag to help debugging by plotting detected peaks
+            (of the first device of a block). Defaults to False.
+        method (str, optional): Envelope point selection method. 'tracker' walks N_seg
+            decimated samples with the tol tracker. 'rolling' takes the maximum of each
+            of the N_seg segments of the full resolution response, in linear time, and
+            drops the ones more than tol below their neighbours of a rolling window
+            (a tenth of the segments on each side) as dips; direction is not used.
+            Defaults to 'tracker'.
 
     Returns:
         calbirated (numpy array): List of the data points of the calibrated input response values
-        ref (list): List of the reference polyfit points made using the envelope
-        x_envelope (list): List of X-values used to creat ref polyfit (debugging)
-        y_envelope (list): List of Y-values used to creat ref polyfit (debugging)
+        ref (numpy array): List of the reference polyfit points made using the envelope
+        x_envelope (numpy array): List of X-values used to creat ref polyfit (debugging),
+            a list of arrays for a block of devices.
+        y_envelope (numpy array): List of Y-values used to creat ref polyfit (debugging),
+            a list of arrays for a block of devices.
     """
+    wavl = np.asarray(wavl, dtype=float)
+    data_envelope = np.asarray(data_envelope, dtype=float)
+    envelopes = np.atleast_2d(data_envelope)
+
+    idxSteps = int(np.floor(np.shape(envelopes)[-1]/N_seg))  # index steps between each segment
+    if method == 'tracker':
+        # step 1, sample the data_envelope data into N_seg segments
+        samples = np.arange(N_seg) * idxSteps
+        x = wavl[samples]
+        y = envelopes[:, samples]
+
+        # step 2, select the envelope points of every device
+        selected = [np.array(_envelope_points(x, row, tol, direction), dtype=int) for row in y]
+    elif method == 'rolling':
+        # maximum of every segment of the full resolution data, in one pass
+        size = max(idxSteps, 1)
+        padding = -np.shape(envelopes)[-1] % size
+        blocks = np.pad(envelopes, ((0, 0), (0, padding)), constant_values=-np.inf)
+        blocks = blocks.reshape(len(envelopes), -1, size)
+        peaks = blocks.argmax(axis=-1) + size * np.arange(blocks.shape[1])
+        x = wavl
+        y = envelopes
+        # drop the peaks in dips, compared to the peaks of the neighbouring tenth of the segments
+        window = max(int(np.ceil(peaks.shape[-1] / 10)), 1)
+        keep = _rolling_envelope_points(wavl[peaks], np.take_along_axis(y, peaks, -1), tol, window)
+        selected = [idx[mask] for idx, mask in zip(peaks, keep)]
+    else:
+        raise ValueError("Invalid envelope method: " + str(method))
+
+    # step 3, fit the envelope points (with their multiplicity) of every device
+    ref = _fit_envelope(x, y, selected, fitOrder, wavl).reshape(data_envelope.shape)
+
+    x_envelope = [x[points] for points in selected]
+    y_envelope = [row[points] for row, points in zip(y, selected)]
+    if data_envelope.ndim == 1:
+        x_envelope, y_envelope = x_envelope[0], y_envelope[0]
+
+    calibrated = np.array(data)-ref
+    calibrated_ref = data_envelope-ref
 
     if verbose:
         import matplotlib.pyplot as plt
+        first = (0,) * (data_envelope.ndim - 1)
         plt.figure()
-        plt.plot(wavl, data, label='Input data')
-        plt.plot(wavl, data_envelope, label="Calibration reference")
+        plt.plot(wavl, np.array(data)[first], label='Input data')
+        plt.plot(wavl, data_envelope[first], label="Calibration reference")
         plt.legend(loc=0)
         plt.title("Original input data set")
         plt.xlabel("X")
         plt.ylabel("Y")
 
-    # step 1, sample the data_envelope data into N_seg segments
-    idxSteps = int(np.floor(np.size(data_envelope)/N_seg))  # index steps between each segment
-    x = []
-    y = []
-    for i in range(N_seg):
-        idx = i * idxSteps
-        y.append(data_envelope[idx])
-        x.append(wavl[idx])
+        if method == 'tracker':
+            plt.figure()
+            plt.plot(wavl, data_envelope[first], linewidth=0.1, label='Calibration reference')
+            plt.scatter(x, y[0], color='red', label='Sampling points')
+            plt.legend(loc=0)
+            plt.title("Sampling of reference data set")
+            plt.xlabel("X")
+            plt.ylabel("Y")
 
-    if verbose:
         plt.figure()
-        plt.plot(wavl, data_envelope, linewidth=0.1, label='Calibration reference')
-        plt.scatter(x, y, color='red', label='Sampling points')
-        plt.legend(loc=0)
-        plt.title("Sampling of reference data set")
-        plt.xlabel("X")
-        plt.ylabel("Y")
-
-    x_envelope = []  # wavelength data points to include in envelope fitting
-    y_envelope = []  # transmission (or power?) data points to envelope fitting
-
-    if direction == 'left':
-        tracker = y[0]  # initial threshold tracker value
-        for idx, val in enumerate(y):
-            if np.abs(val-tracker) < tol:
-                x_envelope.append(x[idx])
-                y_envelope.append(val)
-                tracker = val
-            else:
-                oracle = np.poly1d(np.polyfit(x_envelope, y_envelope, 2))
-                x_oracle = x
-                y_oracle = oracle(x_oracle)
-
-                if np.abs(val-y_oracle[idx]) < tol:
-                    tracker = val
-    else:
-        tracker = y[-1]
-    for idx, val in reversed(list(enumerate(y))):
-        if np.abs(val-tracker) < tol:
-            x_envelope.append(x[idx])
-            y_envelope.append(val)
-            tracker = val
-        else:
-            oracle = np.poly1d(np.polyfit(x_envelope, y_envelope, 2))
-            x_oracle = x
-            y_oracle = oracle(x_oracle)
-
-            if np.abs(val-y_oracle[idx]) < tol:
-                tracker = val
-
-    if verbose:
-        plt.figure()
-        plt.plot(wavl, data_envelope, linewidth=0.1, label='Calibration reference')
-        plt.scatter(x_envelope, y_envelope, color='red', label='Envelope points')
+        plt.plot(wavl, data_envelope[first], linewidth=0.1, label='Calibration reference')
+        plt.scatter(x[selected[0]], y[0, selected[0]], color='red', label='Envelope points')
         plt.legend(loc=0)
         plt.title("Generated envelope points to used for polynomial fitting")
         plt.xlabel("X")
         plt.ylabel("Y")
 
-    envelope = np.poly1d(np.polyfit(x_envelope, y_envelope, fitOrder))
-    ref = envelope(wavl)
-
-    if verbose:
         plt.figure()
-        plt.plot(wavl, data_envelope, linewidth=0.1, label='Calibration reference')
-        plt.scatter(x_envelope, y_envelope, color='red', label='Envelope points')
-        plt.plot(wavl, ref, '--', color='black', linewidth=2, label='Envelope')
+        plt.plot(wavl, data_envelope[first], linewidth=0.1, label='Calibration reference')
+        plt.scatter(x[selected[0]], y[0, selected[0]], color='red', label='Envelope points')
+        plt.plot(wavl, ref[first], '--', color='black', linewidth=2, label='Envelope')
         plt.legend(loc=0)
         plt.title("Final generated polynomial for fitting")
         plt.xlabel("X")
         plt.ylabel("Y")
 
-    calibrated = np.array(data)-np.array(ref)
-    calibrated_ref = np.array(data_envelope)-np.array(ref)
-
-    if verbose:
         plt.figure()
-        plt.plot(wavl, calibrated, linewidth=1, label='Calibrated input response')
-        plt.plot(wavl, calibrated_ref, linewidth=1, label='Calibrated envelope response')
+        plt.plot(wavl, calibrated[first], linewidth=1, label='Calibrated input response')
+        plt.plot(wavl, calibrated_ref[first], linewidth=1, label='Calibrated envelope response')
         plt.legend(loc=0)
         plt.title("Final calibration")
         plt.xlabel("X")
@@ -1140,28 +2093,46 @@ def getGroupIndex(fsr_wavl, fsr, delta_length, verbose=False):
     return ng
 
 
-def truncate_data(wavl, data, wavl_min, wavl_max):
+def truncate_data(wavl, data, wavl_min, wavl_max, assume_sorted=False):
     """
     Truncates the wavl and data measurements to the specified wavl domain.
 
     Args:
         wavl (array-like): Array or list of wavl measurements.
-        data (array-like): Array or list of corresponding data measurements.
-        wavl_min (float): Minimum wavl value for truncation.
-        wavl_max (float): Maximum wavl value for truncation.
+        data (array-like): Array or list of corresponding data measurements,
+            or a (channels, points) block truncated along its last axis.
+        wavl_min (float): Minimum wavl value for truncation, or an array of them.
+        wavl_max (float): Maximum wavl value for truncation, or an array of them.
+        assume_sorted (bool, optional): wavl is sorted in ascending order. The bounds are
+            then found by bisection and the truncated data are views, not copies.
+            Defaults to False. The bounds of a WavelengthGrid are found in O(1).
 
     Returns:
-        tuple: Tuple containing the truncated wavl and data measurements.
+        tuple: Tuple containing the truncated wavl and data measurements,
+            or a list of tuples for arrays of bounds.
     """
-    wavl = np.array(wavl)
-    data = np.array(data)
-
-    indices = np.where((wavl >= wavl_min) & (wavl <= wavl_max))
+    data = np.asarray(data)
+    if np.ndim(wavl_min) or np.ndim(wavl_max):
+        return [truncate_data(wavl, data, lo, hi, assume_sorted)
+                for lo, hi in np.broadcast(wavl_min, wavl_max)]
+
+    if isinstance(wavl, WavelengthGrid) and wavl.step > 0:
+        window = wavl.truncate(wavl_min, wavl_max)
+        return wavl[window], data[..., window]
+
+    wavl = np.asarray(wavl)
+    if assume_sorted:
+        start = np.searchsorted(wavl, wavl_min, side='left')
+        stop = np.searchsorted(wavl, wavl_max, side='right')
+        return wavl[start:stop], data[..., start:max(start, stop)]
+
+    indices = np.where((wavl >= wavl_min) & (wavl <= wavl_max))[0]
     wavl_truncated = wavl[indices]
-    data_truncated = data[indices]
+    data_truncated = data[..., indices]
 
     return wavl_truncated, data_truncated
 
+
 def getExtinctionRatio(wavl, data, prominence=3.0, distance=50, verbose=False):
     """Get the extinction ratio (ER) of a dataset across the spectrum.
 
@@ -1217,3 +2188,85 @@ def getExtinctionRatio(wavl, data, prominence=3.0, distance=50, verbose=False):
         plt.xlabel('Wavelength (nm)', color='black')
 
     return er_wavl, er
+
+
+def extract_features(wavl, data, prominence=3.0, distance=50, delta_length=None,
+                     kappa=False, verbose=False):
+    """Extract the periodic spectral features (FSR, ER, ...) of one or many spectra.
+
+    Peaks and troughs are detected once per spectrum. The FSR is taken between
+    neighbouring troughs, and each peak is paired with the first trough after it
+    for the extinction ratio.
+
+    Args:
+        wavl (list): Wavelength range of the spectrum.
+        data (list): Data values of the spectrum (dB), or a (devices, points) block.
+        prominence (float, optional): Peak detection prominence.
+            Set this value to be higher than the minimum ER. Defaults to 3.0
+        distance (int, optional): Required minimal horizontal distance (>= 1) in samples between neighbouring peaks.
+            Defaults to 50.
+        delta_length (float, optional): Length imbalance of the interferometer, in the wavl unit.
+            If given, the group index is calculated at the FSR wavelengths. Defaults to None.
+        kappa (bool, optional): Flag to calculate the power coupling coefficient of the
+            splitter from the ER, 0.5 - 0.5*sqrt(10**(-ER/10)). Defaults to False.
+        verbose (bool, optional): Flag to help debugging by plotting detected peaks. Defaults to False.
+
+    Returns:
+        dict: Features of the spectrum, as arrays:
+            peaks, troughs: Indices of the detected peaks and troughs.
+            fsr_wavl, fsr: FSR midpoint wavelengths and FSR between neighbouring troughs.
+            er_wavl, er: Peak wavelengths and extinction ratios (dB).
+            ng: Group index at fsr_wavl, only if delta_length is given.
+            kappa: Coupling coefficient at er_wavl, only if kappa is set.
+        A list of these, one per device, for a (devices, points) block.
+
+    refer to https://docs.scipy.org/doc/scipy/reference/generated/scipy.signal.find_peaks.html
+        for details about prominence and distance parameters.
+    """
+    from scipy.signal import find_peaks
+
+    wavl = np.asarray(wavl, dtype=float)
+    data = np.asarray(data, dtype=float)
+    if data.ndim > 1:
+        return [extract_features(wavl, i, prominence, distance, delta_length, kappa, verbose)
+                for i in data]
+
+    peaks, _ = find_peaks(data, prominence=prominence, distance=distance)
+    troughs, _ = find_peaks(-data, prominence=prominence, distance=distance)
+
+    features = dict(peaks=peaks, troughs=troughs)
+    features['fsr'] = np.abs(np.diff(wavl[troughs]))
+    features['fsr_wavl'] = (wavl[troughs[1:]] + wavl[troughs[:-1]]) / 2
+
+    # pair every peak with the next trough
+    paired = np.searchsorted(troughs, peaks)
+    valid = paired < troughs.size
+    features['er'] = data[peaks[valid]] - data[troughs[paired[valid]]]
+    features['er_wavl'] = wavl[peaks[valid]]
+
+    if delta_length is not None:
+        features['ng'] = features['fsr_wavl']**2 / (delta_length * features['fsr'])
+    if kappa:
+        features['kappa'] = 0.5 - 0.5 * np.sqrt(10**(-features['er'] / 10))
+
+    if verbose:
+        import matplotlib.pyplot as plt
+        plt.figure()
+        plt.scatter(wavl[peaks], data[peaks], color='red')
+        plt.scatter(wavl[troughs], data[troughs], color='blue')
+        plt.plot(wavl, data, color='black')
+        plt.title("Detected peaks and troughs in the spectrum")
+        plt.xlabel("X")
+        plt.ylabel("Y")
+
+        plt.figure()
+        plt.scatter(features['er_wavl'], features['er'], color='black')
+        plt.ylabel('Extinction Ratio (dB)', color='black')
+        plt.xlabel('Wavelength (nm)', color='black')
+
+        plt.figure()
+        plt.scatter(features['fsr_wavl'], features['fsr'])
+        plt.title("Extracted free spectral ranges")
+        plt.xlabel("X")
+        plt.ylabel("Free Spectral Range")
+    return features
@@ -0,0 +1,232 @@
+"""
+SiEPIC Analysis Package cache module.
+
+Author:     Mustafa Hammood
+            mustafa@siepic.com
+
+Module:     Persistent on-disk cache of parsed measurement files
+
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+class ParseCache(object):
+    """
+    Size-bounded, least recently used on-disk cache of parsed measurement data.
+
+    Each entry is a .npz archive of the parsed arrays plus a JSON encoded
+    dictionary of scalar fields. Entries are keyed on the absolute path,
+    size and modification time of the source file and on the parser version,
+    so any change of the file or of the parser invalidates them.
+
+    Attributes
+    ----------
+    directory : str
+        Cache directory. Defaults to $SIAP_CACHE_DIR, or
+        ~/.cache/siepic_analysis_package if the variable is not set.
+    max_size : int
+        Maximum total size of the cache entries. Units : bytes
+    enabled : bool
+        Flag to turn the cache on or off globally.
+
+    Methods
+    -------
+    key(path, parser, *args)
+        Returns the cache key of a parsed file.
+    load(key)
+        Returns the cached (fields, arrays) of a key, or None.
+    store(key, fields, arrays)
+        Stores parsed data under a key and evicts old entries if needed.
+    clear()
+        Deletes all the cache entries.
+    """
+
+    def __init__(self, directory=None, max_size=2**30, enabled=True):
+        self._directory = directory
+        self.max_size = max_size
+        self.enabled = enabled
+        self._size = None  # running total, scanned on first store
+
+    @property
+    def directory(self):
+        if self._directory is not None:
+            return self._directory
+        return os.environ.get('SIAP_CACHE_DIR', os.path.join(
+            os.path.expanduser('~'), '.cache', 'siepic_analysis_package'))
+
+    @directory.setter
+    def directory(self, directory):
+        self._directory = directory
+        self._size = None
+
+    def key(self, path, parser, *args):
+        """
+        Cache key of a parsed file.
+
+        Parameters
+        ----------
+        path : str
+            Path of the source file.
+        parser : str
+            Name and version of the parser, e.g. 'processCSV-1'.
+        *args
+            Any additional parser arguments the result depends on.
+
+        Returns
+        -------
+        key : str
+            Hex digest identifying the entry.
+
+        """
+        stat = os.stat(path)
+        ident = [os.path.abspath(path), stat.st_size, stat.st_mtime_ns, parser]
+        ident.extend(args)
+        return hashlib.sha1(repr(ident).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def load(self, key):
+        """
+        Load a cache entry.
+
+        Parameters
+        ----------
+        key : str
+            Entry key, from key().
+
+        Returns
+        -------
+        entry : tuple or None
+            (fields, arrays) dictionaries of the entry, None on a cache miss.
+
+        """
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        fields = json.loads(str(arrays.pop('__fields__')))
+        return fields, arrays
+
+    def store(self, key, fields, arrays):
+        """
+        Store a cache entry.
+
+        Parameters
+        ----------
+        key : str
+            Entry key, from key().
+        fields : dict
+            JSON serializable scalar fields.
+        arrays : dict
+            Arrays of the entry, by name.
+
+        Returns
+        -------
+        None.
+
+        """
+        directory = self.directory
+        os.makedirs(directory, exist_ok=True)
+        path = self._path(key)
+        tmp = path + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, __fields__=np.array(json.dumps(fields)), **arrays)
+        os.replace(tmp, path)  # atomic, concurrent readers never see partial files
+
+        if self._size is None:
+            self._size = sum(size for _, _, size in self._entries())
+        else:
+            self._size += os.path.getsize(path)
+        if self._size > self.max_size:
+            self._evict()
+
+    def _entries(self):
+        entries = []
+        try:
+            scan = os.scandir(self.directory)
+        except OSError:
+            return entries
+        with scan:
+            for entry in scan:
+                if entry.name.endswith('.npz'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _evict(self):
+        """Delete the least recently used entries until the cache fits in max_size."""
+        entries = sorted(self._entries())
+        size = sum(i[2] for i in entries)
+        for _, path, entry_size in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
+        self._size = size
+
+    def clear(self):
+        """Delete all the cache entries."""
+        for _, path, _ in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._size = 0
+
+
+parse_cache = ParseCache()
+
+
+def cached(path, parser, parse, *args, use_cache=True):
+    """
+    Parse a file through the default parse cache.
+
+    Parameters
+    ----------
+    path : str
+        Path of the source file.
+    parser : str
+        Name and version of the parser, e.g. 'processCSV-1'.
+    parse : callable
+        Function returning the (fields, arrays) dictionaries of the file.
+    *args
+        Additional arguments passed to parse and included in the key.
+    use_cache : bool, optional
+        Flag to bypass the cache. The default is True.
+
+    Returns
+    -------
+    fields : dict
+        Parsed scalar fields.
+    arrays : dict
+        Parsed arrays.
+
+    """
+    if not (use_cache and parse_cache.enabled):
+        return parse(path, *args)
+    key = parse_cache.key(path, parser, *args)
+    entry = parse_cache.load(key)
+    if entry is None:
+        entry = parse(path, *args)
+        try:
+            parse_cache.store(key, *entry)
+        except OSError:
+            pass  # a read-only or full cache directory must not break parsing
+    return entry
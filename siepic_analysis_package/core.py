@@ -8,9 +8,14 @@ Module:     Core functionalities of the analysis package
 
 """
 
+import functools
+
+import numpy as np
 import requests
 import scipy.io
 
+from siepic_analysis_package import cache
+
 
 def download_response(url, port):
     """
@@ -54,11 +59,33 @@ def download_response(url, port):
     return data
 
 
-def parse_response(filename, port):
+_PARSE_RESPONSE_VERSION = 'parse_response-1'  # bump whenever the parsed content changes
+
+
+def _parse_mat(filename, port):
+    """Parse a .mat response into its (fields, arrays) dictionaries."""
+    data = scipy.io.loadmat(filename)
+
+    if('scanResults' in data):
+        wavelength = data['scanResults'][0][port][0][:, 0]
+        power = data['scanResults'][0][port][0][:, 1]
+    elif('scandata' in data):
+        wavelength = data['scandata'][0][0][0][:][0]
+        power = data['scandata'][0][0][1][:, port]
+    elif('wavelength' in data):
+        wavelength = data['wavelength'][0][:]
+        power = data['power'][:, port][:]
+
+    return {}, {'wavelength': wavelength, 'power': power}
+
+
+def parse_response(filename, port, use_cache=True):
     """
     Parse an input .mat response from a local file into an array.
 
     data is assumed to be from  measurement scanResults or scandata formats.
+    Parsed responses are kept in the on-disk cache.parse_cache and reloaded
+    from it while the file is unchanged.
 
     Parameters
     ----------
@@ -67,38 +94,72 @@ def parse_response(filename, port):
         (including directory if not in current working directory).
     port : int
         measurement port to be downloaded.
+    use_cache : bool, optional
+        Flag to read and write the parse cache. The default is True.
 
     Returns
     -------
     data : list
         List of data points [wavelength (m), power (dBm)].
     """
-    data = scipy.io.loadmat(filename)
+    _, arrays = cache.cached(filename, _PARSE_RESPONSE_VERSION, _parse_mat,
+                             port, use_cache=use_cache)
+    data = [arrays['wavelength'], arrays['power']]
+    return data
 
-    if('scanResults' in data):
-        wavelength = data['scanResults'][0][port][0][:, 0]
-        power = data['scanResults'][0][port][0][:, 1]
-    elif('scandata' in data):
-        wavelength = data['scandata'][0][0][0][:][0]
-        power = data['scandata'][0][0][1][:, port]
-    elif('wavelength' in data):
-        wavelength = data['wavelength'][0][:]
-        power = data['power'][:, port][:]
 
-    data = [wavelength, power]
-    return data
+_SMOOTH_FFT_WINDOW = 64  # window length from which the FFT convolution is faster
 
 
-def smooth(x, y, window=51, order=5, verbose=False):
+@functools.lru_cache(maxsize=32)
+def _savgol_kernel(window, order, deriv):
+    """
+    Savitzky-Golay filter of a (window, order, deriv) setting, cached.
+
+    Returns the convolution coefficients and the matrices that map the first
+    and last window points of a trace to its filtered edge points, from a
+    polynomial fit of the window as in savgol_filter's 'interp' mode. The
+    derivative is per sample, divide by the sample spacing**deriv.
+    """
+    from scipy.signal import savgol_coeffs
+    coeffs = savgol_coeffs(window, order, deriv=deriv, use='conv')
+
+    # edge fits on sample positions mapped to [-1, 1] for conditioning
+    halflen = window // 2
+    scale = (window - 1) / 2 or 1.0
+    u = (np.arange(window) - scale) / scale
+    fit = np.linalg.pinv(np.polynomial.polynomial.polyvander(u, order))
+    if deriv > order:
+        derivative = np.zeros((1, order + 1))
+    else:
+        derivative = np.polynomial.polynomial.polyder(np.eye(order + 1), deriv,
+                                                      scl=1 / scale)
+    degree = derivative.shape[0] - 1
+
+    def edge(positions):
+        return np.polynomial.polynomial.polyvander(u[positions], degree) @ derivative @ fit
+
+    kernel = (coeffs, edge(np.arange(halflen)), edge(np.arange(window - halflen, window)))
+    for i in kernel:
+        i.flags.writeable = False
+    return kernel
+
+
+def smooth(x, y, window=51, order=5, verbose=False, axis=-1, deriv=0, method='auto'):
     """
     Smooth a trace. Apply a Savitzky-Golay filter to an array.
 
+    Several traces can be smoothed at once by passing a 2D (or N-D) block,
+    filtered along axis. The filter coefficients are cached per
+    (window, order, deriv), and the convolution runs directly for short
+    windows or by FFT for long ones.
+
     Parameters
     ----------
     x : list
         X domain of the dataset.
     y : list
-        y domain of the dataset.
+        y domain of the dataset, or a block of traces.
     window : int, optional
         The length of the filter window (i.e., the number of coefficients).
         If mode is ‘interp’, window_length must be less than or equal to the
@@ -108,20 +169,59 @@ def smooth(x, y, window=51, order=5, verbose=False):
         polyorder must be less than window_length. The default is 3.
     verbose : bool, optional
         Optionally plot the result. The default is False.
+    axis : int, optional
+        Axis of y along which to filter. The default is -1.
+    deriv : int, optional
+        Order of the derivative to return, dy/dx for deriv=1, using the
+        average spacing of x. The default is 0 (smoothed data).
+    method : str, optional
+        Convolution method, 'direct', 'fft', or 'auto' to pick one from the
+        window length. 'auto' convolves directly when y has NaN or inf
+        values, as the FFT would spread them over the whole trace.
+        The default is 'auto'.
 
     Returns
     -------
     yhat : ndarray
-        The filtered data.
+        The filtered data (or its derivative).
 
     """
-    from scipy.signal import savgol_filter
-    yhat = savgol_filter(y, window, order)  # window size 51, polynomial order 3
+    from scipy.ndimage import convolve1d
+    from scipy.signal import fftconvolve
+
+    data = np.moveaxis(np.asarray(y, dtype=float), axis, -1)
+    points = data.shape[-1]
+    if window > points:
+        raise ValueError("window must be less than or equal to the size of y.")
+    coeffs, left, right = _savgol_kernel(window, order, deriv)
+
+    if method == 'auto':
+        # the FFT spreads a NaN or inf over the whole trace, direct keeps it local
+        method = ('fft' if window >= _SMOOTH_FFT_WINDOW and window % 2
+                  and np.isfinite(data).all() else 'direct')
+    if method == 'fft':
+        if window % 2 == 0:
+            raise ValueError("The FFT method needs an odd window length.")
+        yhat = fftconvolve(data, coeffs.reshape((1,) * (data.ndim - 1) + (-1,)),
+                           mode='same', axes=-1)
+    elif method == 'direct':
+        yhat = convolve1d(data, coeffs, axis=-1, mode='constant')
+    else:
+        raise ValueError("Invalid convolution method: " + str(method))
+
+    halflen = window // 2
+    yhat[..., :halflen] = data[..., :window] @ left.T
+    yhat[..., points - halflen:] = data[..., points - window:] @ right.T
+    if deriv > 0:
+        x = np.asarray(x, dtype=float)
+        yhat /= ((x[-1] - x[0]) / (x.size - 1))**deriv
+    yhat = np.moveaxis(yhat, -1, axis)
+
     if verbose:
         import matplotlib.pyplot as plt
         plt.figure()
-        plt.plot(x, y, linewidth=0.5, label='Input data')
-        plt.plot(x, yhat, color='red', linewidth=1.5, label='Filtered')
+        plt.plot(x, np.moveaxis(np.asarray(y), axis, -1).T, linewidth=0.5, label='Input data')
+        plt.plot(x, np.moveaxis(yhat, axis, -1).T, color='red', linewidth=1.5, label='Filtered')
         plt.legend(loc=0)
         plt.title("Filtered data with Savitzky-Golay filter")
         plt.xlabel("X")
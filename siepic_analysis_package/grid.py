@@ -0,0 +1,229 @@
+"""
+SiEPIC Analysis Package grid module.
+
+Author:     Mustafa Hammood
+            mustafa@siepic.com
+
+Module:     Implicit, shared wavelength grids of laser sweeps
+
+"""
+import math
+import weakref
+
+import numpy as np
+
+
+class WavelengthGrid(np.lib.mixins.NDArrayOperatorsMixin):
+    """
+    Uniform wavelength grid of a sweep, stored as (start, step, n).
+
+    Grids are interned: creating a grid with the same parameters as an
+    existing one returns the existing instance, so the measurements of a
+    sweep setting all share one grid. The dense wavelength array is only
+    built on first use, and is read-only since it is shared: np.array(grid)
+    returns a writable copy. The grid behaves as a 1D ndarray in NumPy
+    functions and arithmetic.
+
+    Attributes
+    ----------
+    start : float
+        First wavelength of the grid. Units : nm
+    step : float
+        Wavelength step of the grid. Units : nm
+    n : int
+        Number of points in the grid.
+    decimals : int
+        Number of decimals the wavelengths are rounded to, as in the source
+        file. None if the points are not rounded.
+
+    Methods
+    -------
+    from_array(wavl)
+        Returns the grid reproducing a wavelength array exactly, if any.
+    index(value)
+        Index of the grid point nearest to a wavelength, in O(1).
+    truncate(wavl_min, wavl_max)
+        Slice of the grid points within a wavelength range, in O(1).
+    """
+
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, start, step, n, decimals=None):
+        key = (float(start), float(step), int(n), decimals)
+        grid = cls._interned.get(key)
+        if grid is None:
+            grid = super(WavelengthGrid, cls).__new__(cls)
+            grid.start, grid.step, grid.n, grid.decimals = key
+            grid._values = None
+            cls._interned[key] = grid
+        return grid
+
+    # interned, so identity hashing is consistent (== compares the points)
+    __hash__ = object.__hash__
+
+    def __reduce__(self):
+        return (WavelengthGrid, (self.start, self.step, self.n, self.decimals))
+
+    def __repr__(self):
+        return "WavelengthGrid(start=%r, step=%r, n=%r, decimals=%r)" % (
+            self.start, self.step, self.n, self.decimals)
+
+    @classmethod
+    def from_array(cls, wavl):
+        """
+        Find the grid whose points are exactly the given wavelengths.
+
+        Parameters
+        ----------
+        wavl : list or ndarray
+            Wavelength points of a sweep.
+
+        Returns
+        -------
+        WavelengthGrid or None
+            Grid reproducing every point bit for bit, None if the points are
+            not on a uniform grid.
+
+        """
+        wavl = np.asarray(wavl)
+        if wavl.ndim != 1 or wavl.size < 2 or wavl.dtype.kind != 'f':
+            return None
+        start = float(wavl[0])
+        step = (float(wavl[-1]) - start) / (wavl.size - 1)
+        if step == 0 or not math.isfinite(step):
+            return None
+        candidates = [None]
+        # points printed with a fixed number of decimals in the source file
+        head = wavl[:16]
+        for decimals in range(13):
+            if np.array_equal(np.round(head, decimals), head):
+                candidates.append(decimals)
+                break
+        for decimals in candidates:
+            grid = cls(start, step, wavl.size, decimals)
+            if np.array_equal(grid._dense(), wavl):
+                return grid
+        return None
+
+    def _dense(self):
+        values = self.start + self.step * np.arange(self.n)
+        if self.decimals is not None:
+            values = np.round(values, self.decimals)
+        return values
+
+    @property
+    def values(self):
+        """Dense, read-only wavelength array of the grid."""
+        if self._values is None:
+            values = self._dense()
+            values.flags.writeable = False
+            self._values = values
+        return self._values
+
+    def _value(self, idx):
+        # same operations as _dense, so a point matches the dense array exactly
+        value = np.float64(self.start) + np.float64(self.step) * np.float64(idx)
+        if self.decimals is not None:
+            value = np.round(value, self.decimals)
+        return value
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += self.n
+            if not 0 <= key < self.n:
+                raise IndexError("Grid index out of range.")
+            return self._value(key)
+        return self.values[key]
+
+    def __setitem__(self, key, value):
+        raise TypeError("A WavelengthGrid is shared and read-only, "
+                        "use np.array(grid) for a writable copy.")
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __array__(self, dtype=None, copy=None):
+        if copy:
+            return np.array(self.values, dtype=dtype)
+        if dtype is None or np.dtype(dtype) == self.values.dtype:
+            return self.values
+        return self.values.astype(dtype)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        inputs = [i.values if isinstance(i, WavelengthGrid) else i for i in inputs]
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+    def __getattr__(self, name):
+        # ndarray attributes and methods (size, shape, tolist, ...) of the points
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.values, name)
+
+    def index(self, value):
+        """
+        Index of the grid point nearest to a wavelength.
+
+        Ties resolve to the lower index, and NaN or infinite values to
+        index 0, as np.abs(wavl - value).argmin().
+
+        Parameters
+        ----------
+        value : float
+            Wavelength to look up. Units : nm
+
+        Returns
+        -------
+        int
+            Index of the nearest grid point.
+
+        """
+        if not math.isfinite(value):
+            return 0
+        idx = min(max(int(round((value - self.start) / self.step)), 0), self.n - 1)
+        # the rounded points can be off the arithmetic grid, check the neighbours
+        best = idx
+        for i in (idx - 1, idx + 1):
+            if 0 <= i < self.n:
+                d, d_best = abs(value - self._value(i)), abs(value - self._value(best))
+                if d < d_best or (d == d_best and i < best):
+                    best = i
+        return best
+
+    def truncate(self, wavl_min, wavl_max):
+        """
+        Slice of the grid points within [wavl_min, wavl_max].
+
+        Parameters
+        ----------
+        wavl_min : float
+            Minimum wavelength. Units : nm
+        wavl_max : float
+            Maximum wavelength. Units : nm
+
+        Returns
+        -------
+        slice
+            Slice selecting the points of the range, in ascending grid order.
+
+        """
+        if self.step < 0:
+            raise ValueError("Truncation needs an ascending grid.")
+
+        def first(value, inclusive):
+            # first index whose point is >= value (> value if not inclusive)
+            def keep(i):
+                return self._value(i) >= value if inclusive else self._value(i) > value
+            idx = min(max(math.ceil((value - self.start) / self.step), 0), self.n)
+            while idx > 0 and keep(idx - 1):
+                idx -= 1
+            while idx < self.n and not keep(idx):
+                idx += 1
+            return idx
+
+        start = first(wavl_min, True)
+        stop = max(first(wavl_max, False), start)
+        return slice(start, stop)
@@ -8,9 +8,14 @@ Module:     Ansys Lumerical tools module
 
 """
 import numpy as np
+import collections
+import json
 import logging
 import matplotlib.pyplot as plt
+import mmap
+import os
 import re
+import warnings
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -21,9 +26,23 @@ ch.setFormatter(formatter)
 logger.addHandler(ch)
 
 
+def _key_attribute(name):
+    """Port or mode attribute of s, counting its changes so indexes notice them."""
+    def set_value(self, value):
+        setattr(self, name, value)
+        s._key_changes += 1
+    return property(lambda self: getattr(self, name), set_value)
+
+
 class s:
     """Component's single in-out s-parameter dataset class."""
 
+    _key_changes = 0  # changes of the ports or modes of any entry, after creation
+    in_port = _key_attribute("_in_port")
+    out_port = _key_attribute("_out_port")
+    in_modeid = _key_attribute("_in_modeid")
+    out_modeid = _key_attribute("_out_modeid")
+
     def __init__(
         self,
         f: list,
@@ -37,11 +56,11 @@ class s:
         data_type: int = 1,
         group_delay: float = 0.0,
     ):
-        self.in_port = in_port
-        self.out_port = out_port
+        self._in_port = in_port
+        self._out_port = out_port
         self.mode_label = mode_label
-        self.in_modeid = in_modeid
-        self.out_modeid = out_modeid
+        self._in_modeid = in_modeid
+        self._out_modeid = out_modeid
         self.data_type = data_type
         self.group_delay = group_delay
         self.f = f
@@ -82,6 +101,67 @@ class s:
         ax.legend()
         return fig, ax
 
+
+class _lazy_s(s):
+    """s-parameter dataset whose f, s_mag and s_phase are loaded on first access."""
+
+    def __init__(self, load, in_port, out_port, mode_label, in_modeid, out_modeid,
+                 data_type, group_delay):
+        self._in_port = in_port
+        self._out_port = out_port
+        self.mode_label = mode_label
+        self._in_modeid = in_modeid
+        self._out_modeid = out_modeid
+        self.data_type = data_type
+        self.group_delay = group_delay
+        self._load = load  # callable returning (f, s_mag, s_phase)
+        self._arrays = None
+
+    @property
+    def loaded(self):
+        return self._arrays is not None
+
+    def _get(self, i):
+        if self._arrays is None:
+            self._arrays = list(self._load())
+            self._load = None
+        return self._arrays[i]
+
+    def _set(self, i, value):
+        self._get(i)
+        self._arrays[i] = value
+
+    f = property(lambda self: self._get(0), lambda self, value: self._set(0, value))
+    s_mag = property(lambda self: self._get(1), lambda self, value: self._set(1, value))
+    s_phase = property(lambda self: self._get(2), lambda self, value: self._set(2, value))
+
+
+def _idn(label):
+    """Index of a port or mode label: its digits as an int ("port 2" -> 2)."""
+    if isinstance(label, (int, np.integer)):
+        return int(label)
+    digits = "".join(char for char in str(label) if char.isdigit())
+    return int(digits) if digits else str(label)
+
+
+class _entries(list):
+    """List of s-parameter entries, counting the changes other than appends."""
+
+    changes = 0
+
+
+def _counted(method):
+    def counted(self, *args, **kwargs):
+        self.changes += 1
+        return method(self, *args, **kwargs)
+    return counted
+
+
+for _name in ("__setitem__", "__delitem__", "__imul__", "insert", "pop", "remove",
+              "clear", "sort", "reverse"):
+    setattr(_entries, _name, _counted(getattr(list, _name)))
+
+
 class port:
     """Component port abstraction class."""
 
@@ -102,8 +182,78 @@ class sparameters:
         self.name = name
         self.ports = []
         self.data = []
+        # (out_port, in_port, out_modeid, in_modeid) -> position in self.data
+        self._index = {}
+        # (data, data.changes, s._key_changes, entries) when the index was updated
+        self._indexed = (None, 0, 0, 0)
+        # reciprocal component: S(out, in) = S(in, out), only one of them stored
+        self.reciprocal = False
+        self._array = None  # cached (f, ports, modes, tensor) of to_array()
         return
 
+    @staticmethod
+    def key(out_port, in_port, out_modeid=1, in_modeid=1):
+        """Index key of an S-parameter entry, from port/mode indices or labels."""
+        return (_idn(out_port), _idn(in_port), _idn(out_modeid), _idn(in_modeid))
+
+    @classmethod
+    def _entry_key(cls, d):
+        return cls.key(d.out_port, d.in_port, d.out_modeid, d.in_modeid)
+
+    @property
+    def data(self):
+        """S-parameter entries, a list whose changes are tracked by the index."""
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value if isinstance(value, _entries) else _entries(value)
+
+    def reindex(self):
+        """
+        Rebuild the index of the S-parameter entries.
+
+        Entries appended to, replaced in or removed from self.data, a new
+        self.data list and entries whose ports or modes are changed are
+        tracked, and the index is updated on the next lookup: there is no
+        need to call reindex() unless an entry is changed in another way.
+
+        Returns
+        -------
+        None.
+
+        """
+        data = self._data
+        index = {}
+        for idx, d in enumerate(data):
+            # first entry wins, as with a linear search
+            index.setdefault(self._entry_key(d), idx)
+        indexed_data, changes = self._indexed[:2]
+        if indexed_data is not data or changes != data.changes or index != self._index:
+            self._array = None
+        self._index = index
+        self._indexed = (data, data.changes, s._key_changes, len(data))
+
+    def _update_index(self):
+        data = self._data
+        indexed_data, changes, key_changes, n = self._indexed
+        if indexed_data is not data or changes != data.changes or key_changes != s._key_changes:
+            # entries were replaced or removed, or their ports or modes changed
+            self.reindex()
+            return
+        if n == len(data):
+            return
+        for idx in range(n, len(data)):
+            self._index.setdefault(self._entry_key(data[idx]), idx)
+        self._indexed = (data, changes, key_changes, len(data))
+        self._array = None
+
+    def _find(self, key):
+        idx = self._index.get(key)
+        if idx is None and self.reciprocal:
+            idx = self._index.get((key[1], key[0], key[3], key[2]))
+        return idx
+
     def add_port(self, port_name: str, port_direction: str):
         """
         Add a port to the component s-parameters.
@@ -121,6 +271,7 @@ class sparameters:
 
         """
         self.ports.append(port(port_name, port_direction))
+        self._array = None
 
     def add_data(
         self,
@@ -179,6 +330,7 @@ class sparameters:
             s_phase=s_phase,
         )
         self.data.append(data)
+        self._update_index()
 
     def S(
         self,
@@ -189,6 +341,10 @@ class sparameters:
     ) -> s:
         """fetches the specified S parameter entry
 
+        The entry is found through an index of the entries, which is updated
+        when entries are appended, replaced or removed or have their ports or
+        modes changed (see reindex()).
+
         Args:
             in_port (int, optional): input port index. Defaults to 1.
             out_port (int, optional): output port index. Defaults to 1.
@@ -198,10 +354,367 @@ class sparameters:
         Returns:
             s: s_parameter entry
         """
+        self._update_index()
+        idx = self._find(self.key(out_port, in_port, out_modeid, in_modeid))
+        if idx is None:
+            logger.warning("Cannot find specified S-parameter entry.")
+            return None
+        return self.data[idx]
+
+    def S_many(self, keys=None) -> list:
+        """fetches many S parameter entries in one call
+
+        Args:
+            keys (list, optional): (out_port, in_port, out_modeid, in_modeid)
+                tuple of each entry, with indices or labels. Defaults to all the
+                entries in the index.
+
+        Returns:
+            list: s_parameter entries, None for the entries that are not found.
+        """
+        self._update_index()
+        if keys is None:
+            return [self.data[idx] for idx in self._index.values()]
+        entries = [self._find(self.key(*k)) for k in keys]
+        missing = [k for k, idx in zip(keys, entries) if idx is None]
+        if missing:
+            logger.warning(f"Cannot find specified S-parameter entries: {missing}")
+        return [None if idx is None else self.data[idx] for idx in entries]
+
+    def _axes(self):
+        """Port and mode index axes of the tensor view."""
+        ports = [_idn(p.name) for p in self.ports]
+        modes = set()
+        for out_port, in_port, out_modeid, in_modeid in self._index:
+            for p in (out_port, in_port):
+                if p not in ports:
+                    ports.append(p)
+            modes.update((out_modeid, in_modeid))
+        # numeric mode indices first, in numeric order
+        return list(dict.fromkeys(ports)), sorted(modes, key=lambda m: (isinstance(m, str), m))
+
+    def to_array(self):
+        """
+        Dense complex S-matrix tensor of the component.
+
+        The tensor is built once, in a single vectorized pass over the
+        entries, and cached until data or ports are added or entries are
+        replaced, removed or have their ports or modes changed. Missing
+        entries are zero (filled from the transposed entry if the component
+        is reciprocal).
+
+        Returns
+        -------
+        S : ndarray
+            Read-only complex tensor s_mag * exp(1j * s_phase), shaped
+            (freq, out_port, out_mode, in_port, in_mode). See array_axes()
+            for the frequency, port and mode of each index.
+
+        """
+        self._update_index()
+        if self._array is None:
+            ports, modes = self._axes()
+            entries = [self.data[idx] for idx in self._index.values()]
+            if not entries:
+                f = np.empty(0)
+            else:
+                f = np.asarray(entries[0].f, dtype=float)
+                if any(not np.array_equal(d.f, f) for d in entries[1:]):
+                    raise ValueError(
+                        "S-parameter entries do not share a frequency axis, resample them first."
+                    )
+            mag = np.array([d.s_mag for d in entries], dtype=float).reshape(len(entries), f.size)
+            phase = np.array([d.s_phase for d in entries], dtype=float).reshape(mag.shape)
+            port_pos = {p: i for i, p in enumerate(ports)}
+            mode_pos = {m: i for i, m in enumerate(modes)}
+            keys = list(self._index)
+            o, i = (np.array([port_pos[k[c]] for k in keys], dtype=int) for c in (0, 1))
+            om, im = (np.array([mode_pos[k[c]] for k in keys], dtype=int) for c in (2, 3))
+
+            S = np.zeros((f.size, len(ports), len(modes), len(ports), len(modes)), dtype=complex)
+            values = (mag * np.exp(1j * phase)).T
+            if self.reciprocal:
+                S[:, i, im, o, om] = values
+            S[:, o, om, i, im] = values
+            S.flags.writeable = False
+            self._array = (f, ports, modes, S)
+        return self._array[3]
+
+    def array_axes(self):
+        """
+        Axes of the tensor view returned by to_array().
+
+        Returns
+        -------
+        f : ndarray
+            Frequency points of the first axis.
+        ports : list
+            Port index of each position of the port axes, in the order of
+            self.ports.
+        modes : list
+            Mode index of each position of the mode axes.
+
+        """
+        self.to_array()
+        f, ports, modes, _ = self._array
+        return f, ports, modes
+
+    @classmethod
+    def from_array(
+        cls,
+        S,
+        f,
+        name: str = "component",
+        ports: list | None = None,
+        modes: list | None = None,
+        mode_label: str = "TE",
+        data_type: str = "transmission",
+        reciprocal: bool = False,
+    ):
+        """
+        Build a component from a complex S-matrix tensor.
+
+        Parameters
+        ----------
+        S : ndarray
+            Complex tensor shaped (freq, out_port, out_mode, in_port, in_mode).
+        f : list or ndarray
+            Frequency points of the first axis.
+        name : string, optional
+            Component name. The default is "component".
+        ports : list, optional
+            Port names. The default is "port 1", "port 2", ...
+        modes : list, optional
+            Mode indices. The default is 1, 2, ...
+        mode_label : string, optional
+            Mode label of the entries. The default is "TE".
+        data_type : string, optional
+            S-parameter data type of the entries. The default is "transmission".
+        reciprocal : Boolean, optional
+            The component is reciprocal: only the entries on and above the
+            diagonal of the (port, mode) matrix are stored, halving the memory.
+            The default is False.
+
+        Returns
+        -------
+        sparameters
+            Component with one entry per (out_port, out_mode, in_port, in_mode).
+
+        """
+        S = np.asarray(S, dtype=complex)
+        f = np.asarray(f, dtype=float)
+        if S.ndim != 5 or S.shape[0] != f.size or S.shape[1:3] != S.shape[3:5]:
+            raise ValueError(
+                "S must be shaped (freq, out_port, out_mode, in_port, in_mode)."
+            )
+        n_ports, n_modes = S.shape[1:3]
+        if ports is None:
+            ports = [f"port {i + 1}" for i in range(n_ports)]
+        if modes is None:
+            modes = list(range(1, n_modes + 1))
+        if len(ports) != n_ports or len(modes) != n_modes:
+            raise ValueError("Number of ports or modes does not match S.")
+
+        spar = cls(name=name)
+        for p in ports:
+            spar.add_port(p, "")
+        # one (entries, freq) magnitude and phase block, rows viewed by the entries
+        flat = S.reshape(f.size, n_ports * n_modes, n_ports * n_modes)
+        out_idx, in_idx = (np.triu_indices(n_ports * n_modes) if reciprocal
+                           else np.indices(flat.shape[1:]).reshape(2, -1))
+        values = flat[:, out_idx, in_idx].T
+        mag, phase = np.abs(values), np.angle(values)
+        for k, (o, i) in enumerate(zip(out_idx.tolist(), in_idx.tolist())):
+            spar.add_data(
+                ports[i // n_modes],
+                ports[o // n_modes],
+                mode_label,
+                str(modes[i % n_modes]),
+                str(modes[o % n_modes]),
+                data_type,
+                0.0,
+                f,
+                mag[k],
+                phase[k],
+            )
+        spar.reciprocal = reciprocal
+        return spar
+
+    def resample(self, f, kind: str = "linear", fill_value=np.nan):
+        """
+        Resample all the S-parameter entries onto new frequency points.
+
+        Magnitude and unwrapped phase are interpolated. The entries sharing a
+        frequency grid are resampled together, with one sparse matrix product
+        whose interpolation stencil is cached per (grid, new points) pair.
+
+        Parameters
+        ----------
+        f : list or ndarray
+            New frequency points.
+        kind : string, optional
+            Interpolation kind, "linear" or "nearest". The default is "linear".
+        fill_value : float, optional
+            Magnitude and phase outside of the frequency range of an entry.
+            The default is NaN.
+
+        Returns
+        -------
+        sparameters
+            Component with the same ports and entries on the new points. The
+            phases are unwrapped along the frequency axis.
+
+        """
+        f_new = np.asarray(f, dtype=float)
+        if f_new.ndim != 1:
+            raise ValueError("Frequency points must be a 1D array.")
+        # entries sharing a frequency grid
+        grids = {}
+        for idx, d in enumerate(self.data):
+            f_d = np.asarray(d.f, dtype=float)
+            grids.setdefault((f_d.size, f_d.tobytes()), (f_d, []))[1].append(idx)
+
+        mag, phase = [None] * len(self.data), [None] * len(self.data)
+        for f_d, entries in grids.values():
+            if f_d.size == 0:
+                raise ValueError("S-parameter entry without frequency points.")
+            stencil = _stencil(f_d, f_new, kind)
+            block = np.empty((2, len(entries), f_d.size))
+            for k, idx in enumerate(entries):
+                block[0, k] = self.data[idx].s_mag
+                block[1, k] = self.data[idx].s_phase
+            block = block[..., stencil.order]
+            block[1] = np.unwrap(block[1], axis=-1)
+            result = stencil.apply(block, fill_value)
+            for k, idx in enumerate(entries):
+                mag[idx], phase[idx] = result[0, k], result[1, k]
+
+        spar = sparameters(name=self.name)
+        for p in self.ports:
+            spar.add_port(p.name, p.direction)
+        for idx, d in enumerate(self.data):
+            spar.add_data(d.in_port, d.out_port, d.mode_label, d.in_modeid, d.out_modeid,
+                          d.data_type, d.group_delay, f_new, mag[idx], phase[idx])
+        spar.reciprocal = self.reciprocal
+        return spar
+
+    def to_dat(self, file_path: str):
+        """
+        Write the s-parameters to a Lumerical INTERCONNECT .dat file.
+
+        Every dataset is written with its ports, mode label and IDs, data
+        type and group delay. Each (N, 3) numeric block is formatted in a
+        single call with 17 significant digits, so reading the file back with
+        process_dat reproduces the data exactly. The entries of a reciprocal
+        component are written along with their transposed entry, which is
+        not stored but needed by INTERCONNECT.
+
+        Parameters
+        ----------
+        file_path : string
+            Path of the .dat file to write.
+
+        Returns
+        -------
+        None.
+
+        """
+        self._update_index()
+        stored = set(self._index)
+        with open(file_path, "w", encoding="utf-8", newline="\n") as file:
+            for p in self.ports:
+                file.write(f'["{p.name}","{p.direction}"]\n')
+            for d in self.data:
+                entries = [(d.out_port, d.in_port, d.out_modeid, d.in_modeid)]
+                if self.reciprocal:
+                    # only one of S(out, in) and S(in, out) is stored, write both
+                    o, i, om, im = self.key(*entries[0])
+                    if (i, o, im, om) not in stored:
+                        entries.append((d.in_port, d.out_port, d.in_modeid, d.out_modeid))
+                        stored.add((i, o, im, om))
+                if isinstance(d.group_delay, str):
+                    # as read from a file, empty if the header has no group delay
+                    group_delay = f",{d.group_delay}" if d.group_delay else ""
+                else:
+                    group_delay = f",{float(d.group_delay)!r}"
+                block = np.column_stack([d.f, d.s_mag, d.s_phase]).astype(float)
+                values = ("%.16e %.16e %.16e\n" * len(block)) % tuple(block.ravel().tolist())
+                for out_port, in_port, out_modeid, in_modeid in entries:
+                    file.write(
+                        f'("{out_port}","{d.mode_label}",{out_modeid},"{in_port}",'
+                        f'{in_modeid},"{d.data_type}"{group_delay})\n({len(block)}, 3)\n'
+                    )
+                    file.write(values)
+
+    def to_binary(self, file_path: str, source: dict | None = None):
+        """
+        Write the s-parameters to a binary file, read back by read_binary().
+
+        The file holds a JSON header (ports, reciprocity and the metadata and
+        location of every dataset) followed by the float64 data of the datasets, so that
+        readers can memory-map it. Frequency points shared by consecutive
+        datasets are stored once.
+
+        Parameters
+        ----------
+        file_path : string
+            Path of the binary file to write.
+        source : dict, optional
+            Size and modification time of the .dat file the data comes from,
+            used to tell if a sidecar file is up to date. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        arrays = []
+        blocks = []
+        offset = 0
+        shared_f = (None, 0)  # last stored frequency points and their offset
         for d in self.data:
-            if d.idn == f"{out_port}{in_port}_{out_modeid}{in_modeid}":
-                return d
-        logger.warning("Cannot find specified S-parameter entry.")
+            f, s_mag, s_phase = (np.asarray(i, dtype="<f8").ravel() for i in (d.f, d.s_mag, d.s_phase))
+            if not f.size == s_mag.size == s_phase.size:
+                raise ValueError(f"S-parameter dataset S{d.idn} has mismatched data lengths.")
+            group_delay = d.group_delay if isinstance(d.group_delay, str) else float(d.group_delay)
+            block = {
+                "in_port": d.in_port,
+                "out_port": d.out_port,
+                "mode_label": d.mode_label,
+                "in_modeid": d.in_modeid,
+                "out_modeid": d.out_modeid,
+                "data_type": d.data_type,
+                "group_delay": group_delay,
+                "points": f.size,
+            }
+            if shared_f[0] is None or not np.array_equal(f, shared_f[0]):
+                shared_f = (f, offset)
+                arrays.append(f)
+                offset += f.size
+            block["f"] = shared_f[1]
+            for field, values in (("s_mag", s_mag), ("s_phase", s_phase)):
+                block[field] = offset
+                arrays.append(values)
+                offset += values.size
+            blocks.append(block)
+
+        header = json.dumps({
+            "version": _BINARY_VERSION,
+            "name": self.name,
+            "ports": [[p.name, p.direction] for p in self.ports],
+            "reciprocal": self.reciprocal,
+            "source": source,
+            "blocks": blocks,
+        }).encode("utf-8")
+        header += b" " * (-len(header) % 8)  # 8 byte aligned data
+        tmp = file_path + "." + str(os.getpid()) + ".tmp"
+        with open(tmp, "wb") as file:
+            file.write(_BINARY_MAGIC)
+            file.write(len(header).to_bytes(8, "little"))
+            file.write(header)
+            for values in arrays:
+                file.write(values.tobytes())
+        os.replace(tmp, file_path)  # atomic, readers never see partial files
 
     def plot(self, plot_type: str = "log"):
         valid_plots = ["log", "phase", "linear"]
@@ -239,6 +752,301 @@ class sparameters:
         else:
             logging.error("No valid data to visualize")
 
+
+class _Stencil(object):
+    """Sparse interpolation matrix from a frequency grid onto another.
+
+    Each target point is a weighted sum of (at most) two neighbouring source
+    points, so resampling any number of entries is a single sparse product
+    of the (entries, source points) block with the matrix. The source points
+    can be in any order, the block columns are taken in ascending order.
+    """
+
+    def __init__(self, f, f_new, kind="linear"):
+        from scipy.sparse import csr_matrix
+
+        self.f, self.f_new, self.kind = f, f_new, kind
+        self.order = np.argsort(f, kind="stable")
+        x = f[self.order]
+        lo = np.clip(np.searchsorted(x, f_new, side="right") - 1, 0, max(x.size - 2, 0))
+        hi = np.minimum(lo + 1, x.size - 1)
+        dx = x[hi] - x[lo]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(dx > 0, (f_new - x[lo]) / dx, 0.0)
+        if kind == "nearest":
+            t = (t > 0.5).astype(float)  # ties go to the lower point
+        elif kind != "linear":
+            raise ValueError(f"Invalid interpolation kind: {kind}")
+        rows = np.column_stack([lo, hi]).ravel()
+        cols = np.repeat(np.arange(f_new.size), 2)
+        weights = np.column_stack([1 - t, t]).ravel()
+        # (source, target) weights: block @ matrix is the fastest product
+        self.matrix = csr_matrix((weights, (rows, cols)), shape=(x.size, f_new.size))
+        self.inside = (f_new >= x[0]) & (f_new <= x[-1])
+
+    def apply(self, values, fill_value=np.nan):
+        """Resample a (..., source points) block, columns in ascending order."""
+        shape = values.shape
+        result = values.reshape(-1, shape[-1]) @ self.matrix
+        result[:, ~self.inside] = fill_value
+        return result.reshape(shape[:-1] + (self.f_new.size,))
+
+
+_STENCILS = collections.OrderedDict()
+_STENCILS_SIZE = 32  # number of (source grid, target grid, kind) stencils kept
+
+
+def _stencil(f, f_new, kind="linear"):
+    """Cached interpolation stencil of a grid pair, least recently used eviction."""
+    key = (f.size, hash(f.tobytes()), f_new.size, hash(f_new.tobytes()), kind)
+    stencil = _STENCILS.get(key)
+    if (stencil is not None and np.array_equal(stencil.f, f)
+            and np.array_equal(stencil.f_new, f_new)):
+        _STENCILS.move_to_end(key)
+        return stencil
+    stencil = _Stencil(f.copy(), f_new.copy(), kind)
+    _STENCILS[key] = stencil
+    if len(_STENCILS) > _STENCILS_SIZE:
+        _STENCILS.popitem(last=False)
+    return stencil
+
+
+def _common_frequency(components, f=None):
+    """Frequency points shared by components: the first component's points
+    within the range covered by all of them, unless given."""
+    if f is not None:
+        return np.asarray(f, dtype=float)
+    axes = [c.array_axes()[0] for c in components]
+    f = axes[0]
+    if all(np.array_equal(i, f) for i in axes[1:]):
+        return f
+    inside = (f >= max(i.min() for i in axes)) & (f <= min(i.max() for i in axes))
+    if not inside.any():
+        raise ValueError("Components do not share a frequency range.")
+    return f[inside]
+
+
+def _resample_tensor(S, f, f_new):
+    """Linear interpolation of an S tensor in magnitude and unwrapped phase."""
+    stencil = _stencil(f, f_new)
+    flat = S.reshape(f.size, -1)[stencil.order].T
+    mag = stencil.apply(np.abs(flat))
+    phase = stencil.apply(np.unwrap(np.angle(flat), axis=-1))
+    if np.isnan(mag).any():
+        raise ValueError("Frequency points outside of the component's data range.")
+    return (mag * np.exp(1j * phase)).T.reshape((f_new.size,) + S.shape[1:])
+
+
+def _contract(S, labels, label_a, label_b, n_modes):
+    """Connect two ports of a flat (freq, ports*modes, ports*modes) matrix.
+
+    Outgoing waves of each port enter the other one, mode by mode:
+    S' = S_EE + S_EI G (1 - S_II G)^-1 S_IE, with G swapping the two ports.
+    """
+    i, j = labels.index(label_a), labels.index(label_b)
+    modes = np.arange(n_modes)
+    internal = np.concatenate([i * n_modes + modes, j * n_modes + modes])
+    external = np.setdiff1d(np.arange(S.shape[-1]), internal)
+    swap = np.concatenate([modes + n_modes, modes])
+
+    S_II = S[:, internal[:, None], internal[swap]]  # S_II G
+    S_IE = S[:, internal[:, None], external]
+    S_EI = S[:, external[:, None], internal[swap]]  # S_EI G
+    S_EE = S[:, external[:, None], external]
+    X = np.linalg.solve(np.eye(2 * n_modes) - S_II, S_IE)
+    return S_EE + S_EI @ X, [lab for lab in labels if lab not in (label_a, label_b)]
+
+
+def _inverse(A):
+    """Inverse of a batch of small matrices, elementwise for 1x1."""
+    if A.shape[-1] == 1:
+        return 1 / A
+    return np.linalg.inv(A)
+
+
+def _mul(A, B):
+    """Product of batches of small matrices, elementwise for single mode ports."""
+    if A.shape[-1] == 1:
+        return A * B
+    return A @ B
+
+
+def _star(S_a, labels_a, label_a, S_b, labels_b, label_b, n_modes):
+    """Connect a port of one flat S matrix to a port of another one.
+
+    Redheffer star product: only the (modes, modes) loop between the two
+    connected ports, 1 - A_kk B_ll, is inverted.
+    """
+    def split(S, labels, lab):
+        k = labels.index(lab)
+        port = np.arange(k * n_modes, (k + 1) * n_modes)
+        ext = np.setdiff1d(np.arange(S.shape[-1]), port)
+        return (S[:, ext[:, None], ext], S[:, ext[:, None], port],
+                S[:, port[:, None], ext], S[:, port[:, None], port])
+
+    A_EE, A_Ek, A_kE, A_kk = split(S_a, labels_a, label_a)
+    B_EE, B_El, B_lE, B_ll = split(S_b, labels_b, label_b)
+    D = _inverse(np.eye(n_modes) - _mul(A_kk, B_ll))
+    D_A = _mul(D, A_kE)  # wave leaving port k, per unit input of a
+    D_B = _mul(D, _mul(A_kk, B_lE))  # wave leaving port k, per unit input of b
+
+    n_a, n = A_EE.shape[-1], A_EE.shape[-1] + B_EE.shape[-1]
+    S = np.empty((S_a.shape[0], n, n), dtype=complex)
+    S[:, :n_a, :n_a] = A_EE + _mul(A_Ek, _mul(B_ll, D_A))
+    S[:, :n_a, n_a:] = _mul(A_Ek, B_lE + _mul(B_ll, D_B))
+    S[:, n_a:, :n_a] = _mul(B_El, D_A)
+    S[:, n_a:, n_a:] = B_EE + _mul(B_El, D_B)
+    labels = [i for i in labels_a if i != label_a] + [i for i in labels_b if i != label_b]
+    return S, labels
+
+
+def _block_diagonal(S_a, S_b):
+    n_a, n_b = S_a.shape[-1], S_b.shape[-1]
+    S = np.zeros((S_a.shape[0], n_a + n_b, n_a + n_b), dtype=complex)
+    S[:, :n_a, :n_a] = S_a
+    S[:, n_a:, n_a:] = S_b
+    return S
+
+
+def netlist(components, connections, name: str = "circuit", external=None, f=None):
+    """
+    Combine components into a circuit by connecting their ports.
+
+    Uses the subnetwork growth algorithm: components are merged one
+    connection at a time, and each connection is eliminated for all the
+    frequency points and modes at once with batched linear solves. Loops
+    (connecting two ports of the same subnetwork) are supported.
+
+    Parameters
+    ----------
+    components : dict or list
+        sparameters objects, keyed by name (dict) or by position (list).
+    connections : list
+        ((component, port), (component, port)) pairs of connected ports. A
+        port is its index (e.g. 2 for "port 2") or its name.
+    name : string, optional
+        Circuit name. The default is "circuit".
+    external : list, optional
+        (component, port) of the circuit ports, in order. The default is
+        every unconnected port, in the order of the components.
+    f : list or ndarray, optional
+        Frequency points of the circuit. The default is the points of the
+        first component within the range of all the components. Components
+        on other points are resampled (magnitude and unwrapped phase).
+
+    Returns
+    -------
+    sparameters
+        Circuit s-parameters, with ports "port 1", "port 2", ... in the
+        order of the external ports. All the components must have the same
+        modes, and modes are connected to the same modes.
+
+    """
+    if not isinstance(components, dict):
+        components = dict(enumerate(components))
+    keys = list(components)
+    f = _common_frequency(list(components.values()), f)
+
+    modes = None
+    nets = {}  # subnetwork id: (flat S matrix, (component, port) of its ports)
+    group = {}  # component: subnetwork id
+    directions = {}
+    rank = {}  # (component, port): position in the components and their ports
+    for n, key in enumerate(keys):
+        c = components[key]
+        c_f, c_ports, c_modes = c.array_axes()
+        if modes is None:
+            modes = c_modes
+        elif c_modes != modes:
+            raise ValueError("Components do not have the same modes.")
+        S = c.to_array()
+        if not np.array_equal(c_f, f):
+            S = _resample_tensor(S, c_f, f)
+        size = len(c_ports) * len(modes)
+        nets[n] = (S.reshape(f.size, size, size), [(key, p) for p in c_ports])
+        rank.update(((key, p), (n, j)) for j, p in enumerate(c_ports))
+        group[key] = n
+        directions.update(((key, _idn(p.name)), p.direction) for p in c.ports)
+
+    def label(component, port_id):
+        if component not in group:
+            raise ValueError(f"Unknown component: {component}")
+        return (component, _idn(port_id))
+
+    for end_a, end_b in connections:
+        label_a, label_b = label(*end_a), label(*end_b)
+        if label_a == label_b:
+            raise ValueError(f"Cannot connect a port to itself: {end_a}")
+        net_a, net_b = group[label_a[0]], group[label_b[0]]
+        for end, lab, net in ((end_a, label_a, net_a), (end_b, label_b, net_b)):
+            if lab not in nets[net][1]:
+                raise ValueError(f"Port {end} does not exist or is already connected.")
+        if net_a == net_b:
+            # loop within a subnetwork
+            nets[net_a] = _contract(*nets[net_a], label_a, label_b, len(modes))
+        else:
+            S_b, labels_b = nets.pop(net_b)
+            nets[net_a] = _star(*nets[net_a], label_a, S_b, labels_b, label_b, len(modes))
+            for component, net in group.items():
+                if net == net_b:
+                    group[component] = net_a
+
+    # independent subnetworks are combined block-diagonally
+    ids = sorted(nets)
+    S, labels = nets[ids[0]]
+    for net in ids[1:]:
+        S, labels = _block_diagonal(S, nets[net][0]), labels + nets[net][1]
+    if external is None:
+        order = sorted(range(len(labels)), key=lambda i: rank[labels[i]])
+    else:
+        order = [labels.index(label(*end)) for end in external]
+    if order != list(range(len(labels))):
+        idx = (np.array(order, dtype=int)[:, None] * len(modes) + np.arange(len(modes))).ravel()
+        S, labels = S[:, idx[:, None], idx], [labels[i] for i in order]
+
+    n_ports = len(labels)
+    circuit = sparameters.from_array(
+        S.reshape(f.size, n_ports, len(modes), n_ports, len(modes)), f, name=name,
+        modes=modes,
+    )
+    for p, lab in zip(circuit.ports, labels):
+        p.direction = directions.get(lab, "")
+    return circuit
+
+
+def connect(a, port_a, b, port_b, name: str | None = None, f=None):
+    """
+    Connect a port of a component to a port of another one.
+
+    Parameters
+    ----------
+    a : sparameters
+        First component.
+    port_a : int or string
+        Port of the first component, its index or name.
+    b : sparameters
+        Second component, or the first one to connect two of its ports.
+    port_b : int or string
+        Port of the second component, its index or name.
+    name : string, optional
+        Name of the result. The default is "<a.name>+<b.name>".
+    f : list or ndarray, optional
+        Frequency points of the result, see netlist().
+
+    Returns
+    -------
+    sparameters
+        Combined component, the unconnected ports of a then of b renumbered
+        "port 1", "port 2", ...
+
+    """
+    if name is None:
+        name = a.name if b is a else f"{a.name}+{b.name}"
+    if b is a:
+        return netlist([a], [((0, port_a), (0, port_b))], name=name, f=f)
+    return netlist([a, b], [((0, port_a), (1, port_b))], name=name, f=f)
+
+
 class S_param_file():
     """Object that writes data to Lumerical INTERCONNECT S-parameters .dat format
     """
@@ -295,95 +1103,266 @@ class S_param_file():
             file.write(text)
         return 0
 
-    def write_S(self):
-        self.npoints()
-        f = self.make_file()
-        self.write_header(f)
+    def to_sparameters(self):
+        """Component s-parameters of the data, S11, S12, ..., S21, S22, ... in order."""
+        c = 299792458 #m/s
+        wavelength = np.linspace(self.wavl[0], self.wavl[1], self.npoints())
+        freq = np.flip(c/wavelength)
+        spar = sparameters(name=self.name)
+        for i in range(self.n_ports):
+            spar.add_port('port %d' % (i+1), '')
         idx = 0
         for i in range(self.n_ports):
             for k in range(self.n_ports):
-                S = [i+1,k+1,1,1] # out_port, in_port2, out_OID1, in_OID2
-                self.write_S_header(f, S)
-                self.write_S_data(f, self.data[idx])
+                data = self.data[idx]
+                spar.add_data('port %d' % (k+1), 'port %d' % (i+1), 'mode 1', '1', '1',
+                              'transmission', '', freq, np.asarray(data[0], dtype=float),
+                              np.asarray(data[1], dtype=float))
                 idx+=1
-        f.close()
+        return spar
+
+    def write_S(self):
+        self.to_sparameters().to_dat(self.name+'.dat')
         return 0
 
 
-def process_dat(file_path: str, name: str | None = None, verbose: bool = True):
+_BINARY_MAGIC = b"SIAPSPAR"
+_BINARY_VERSION = 1
+SIDECAR_SUFFIX = ".siap"  # binary sidecar of a .dat file, next to it
+
+
+def _source(file_path):
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _read_binary_header(file_path):
+    with open(file_path, "rb") as file:
+        if file.read(len(_BINARY_MAGIC)) != _BINARY_MAGIC:
+            raise ValueError(f"Not a binary s-parameters file: {file_path}")
+        size = int.from_bytes(file.read(8), "little")
+        header = json.loads(file.read(size).decode("utf-8"))
+    if header.get("version") != _BINARY_VERSION:
+        raise ValueError(f"Unsupported binary s-parameters version in {file_path}")
+    return header, len(_BINARY_MAGIC) + 8 + size
+
+
+def read_binary(file_path: str, name: str | None = None):
+    """
+    Read a binary s-parameters file written by sparameters.to_binary().
+
+    The file is memory-mapped and a dataset's data is only copied out of it
+    when its f, s_mag or s_phase is first accessed.
+
+    Parameters
+    ----------
+    file_path : string
+        Path of the binary file.
+    name : string, optional
+        Name of the component. The default is the name stored in the file.
+
+    Returns
+    -------
+    sparams : sparameters object.
+        Component s-parameters with lazily loaded datasets.
+
+    """
+    header, data_offset = _read_binary_header(file_path)
+    spar = sparameters(name=name or header["name"])
+    for port_name, port_direction in header["ports"]:
+        spar.add_port(port_name, port_direction)
+
+    blocks = header["blocks"]
+    size = max((max(b["f"], b["s_mag"], b["s_phase"]) + b["points"] for b in blocks), default=0)
+    values = np.memmap(file_path, dtype="<f8", mode="r", offset=data_offset,
+                       shape=(size,)) if size else np.empty(0)
+
+    def load(block):
+        n = block["points"]
+        return lambda: [np.array(values[block[i]:block[i] + n], dtype=float)
+                        for i in ("f", "s_mag", "s_phase")]
+
+    for block in blocks:
+        spar.data.append(_lazy_s(
+            load(block),
+            in_port=block["in_port"],
+            out_port=block["out_port"],
+            mode_label=block["mode_label"],
+            in_modeid=block["in_modeid"],
+            out_modeid=block["out_modeid"],
+            data_type=block["data_type"],
+            group_delay=block["group_delay"],
+        ))
+    spar.reciprocal = header.get("reciprocal", False)
+    return spar
+
+
+def write_sidecar(file_path: str, verbose: bool = False):
+    """
+    Parse a .dat s-parameters file and write its binary sidecar next to it.
+
+    process_dat() then loads the sidecar instead of parsing the file, as
+    long as the .dat file is not modified.
+
+    Parameters
+    ----------
+    file_path : string
+        File path containing the s-parameters data.
+    verbose : Boolean, optional
+        Logging flag. The default is False.
+
+    Returns
+    -------
+    sparams : sparameters object.
+        Parsed sparameters object.
+
+    """
+    source = _source(file_path)  # before parsing, a concurrent change makes it stale
+    spar = process_dat(file_path, verbose=verbose, use_sidecar=False)
+    spar.to_binary(file_path + SIDECAR_SUFFIX, source=source)
+    return spar
+
+
+def _skip_lines(content, pos, count):
+    """Position after the count-th line from pos, None if the content ends first."""
+    size = len(content)
+    chunk = 4096
+    while count and pos < size:
+        view = np.frombuffer(content, dtype=np.uint8, count=min(chunk, size - pos), offset=pos)
+        newlines = np.flatnonzero(view == ord("\n"))
+        if newlines.size >= count:
+            return pos + int(newlines[count - 1]) + 1
+        count -= newlines.size
+        pos += view.size
+        chunk *= 4
+    if count == 1 and pos == size and not content[size - 1:size] == b"\n":
+        return size  # last line without a newline
+    return pos if count == 0 else None
+
+
+def _decode_block(content, start, end, num_points, label, file_path):
+    """f, s_mag and s_phase of an (N, 3) data block, decoded in bulk."""
+    with warnings.catch_warnings():
+        # malformed data stops the decoding early, reported below
+        warnings.simplefilter("ignore", DeprecationWarning)
+        values = np.fromstring(content[start:end], sep=" ") if num_points else np.empty(0)
+    if values.size != 3 * num_points:
+        raise ValueError(f"Malformed S-parameter data block {label} in {file_path}")
+    return values.reshape(num_points, 3).T.copy()
+
+
+def process_dat(file_path: str, name: str | None = None, verbose: bool = True,
+                use_sidecar: bool = True, lazy: bool = False):
     """
     Process a .dat s-parameters file into a sparameters object.
 
+    An indexing pass reads the header lines one by one and skips over the
+    data blocks, recording their byte ranges. Each (N, 3) numeric block is
+    then decoded in bulk, all of them at once or, if lazy, only when the
+    dataset's data is first accessed (e.g. through S()).
+    If an up-to-date binary sidecar (see write_sidecar()) exists next to the
+    file, it is loaded instead, and the datasets are read on first access.
+
     Parameters
     ----------
     file_path : string
         File path containing the s-parameters data.
+    name : string, optional
+        Name of the component. The default is the file name.
     verbose : Boolean, optional
         Logging flag. The default is True.
+    use_sidecar : Boolean, optional
+        Load the binary sidecar of the file when it is up to date.
+        The default is True.
+    lazy : Boolean, optional
+        Memory-map the file and decode the data blocks on demand. The file
+        must not be modified while the object is in use, and a malformed
+        block is only reported when it is accessed. The default is False.
 
     Returns
     -------
     sparams : dpcmgenerator sparameters object.
-        Parsed sparameters object.
+        Parsed sparameters object, with the f, s_mag and s_phase data of
+        every dataset as ndarrays.
 
     """
     if not name:
         name = os.path.basename(file_path)
+    sidecar = file_path + SIDECAR_SUFFIX
+    if use_sidecar and os.path.exists(sidecar):
+        try:
+            if _read_binary_header(sidecar)[0]["source"] == _source(file_path):
+                if verbose:
+                    logger.debug(f"Loading s-parameters from sidecar: {sidecar}")
+                return read_binary(sidecar, name=name)
+        except (OSError, ValueError, KeyError):
+            pass  # unreadable sidecar, parse the .dat file
+        if verbose:
+            logger.debug(f"Ignoring out of date sidecar: {sidecar}")
     spar = sparameters(name=name)
     port_pattern = re.compile(r'\["(.*?)","(.*?)"\]')
     data_pattern = re.compile(r'\("(.*?)","(.*?)",(\d+),"(.+?)",(\d+),"(.+?)",?(.*?)\)')
 
-    with open(file_path, "r") as f:
-        lines = f.readlines()
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            port_match = port_pattern.match(line)
-            data_match = data_pattern.match(line)
-            if port_match:
-                # find the available ports from the file headers
-                port_name, port_direction = port_match.groups()
-                if verbose:
-                    logger.debug(f"Found port: name={port_name} , direction={port_direction}")
-                spar.add_port(port_name, port_direction)
-            elif data_match:
-                # parse an S-parameter dataset header
-                (
-                    out_port,
-                    mode_label,
-                    out_modeid,
-                    in_port,
-                    in_modeid,
-                    data_type,
-                    group_delay,
-                ) = data_match.groups()
-                if verbose:
-                    logger.debug(
-                        f"Found S-param dataset: out_port={out_port}, mode_label={mode_label}, out_modeid={out_modeid}, in_port={in_port}, in_modeid={in_modeid}, data_type={data_type}, group_delay={float(group_delay):.2e}"
-                    )
-                # parse the data set
-                i += 1
-                num_points, _ = map(int, lines[i].strip().strip("()").split(","))
-                freq_data = []
-                for _ in range(num_points):
-                    i += 1
-                    f, s_mag, s_phase = map(float, lines[i].strip().split())
-                    freq_data.append((f, s_mag, s_phase))
-                f = [i[0] for i in freq_data]  # first column in dat
-                s_mag = [i[1] for i in freq_data]  # second column in dat
-                s_phase = [i[2] for i in freq_data]  # third column in dat
-                spar.add_data(
-                    in_port,
-                    out_port,
-                    mode_label,
-                    in_modeid,
-                    out_modeid,
-                    data_type,
-                    group_delay,
-                    f,
-                    s_mag,
-                    s_phase,
-                )
+    with open(file_path, "rb") as f:
+        if lazy and os.fstat(f.fileno()).st_size:
+            content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            content = f.read()
+    size = len(content)
 
-            i += 1
-    return spar
\ No newline at end of file
+    def line(pos):
+        # text of the line starting at pos, and the position of the next line
+        end = content.find(b"\n", pos)
+        end = size if end < 0 else end
+        return content[pos:end].decode().strip(), end + 1
+
+    pos = 0
+    while pos < size:
+        header, pos = line(pos)
+        port_match = port_pattern.match(header)
+        data_match = data_pattern.match(header) if not port_match else None
+        if port_match:
+            # find the available ports from the file headers
+            port_name, port_direction = port_match.groups()
+            if verbose:
+                logger.debug(f"Found port: name={port_name} , direction={port_direction}")
+            spar.add_port(port_name, port_direction)
+        elif data_match:
+            # parse an S-parameter dataset header
+            (
+                out_port,
+                mode_label,
+                out_modeid,
+                in_port,
+                in_modeid,
+                data_type,
+                group_delay,
+            ) = data_match.groups()
+            if verbose:
+                logger.debug(
+                    f"Found S-param dataset: out_port={out_port}, mode_label={mode_label}, out_modeid={out_modeid}, in_port={in_port}, in_modeid={in_modeid}, data_type={data_type}, group_delay={float(group_delay):.2e}"
+                )
+            # locate the (N, 3) data block
+            if pos >= size:
+                raise ValueError(f"Missing S-parameter data block in {file_path}")
+            shape, start = line(pos)
+            num_points, _ = map(int, shape.strip("()").split(","))
+            pos = _skip_lines(content, start, num_points)
+            if pos is None:
+                raise ValueError(f"Truncated S-parameter data block in {file_path}")
+            block = (content, start, pos, num_points, f"S{out_port}{in_port}", file_path)
+            fields = dict(
+                in_port=in_port,
+                out_port=out_port,
+                mode_label=mode_label,
+                in_modeid=in_modeid,
+                out_modeid=out_modeid,
+                data_type=data_type,
+                group_delay=group_delay,
+            )
+            if lazy:
+                spar.data.append(_lazy_s(lambda block=block: _decode_block(*block), **fields))
+            else:
+                f, s_mag, s_phase = _decode_block(*block)
+                spar.add_data(f=f, s_mag=s_mag, s_phase=s_phase, **fields)
+    return spar
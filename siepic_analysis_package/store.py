@@ -0,0 +1,268 @@
+"""
+SiEPIC Analysis Package store module.
+
+Author:     Mustafa Hammood
+            mustafa@siepic.com
+
+Module:     Memory-mapped, append-only store of measurement spectra
+
+"""
+import json
+import os
+
+import numpy as np
+
+from siepic_analysis_package import analysis
+
+
+# location of a device in the data file (float64 items) and in the metadata file (bytes)
+_RECORD = np.dtype([('offset', '<i8'), ('size', '<i8'),
+                    ('meta_offset', '<i8'), ('meta_size', '<i8')])
+
+
+class MeasurementStore(object):
+    """
+    Append-only, single-file store of measurement spectra.
+
+    The spectra are written back to back as float64 records in the data
+    file, each record being the wavelength points followed by the power
+    block of a device. The data file is memory-mapped, so reading a device
+    only pages in its own record. The record locations are kept in a
+    fixed-width binary index next to it (path + '.idx'), and the device
+    metadata in a JSON lines file (path + '.meta'), so opening the store
+    does not depend on the number of devices.
+
+    Attributes
+    ----------
+    path : str
+        Path of the data file.
+    mode : str
+        'r' to open an existing store read-only, 'a' to append to it
+        (the store is created if it does not exist).
+    index : list
+        Index entry of every device, read on demand: metadata fields plus
+        the record offset (in float64 items) and the shape of the power block.
+
+    Methods
+    -------
+    append(device)
+        Append a measurement object to the store.
+    extend(devices)
+        Append several measurement objects to the store.
+    meta()
+        Columnar metadata table of the stored devices.
+    where(**criteria)
+        Indices of the devices matching metadata criteria.
+    to_set(indices)
+        Load devices sharing a wavelength grid into a MeasurementSet.
+    """
+
+    def __init__(self, path, mode='r'):
+        if mode not in ['r', 'a']:
+            raise ValueError("Invalid store mode: " + str(mode))
+        self.path = path
+        self.mode = mode
+        self._data = None  # memory map, (re)opened on demand
+        self._end = 0  # number of float64 items written to the data file
+        self._meta_end = 0  # number of bytes written to the metadata file
+
+        files = [path + '.idx', path, path + '.meta']
+        if mode == 'a' and not os.path.exists(path):
+            for file in files:
+                open(file, 'wb').close()
+        self._count = os.path.getsize(path + '.idx') // _RECORD.itemsize
+        size = os.path.getsize(path) // 8
+        meta_size = os.path.getsize(path + '.meta')
+        # records of an interrupted append, written last, point past the data
+        while self._count:
+            last = self._records(self._count - 1, 1)[0]
+            self._end = int(last['offset'] + last['size'])
+            self._meta_end = int(last['meta_offset'] + last['meta_size'])
+            if self._end <= size and self._meta_end <= meta_size:
+                break
+            self._count -= 1
+            self._end = self._meta_end = 0
+        if mode == 'a':
+            # cut the partial writes off, so that the next append follows the last record
+            ends = [self._count * _RECORD.itemsize, 8 * self._end, self._meta_end]
+            for file, end in zip(files, ends):
+                if os.path.getsize(file) > end:
+                    os.truncate(file, end)
+
+    def _records(self, start, count):
+        return np.fromfile(self.path + '.idx', dtype=_RECORD, count=count,
+                           offset=start * _RECORD.itemsize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Release the memory map of the data file."""
+        self._data = None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def append(self, device):
+        """
+        Append a measurement to the store.
+
+        Parameters
+        ----------
+        device : measurement object
+            Measurement with a wavelength grid (wavl) and a power block (pwr)
+            whose last axis matches the grid.
+
+        Returns
+        -------
+        idx : int
+            Index of the device in the store.
+
+        """
+        if self.mode != 'a':
+            raise IOError("Store is opened read-only.")
+        wavl = np.ascontiguousarray(device.wavl, dtype=float)
+        pwr = np.ascontiguousarray(device.pwr, dtype=float)
+        if wavl.ndim != 1 or pwr.shape[-1] != wavl.size:
+            raise ValueError("Power data does not match the wavelength grid.")
+
+        entry = {field: getattr(device, field, None)
+                 for field in analysis.MeasurementSet.fields}
+        entry['shape'] = list(pwr.shape)
+        meta = (json.dumps(entry, default=str) + '\n').encode()
+        record = np.array([(self._end, wavl.size + pwr.size, self._meta_end, len(meta))],
+                          dtype=_RECORD)
+        # data first, so that an index record never points to missing data
+        with open(self.path, 'r+b') as f:
+            f.seek(8 * self._end)
+            f.write(wavl.tobytes())
+            f.write(pwr.tobytes())
+        with open(self.path + '.meta', 'r+b') as f:
+            f.seek(self._meta_end)
+            f.write(meta)
+        with open(self.path + '.idx', 'r+b') as f:
+            f.seek(self._count * _RECORD.itemsize)
+            f.write(record.tobytes())
+        self._count += 1
+        self._end += int(record['size'][0])
+        self._meta_end += len(meta)
+        return self._count - 1
+
+    def extend(self, devices):
+        """
+        Append several measurements to the store.
+
+        Parameters
+        ----------
+        devices : list
+            Measurement objects.
+
+        Returns
+        -------
+        None.
+
+        """
+        for device in devices:
+            self.append(device)
+
+    @property
+    def index(self):
+        """Index entry of every device, read from the index and metadata files."""
+        records = self._records(0, self._count)
+        with open(self.path + '.meta', 'rb') as f:
+            meta = f.read(self._meta_end)
+        return [self._entry(record, meta[start:start + size])
+                for record, start, size in zip(records, records['meta_offset'].tolist(),
+                                               records['meta_size'].tolist())]
+
+    @staticmethod
+    def _entry(record, meta):
+        entry = json.loads(meta)
+        entry.update(offset=int(record['offset']), size=int(record['size']))
+        return entry
+
+    def _record(self, idx):
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError("Device index out of range.")
+        record = self._records(idx, 1)[0]
+        with open(self.path + '.meta', 'rb') as f:
+            f.seek(record['meta_offset'])
+            entry = self._entry(record, f.read(record['meta_size']))
+        if self._data is None or self._data.size < self._end:
+            self._data = np.memmap(self.path, dtype=np.float64, mode='r',
+                                   shape=(self._end,))
+        data = self._data[entry['offset']:entry['offset'] + entry['size']]
+        points = entry['shape'][-1]
+        return entry, data[:points], data[points:].reshape(entry['shape'])
+
+    def __getitem__(self, idx):
+        """
+        Measurement object of a stored device.
+
+        wavl and pwr are read-only views into the memory-mapped data file.
+        """
+        entry, wavl, pwr = self._record(idx)
+        fields = dict.fromkeys(analysis._MEASUREMENT_FIELDS)
+        fields.update((field, entry.get(field))
+                      for field in analysis.MeasurementSet.fields)
+        fields['wavl'] = wavl
+        fields['pwr'] = pwr
+        return analysis.measurement(**fields)
+
+    def meta(self):
+        """
+        Columnar metadata table of the stored devices.
+
+        Returns
+        -------
+        dict
+            Metadata column arrays keyed by field name, see MeasurementSet.
+
+        """
+        fields = analysis.MeasurementSet.fields
+        index = self.index
+        return analysis.MeasurementSet.columns(
+            {field: [entry.get(field) for entry in index] for field in fields},
+            len(self))
+
+    def where(self, **criteria):
+        """
+        Find the stored devices whose metadata matches all the given criteria.
+
+        See MeasurementSet.where() for the criteria format.
+
+        Returns
+        -------
+        ndarray
+            Indices of the matching devices.
+
+        """
+        return analysis._where(self.meta(), len(self), criteria)
+
+    def to_set(self, indices=None):
+        """
+        Load stored devices into a MeasurementSet.
+
+        Parameters
+        ----------
+        indices : list, optional
+            Indices of the devices to load. The default is all the devices.
+
+        Returns
+        -------
+        MeasurementSet
+            Set of the devices, which must share the same wavelength grid.
+
+        """
+        if indices is None:
+            indices = range(len(self))
+        return analysis.MeasurementSet.from_measurements(self[i] for i in indices)
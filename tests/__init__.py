@@ -1 +1,6 @@
 """Unit test package for siepic_analysis_package."""
+import os
+import tempfile
+
+# keep the parse cache of the test runs away from the user's cache
+os.environ['SIAP_CACHE_DIR'] = tempfile.mkdtemp(prefix='siap_cache_')
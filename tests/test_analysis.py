@@ -0,0 +1,693 @@
+#!/usr/bin/env python
+
+"""Tests for the `siepic_analysis_package.analysis` module."""
+
+import os
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+
+from siepic_analysis_package import analysis
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), '..', 'examples')
+CSV_PCM = os.path.join(EXAMPLES, 'processCSV', 'example3_pcm', 'data_wgloss',
+                       'TM_1310', 'PCM_SpiralWG40304TM',
+                       '22-Mar-2022 11.15.11_1.csv')
+CSV_QUOTED = os.path.join(EXAMPLES, 'ex_Mach_Zehnder_ER_FSR_GroupIndex', 'data',
+                          'splitter_SWGneg20_MZI', '31-Jan-2022 13.04.42_1_1.csv')
+CUTBACK_ROOT = os.path.join(EXAMPLES, 'cutback', 'cutback_device_loss', 'data')
+
+
+class TestProcessCSV(unittest.TestCase):
+    """Tests for `analysis.processCSV`."""
+
+    def test_header(self):
+        device = analysis.processCSV(CSV_PCM)
+        self.assertEqual(device.deviceID, 'PCM_SpiralWG40304TM')
+        self.assertEqual(device.user, 'Mustafa')
+        self.assertEqual(device.coordsGDS, '8339  2080')
+        self.assertEqual(device.getGDS(), (8339.0, 2080.0))
+        self.assertEqual(device.sweepSpd, 40.0)
+        self.assertEqual(device.wavlStep, 0.08)
+        self.assertEqual(device.wavlStart, 1260.0)
+        self.assertEqual(device.wavlStop, 1377.0)
+
+    def test_data_block(self):
+        device = analysis.processCSV(CSV_PCM)
+        self.assertEqual(device.wavl.shape, (1463,))
+        self.assertEqual(device.pwr.shape, (3, 1463))
+        self.assertTrue(device.pwr.flags['C_CONTIGUOUS'])
+        self.assertEqual(device.wavl[1], 1260.08)
+        self.assertEqual(device.pwr[1][0], -66.0186)
+
+    def test_quoted_header(self):
+        device = analysis.processCSV(CSV_QUOTED)
+        self.assertEqual(device.deviceID, 'MZI_SWG_-20nm')
+        self.assertEqual(device.laser, '81600B')
+        self.assertEqual(device.pwr.shape, (2, device.wavl.size))
+        self.assertEqual(device.pwr[0][0], -40.3887)
+
+
+class TestLoadDirectory(unittest.TestCase):
+    """Tests for `analysis.load_directory`."""
+
+    root = CUTBACK_ROOT
+
+    def test_order_and_workers(self):
+        serial, errors = analysis.load_directory(self.root, prefix='strip2rib_',
+                                                 workers=1)
+        self.assertEqual(errors, {})
+        self.assertEqual([i.deviceID for i in serial],
+                         ['strip2rib_100_1', 'strip2rib_1900_1', 'strip2rib_900_1'])
+        parallel, errors = analysis.load_directory(self.root, prefix='strip2rib_',
+                                                   workers=2)
+        self.assertEqual([i.deviceID for i in parallel],
+                         [i.deviceID for i in serial])
+        np.testing.assert_array_equal(parallel[1].pwr, serial[1].pwr)
+
+    def test_errors(self):
+        with tempfile.TemporaryDirectory() as root:
+            with open(os.path.join(root, 'broken.csv'), 'w') as f:
+                f.write('wavelength,1,2,3\nchannel_1,1,2\n')
+            devices, errors = analysis.load_directory(root, workers=1)
+        self.assertEqual(devices, [])
+        self.assertEqual(list(errors), [os.path.join(root, 'broken.csv')])
+
+
+class TestMeasurementSet(unittest.TestCase):
+    """Tests for `analysis.MeasurementSet`."""
+
+    def setUp(self):
+        self.devices, _ = analysis.load_directory(CUTBACK_ROOT,
+                                                  prefix='strip2rib_', workers=1)
+        self.mset = analysis.MeasurementSet.from_measurements(self.devices)
+
+    def test_block(self):
+        self.assertEqual(len(self.mset), 3)
+        self.assertEqual(self.mset.pwr.shape, (3,) + self.devices[0].pwr.shape)
+        np.testing.assert_array_equal(self.mset.channel(1)[2], self.devices[2].pwr[1])
+
+    def test_device_view(self):
+        device = self.mset[1]
+        self.assertIsInstance(device, analysis.measurement)
+        self.assertEqual(device.deviceID, self.devices[1].deviceID)
+        self.assertEqual(device.getGDS(), self.devices[1].getGDS())
+        self.assertTrue(np.shares_memory(device.pwr, self.mset.pwr))
+
+    def test_select(self):
+        subset = self.mset.select(deviceID=['strip2rib_100_1', 'strip2rib_900_1'])
+        self.assertEqual(list(subset.meta['deviceID']),
+                         ['strip2rib_100_1', 'strip2rib_900_1'])
+        self.assertEqual(len(self.mset.select(sweepSpd=lambda v: v > 1e3)), 0)
+
+    def test_grid_mismatch(self):
+        with self.assertRaises(ValueError):
+            analysis.MeasurementSet.from_measurements(
+                self.devices + [analysis.processCSV(CSV_PCM)])
+
+
+def make_ehva_export(n_components=4, points=50, seed=0):
+    """Synthetic EHVA export with interleaved rows of several components."""
+    def fmt(values):
+        return ','.join(repr(float(i)) for i in values)
+
+    rng = np.random.default_rng(seed)
+    wavl = np.linspace(1500, 1600, points)
+    rows = []
+    for cid in range(100, 100 + n_components):
+        base = dict(ComponentName='ring%d' % cid, ComponentDescription='Ring',
+                    ComponentId=cid, ResultCreated='2023-01-01 10:00:00',
+                    DieId=cid % 3, OpticalPortPosition='%d,%d' % (cid, -cid),
+                    EXPvoltage=np.nan, EXPcurrent=np.nan, ResultDescription='',
+                    MeasuredPorts=None, EXPbias=np.nan)
+        for name in ['opticalPowerFirstOPM', 'opticalPowerSecondOPM',
+                     'opticalPowerFirstOPM']:
+            rows.append(dict(base, ResultMetricName='optical power',
+                             DomainMetricName='wavelength', ResultName=name,
+                             ResultDomain=fmt(wavl),
+                             ResultValue=fmt(rng.normal(-20, 5, points) + cid % 2 * 30),
+                             EXPvoltage=rng.normal(1, 0.5),
+                             EXPcurrent=rng.normal(10, 1)))
+        for description in ['IV Curve, Bright', 'IV Curve, Dark', 'IV']:
+            rows.append(dict(base, ResultMetricName='uCurrent',
+                             DomainMetricName='voltage', ResultName='Current',
+                             ResultDescription=description,
+                             ResultDomain=fmt(np.linspace(-1, 1, 11)),
+                             ResultValue=fmt(rng.normal(size=11))))
+        rows.append(dict(base, ResultMetricName='current',
+                         DomainMetricName='voltage', ResultName='Dark current',
+                         ResultDomain='-1.0', ResultValue=repr(rng.normal())))
+        rows.append(dict(base, ResultMetricName='optical return loss',
+                         DomainMetricName='wavelength',
+                         ResultName='PolarizationDependentLoss',
+                         ResultDomain=fmt(wavl[:7]),
+                         ResultValue=fmt(rng.normal(size=7)), MeasuredPorts='1-2'))
+        rows.append(dict(base, ResultMetricName='power',
+                         DomainMetricName='frequency',
+                         ResultName='S21 raw on-chip photodetector and external modulator',
+                         ResultDomain=fmt(np.arange(5.0)),
+                         ResultValue=fmt(rng.normal(size=5)), EXPbias=-2.0))
+    order = rng.permutation(len(rows))
+    return pd.DataFrame([rows[i] for i in order])
+
+
+def measurementEHVA_reference(desiredDevice):
+    """Original per-device implementation of measurementEHVA, kept as the test reference."""
+    componentName = desiredDevice.ComponentName.at[0]
+    deviceDescription = desiredDevice.ComponentDescription.at[0]
+    componentID = desiredDevice.ComponentId.at[0]
+    deviceID = componentName + '_ID_' + str(componentID)
+    timestamp = desiredDevice.ResultCreated.at[0]
+    dieID = str(desiredDevice.DieId.at[0])
+    coordsGDS = desiredDevice.OpticalPortPosition.at[0].replace(",", " ")
+    wavlStep = wavlStart = wavlStop = wavl = None
+
+    def parse(column, ii):
+        return np.fromstring(getattr(desiredDevice, column).at[ii], dtype=float, sep=',')
+
+    pwr = [[]]
+    voltageExperimental = [[]]
+    currentExperimental = [[]]
+    IV_current = []
+    IV_voltage = []
+    darkCurrent = [[], []]
+    pol_loss = [[], [], []]
+    s_parameters = [[], [], [[[], [], [], []], [[], [], [], []], [[], [], [], []],
+                             [[], [], [], []]]]
+    external_calibration = [[], []]
+    responsivity = [[], [], [], [], []]
+    IV_Bright = [[], []]
+    IV_Dark = [[], []]
+    for ii in range(len(desiredDevice)):
+        resultType = desiredDevice.ResultMetricName.at[ii]
+        domainType = desiredDevice.DomainMetricName.at[ii]
+        resultName = desiredDevice.ResultName.at[ii]
+        if resultType == 'optical power':
+            wavl = parse('ResultDomain', ii)
+            wavlStart = wavl[0]
+            wavlStop = wavl[-1]
+            wavlStep = wavl[1] - wavl[0]
+            channel = parse('ResultValue', ii).astype(float)
+            channel[channel > 0] = np.nan
+            voltage = round(desiredDevice.EXPvoltage.at[ii], 3)
+            current = round(desiredDevice.EXPcurrent.at[ii], 3)
+            port = ['opticalPowerFirstOPM', 'opticalPowerSecondOPM',
+                    'opticalPowerThirdOPM'].index(resultName)
+            if port == len(pwr):
+                pwr.append([channel])
+                voltageExperimental.append([voltage])
+                currentExperimental.append([current])
+            else:
+                pwr[port].append(channel)
+                voltageExperimental[port].append(voltage)
+                currentExperimental[port].append(current)
+        elif resultType == 'uCurrent' and domainType == 'voltage':
+            resultDescription = desiredDevice.ResultDescription.at[ii]
+            if resultName == 'Current':
+                currentData = parse('ResultValue', ii)
+                voltageData = parse('ResultDomain', ii)
+                if "IV Curve, Bright" in resultDescription:
+                    IV_Bright[1].append(currentData)
+                    IV_Bright[0].append(voltageData)
+                elif "IV Curve, Dark" in resultDescription:
+                    IV_Dark[1].append(currentData)
+                    IV_Dark[0].append(voltageData)
+                else:
+                    IV_current.append(currentData)
+                    IV_voltage.append(voltageData)
+        elif resultType == 'current':
+            resultDescription = desiredDevice.ResultDescription.at[ii]
+            if resultName == 'Dark current':
+                darkCurrent[0].append(float(desiredDevice.ResultValue.at[ii]))
+                darkCurrent[1].append(float(desiredDevice.ResultDomain.at[ii]))
+            elif resultDescription == analysis._EHVA_RESPONSIVITY:
+                responsivity[0] = parse('ResultDomain', ii)
+                responsivity[1].append(desiredDevice.EXPbias2.at[ii])
+                responsivity[2].append(desiredDevice.EXPmeterRange.at[ii])
+                responsivity[3].append(parse('ResultValue', ii))
+                pwr = parse('EXPpwr', ii)
+                responsivity[4].append(pwr)
+        elif resultType == 'optical return loss':
+            if resultName == 'PolarizationDependentLoss':
+                pol_loss[0].append(parse('ResultDomain', ii))
+                pol_loss[1].append(parse('ResultValue', ii).astype(float))
+                pol_loss[2].append(desiredDevice.MeasuredPorts.at[ii])
+        elif resultType == 'power':
+            if resultName == analysis._EHVA_S21_RAW:
+                s_parameters[0] = parse('ResultDomain', ii)
+                s_parameters[1].append(desiredDevice.EXPbias.at[ii])
+                s_parameters[2][1][0].append(parse('ResultValue', ii))
+            elif resultName == analysis._EHVA_S21_CAL:
+                external_calibration[0] = parse('ResultDomain', ii)
+                external_calibration[1] = parse('ResultValue', ii)
+
+    return analysis.measurement(
+        deviceID=deviceID, deviceDescription=deviceDescription, user=None, start=None,
+        finish=timestamp, coordsGDS=coordsGDS, coordsMotor=None, date=None, laser=None,
+        detector=None, sweepSpd=None, sweepPwr=None, wavlStep=wavlStep,
+        wavlStart=wavlStart, wavlStop=wavlStop, stitch=None, initRange=None, wavl=wavl,
+        pwr=pwr, dieID=dieID, voltageExperimental=voltageExperimental,
+        currentExperimental=currentExperimental, IV_current=IV_current,
+        IV_voltage=IV_voltage, darkCurrent=darkCurrent, pol_loss=pol_loss,
+        s_parameters=s_parameters, external_calibration=external_calibration,
+        responsivity=responsivity, IV_Bright=IV_Bright, IV_Dark=IV_Dark, IV_refPower=None)
+
+
+def assert_same(test, a, b):
+    """Recursively compare nested lists of arrays and scalars."""
+    if isinstance(a, list):
+        test.assertEqual(len(a), len(b))
+        for i, j in zip(a, b):
+            assert_same(test, i, j)
+    elif isinstance(a, np.ndarray):
+        np.testing.assert_array_equal(a, b)
+    elif a != a:
+        test.assertTrue(b != b)
+    else:
+        test.assertEqual(a, b)
+
+
+class TestFitPolynomial(unittest.TestCase):
+    """Tests for `analysis.fit_polynomial` and the functions built on it."""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.wavl = np.linspace(1500, 1600, 2001)
+        self.power = (-10 - 1e-3 * (self.wavl - 1550)**2 + np.sin(self.wavl / 3)
+                      + rng.normal(0, 0.1, (4, self.wavl.size)))
+
+    def test_reference(self):
+        x = self.wavl - np.mean(self.wavl)
+        for order in [2, 4, 8]:
+            expected = [np.polyval(np.polyfit(x, p, order), x) for p in self.power]
+            np.testing.assert_allclose(
+                analysis.fit_polynomial(self.wavl, self.power, order), expected,
+                atol=1e-9)
+        expected = np.polyval(np.polyfit(x, self.power[0], 4), [-60, 0, 60])
+        np.testing.assert_allclose(
+            analysis.fit_polynomial(self.wavl, self.power[0], 4,
+                                    x_eval=[1490, 1550, 1610]), expected, atol=1e-9)
+
+    def test_kernel_cache(self):
+        kernel = analysis._polyfit_kernel(self.wavl, 4)
+        self.assertIs(analysis._polyfit_kernel(self.wavl.copy(), 4), kernel)
+        self.assertIsNot(analysis._polyfit_kernel(self.wavl, 5), kernel)
+        for order in range(analysis._POLYFIT_KERNELS_SIZE):
+            analysis._polyfit_kernel(self.wavl, 10 + order)
+        self.assertIsNot(analysis._polyfit_kernel(self.wavl, 4), kernel)
+        self.assertLessEqual(len(analysis._POLYFIT_KERNELS),
+                             analysis._POLYFIT_KERNELS_SIZE)
+
+    def test_batch(self):
+        corrected, baseline = analysis.baseline_correction([self.wavl, self.power])
+        self.assertEqual(corrected.shape, self.power.shape)
+        for i, p in enumerate(self.power):
+            single = analysis.baseline_correction([self.wavl, p])
+            np.testing.assert_allclose(corrected[i], single[0], atol=1e-12)
+            np.testing.assert_allclose(baseline[i], single[1], atol=1e-12)
+        corrected, fit = analysis.calibrate([self.wavl, self.power],
+                                            [self.wavl, self.power])
+        np.testing.assert_allclose(corrected, self.power - fit, atol=1e-12)
+        self.assertEqual(fit.shape, self.power.shape)
+
+
+def envelope_points_reference(x, y, tol, direction):
+    """Envelope point selection of the original calibrate_envelope."""
+    x_envelope = []
+    y_envelope = []
+    if direction == 'left':
+        tracker = y[0]
+        for idx, val in enumerate(y):
+            if np.abs(val - tracker) < tol:
+                x_envelope.append(x[idx])
+                y_envelope.append(val)
+                tracker = val
+            elif np.abs(val - np.polyval(np.polyfit(x_envelope, y_envelope, 2), x[idx])) < tol:
+                tracker = val
+    else:
+        tracker = y[-1]
+    for idx, val in reversed(list(enumerate(y))):
+        if np.abs(val - tracker) < tol:
+            x_envelope.append(x[idx])
+            y_envelope.append(val)
+            tracker = val
+        elif np.abs(val - np.polyval(np.polyfit(x_envelope, y_envelope, 2), x[idx])) < tol:
+            tracker = val
+    return x_envelope, y_envelope
+
+
+class TestCalibrateEnvelope(unittest.TestCase):
+    """Tests for `analysis.calibrate_envelope`."""
+
+    def setUp(self):
+        root = os.path.join(EXAMPLES, 'ex_Bragg_analysis', 'SOI_SiO2_cband', 'data')
+        devices, _ = analysis.load_directory(root, workers=1)
+        self.devices = devices
+        self.wavl = devices[0].wavl
+        self.envelopes = np.array([i.pwr[0] for i in devices[:3]])
+        self.data = np.array([i.pwr[1] for i in devices[:3]])
+
+    def test_reference(self):
+        for N_seg, tol, direction in [(25, 3, 'left'), (325, 3, 'left'),
+                                      (325, 4, 'right'), (2000, 1, 'left')]:
+            idx = np.arange(N_seg) * (self.wavl.size // N_seg)
+            for envelope, data in zip(self.envelopes, self.data):
+                calibrated, ref, x, y = analysis.calibrate_envelope(
+                    self.wavl, envelope, data, tol=tol, N_seg=N_seg, direction=direction)
+                x_ref, y_ref = envelope_points_reference(self.wavl[idx], envelope[idx],
+                                                         tol, direction)
+                np.testing.assert_array_equal(x, x_ref)
+                np.testing.assert_array_equal(y, y_ref)
+                x0 = self.wavl - np.mean(x_ref)
+                expected = np.polyval(np.polyfit(x_ref - np.mean(x_ref), y_ref, 4), x0)
+                np.testing.assert_allclose(ref, expected, atol=1e-6)
+                np.testing.assert_allclose(calibrated, data - ref)
+
+    def test_batch(self):
+        calibrated, ref, x, y = analysis.calibrate_envelope(
+            self.wavl, self.envelopes, self.data, N_seg=325)
+        self.assertEqual(calibrated.shape, self.data.shape)
+        self.assertEqual(len(x), len(self.data))
+        for i in range(len(self.data)):
+            single = analysis.calibrate_envelope(self.wavl, self.envelopes[i],
+                                                 self.data[i], N_seg=325)
+            np.testing.assert_allclose(calibrated[i], single[0], atol=1e-9)
+            np.testing.assert_array_equal(x[i], single[2])
+
+    def test_kernel_cache(self):
+        cached = list(analysis._POLYFIT_KERNELS)
+        analysis.calibrate_envelope(self.wavl, self.envelopes, self.data, N_seg=325)
+        self.assertEqual(list(analysis._POLYFIT_KERNELS), cached)
+
+    def test_rolling(self):
+        wavl = np.linspace(1500, 1600, 20000)
+        dome = -20 - 2e-3 * (wavl - 1540)**2
+        envelopes = np.array([dome, dome + 1.0])
+        envelopes[:, (wavl > 1535) & (wavl < 1540)] -= 25  # stop bands
+        envelopes[1, (wavl > 1570) & (wavl < 1575)] -= 25
+        calibrated, ref, x, y = analysis.calibrate_envelope(
+            wavl, envelopes, envelopes, N_seg=100, method='rolling')
+        np.testing.assert_allclose(ref, [dome, dome + 1.0], atol=1e-6)
+        for i in range(2):  # no envelope point in the stop bands
+            np.testing.assert_allclose(y[i], -20 - 2e-3 * (x[i] - 1540)**2 + i)
+        with self.assertRaises(ValueError):
+            analysis.calibrate_envelope(wavl, dome, dome, method='spline')
+
+    def test_rolling_example_data(self):
+        # neither channel has a concave envelope, the first one is a noise floor
+        for channel in [0, 1]:
+            envelopes = np.array([i.pwr[channel] for i in self.devices])
+            tracker = analysis.calibrate_envelope(self.wavl, envelopes, envelopes, N_seg=325)[1]
+            for N_seg in [25, 100, 325, 2000]:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('error')
+                    calibrated, ref, x, y = analysis.calibrate_envelope(
+                        self.wavl, envelopes, envelopes, N_seg=N_seg, method='rolling')
+                self.assertTrue(all(np.unique(i).size > 4 for i in x))
+                self.assertLess(np.abs(ref - tracker).max(), 5.0, (channel, N_seg))
+
+
+class TestCutback(unittest.TestCase):
+    """Tests for `analysis.cutback` and `analysis.cutback_batch`."""
+
+    def setUp(self):
+        root = os.path.join(EXAMPLES, 'cutback', 'cutback_waveguide_loss_csv', 'data')
+        self.devices, _ = analysis.load_directory(root, prefix='wgloss_spiral',
+                                                  workers=1)
+        self.lengths = [float(i.deviceID.split('_')[-1].rstrip('u')) / 1e4
+                        for i in self.devices]
+
+    def test_cutback_reference(self):
+        wavl = self.devices[0].wavl
+        power = [i.pwr[1] for i in self.devices]
+        il, il_fit, il_raw = analysis.cutback([[wavl, p] for p in power],
+                                              self.lengths, 1310)
+        # reference: per-device and per-wavelength np.polyfit loops
+        x = wavl - np.mean(wavl)
+        fit = [np.polyval(np.polyfit(x, p, 8), x) for p in power]
+        expected_fit = [np.polyfit(self.lengths, i, 1)[0] for i in np.transpose(fit)]
+        expected_raw = [np.polyfit(self.lengths, i, 1)[0] for i in np.transpose(power)]
+        np.testing.assert_allclose(il_fit, expected_fit, rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(il_raw, expected_raw, rtol=1e-9, atol=1e-9)
+        self.assertAlmostEqual(il, il_fit[analysis.find_nearest(wavl, 1310)])
+
+    def test_batch_families(self):
+        wavl = self.devices[0].wavl
+        power = np.array([i.pwr[1] for i in self.devices])
+        families = np.stack([power, power + 1.0, 2 * power])
+        count = np.array(self.lengths)
+        slope, intercept, stderr = analysis.cutback_batch(
+            wavl, families, np.stack([count, count, count]), fitOrder=None)
+        self.assertEqual(slope.shape, (3, wavl.size))
+        np.testing.assert_allclose(slope[1], slope[0], atol=1e-9)
+        np.testing.assert_allclose(intercept[1], intercept[0] + 1.0, atol=1e-9)
+        np.testing.assert_allclose(slope[2], 2 * slope[0], atol=1e-9)
+        _, cov = np.polyfit(count, power[:, 100], 1, cov='unscaled')
+        residuals = power[:, 100] - np.polyval(np.polyfit(count, power[:, 100], 1), count)
+        expected = np.sqrt(cov[0, 0] * np.sum(residuals**2) / (count.size - 2))
+        self.assertAlmostEqual(stderr[0, 100], expected)
+
+    def test_different_grids(self):
+        wavl = np.asarray(self.devices[0].wavl)
+        power = [i.pwr[1] for i in self.devices]
+        # every other device measured on a grid shifted by half a step
+        half = (wavl[1] - wavl[0]) / 2
+        responses = [[wavl + half * (n % 2), p] for n, p in enumerate(power)]
+        il, il_fit, il_raw = analysis.cutback(responses, self.lengths, 1310, fitOrder=None)
+        common = wavl[1:]  # points covered by both grids
+        resampled = [np.interp(common, x, p) for x, p in responses]
+        expected = [np.polyfit(self.lengths, i, 1)[0] for i in np.transpose(resampled)]
+        self.assertEqual(il_raw.size, common.size)
+        np.testing.assert_allclose(il_raw, expected, rtol=1e-9, atol=1e-9)
+
+
+class TestResample(unittest.TestCase):
+    """Tests for `analysis.resample`, `analysis.aggregate` and `analysis.average_responses`."""
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.x = [np.sort(rng.uniform(1500, 1600, n)) for n in (40, 75, 2, 120)]
+        self.y = [rng.normal(size=i.size) for i in self.x]
+        self.x_new = np.linspace(1490, 1610, 301)
+
+    def reference(self, x_new):
+        return np.array([np.where((x_new >= x[0]) & (x_new <= x[-1]),
+                                  np.interp(x_new, x, y), np.nan)
+                         for x, y in zip(self.x, self.y)])
+
+    def test_ragged_matches_interp(self):
+        for x_new in (self.x_new, np.unique(np.concatenate(self.x))):
+            result = analysis.resample(self.x, self.y, x_new)
+            np.testing.assert_array_equal(result, self.reference(x_new))
+
+    def test_shared_grid(self):
+        x = np.linspace(1500, 1600, 101)
+        y = np.random.default_rng(4).normal(size=(5, 101))
+        inside = (self.x_new >= 1500) & (self.x_new <= 1600)
+        expected = [np.where(inside, np.interp(self.x_new, x, i), np.nan) for i in y]
+        np.testing.assert_array_equal(analysis.resample(x, y, self.x_new), expected)
+        np.testing.assert_array_equal(analysis.resample([x] * 5, y, self.x_new), expected)
+        np.testing.assert_array_equal(analysis.resample(x, y[0], self.x_new), expected[0])
+        np.testing.assert_array_equal(analysis.resample(x, y, x), y)
+
+    def test_extrapolate(self):
+        from scipy.interpolate import interp1d
+        result = analysis.resample(self.x, self.y, self.x_new, fill_value='extrapolate')
+        expected = [interp1d(x, y, fill_value='extrapolate')(self.x_new)
+                    for x, y in zip(self.x, self.y)]
+        np.testing.assert_allclose(result, expected, rtol=1e-12, atol=1e-12)
+
+    def test_index_cached(self):
+        analysis.resample(self.x, self.y, self.x_new)
+        kernel = analysis._interp_kernel(self.x, self.x_new)
+        self.assertIs(analysis._interp_kernel([i.copy() for i in self.x],
+                                              self.x_new.copy()), kernel)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            analysis.resample([self.x[0][::-1]], [self.y[0]], self.x_new)
+        with self.assertRaises(ValueError):
+            analysis.resample(self.x, self.y[:2], self.x_new)
+
+    def test_aggregate(self):
+        data = self.reference(self.x_new)
+        mean, std, count = analysis.aggregate(data)
+        covered = count > 0
+        np.testing.assert_array_equal(count, np.sum(~np.isnan(data), axis=0))
+        np.testing.assert_allclose(mean[covered], np.nanmean(data[:, covered], axis=0))
+        np.testing.assert_allclose(std[covered], np.nanstd(data[:, covered], axis=0))
+        self.assertTrue(np.all(np.isnan(mean[~covered])))
+
+        x_new, mean, std, count = analysis.average_responses(self.x, self.y)
+        np.testing.assert_array_equal(x_new, np.unique(np.concatenate(self.x)))
+        self.assertEqual(count.min(), 1)
+
+
+@unittest.skipIf(pd is None, "pandas is not installed")
+class TestMeasurementsEHVA(unittest.TestCase):
+    """Tests for `analysis.measurementsEHVA`."""
+
+    def test_equivalence(self):
+        data = make_ehva_export()
+        devices = analysis.measurementsEHVA(data)
+        self.assertEqual(list(devices), list(data.ComponentId.unique()))
+        for componentID, device in devices.items():
+            desiredDevice = data[data.ComponentId == componentID].reset_index(drop=True)
+            reference = measurementEHVA_reference(desiredDevice)
+            for field, value in vars(reference).items():
+                assert_same(self, value, getattr(device, field))
+                assert_same(self, value, getattr(analysis.measurementEHVA(desiredDevice), field))
+            # decoded arrays do not keep the buffer of the whole export alive
+            self.assertIsNone(device.wavl.base)
+            self.assertIsNone(device.IV_Bright[0][0].base)
+
+    def test_decoding(self):
+        data = make_ehva_export(n_components=1)
+        device = analysis.measurementsEHVA(data)[100]
+        self.assertEqual(device.deviceID, 'ring100_ID_100')
+        self.assertEqual(device.coordsGDS, '100 -100')
+        self.assertEqual([len(i) for i in device.pwr], [2, 1])
+        self.assertEqual(device.wavlStart, 1500.0)
+        self.assertEqual(len(device.IV_Bright[0]), 1)
+        self.assertEqual(len(device.darkCurrent[0]), 1)
+
+
+@unittest.skipIf(pd is None, "pandas is not installed")
+class TestStreamEHVA(unittest.TestCase):
+    """Tests for `analysis.streamEHVA`."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'export.csv')
+        self.data = make_ehva_export(n_components=20, points=300)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_stream(self):
+        self.data.sort_values('ComponentId', kind='stable').to_csv(self.path, index=False)
+        reference = analysis.measurementsEHVA(pd.read_csv(self.path))
+        devices = list(analysis.streamEHVA(self.path, memory_budget=2e5))
+        self.assertEqual([i.deviceID for i in devices],
+                         [i.deviceID for i in reference.values()])
+        for device, expected in zip(devices, reference.values()):
+            for field, value in vars(expected).items():
+                assert_same(self, value, getattr(device, field))
+
+    def test_budget(self):
+        self.data.to_csv(self.path, index=False)  # interleaved components
+        with self.assertRaises(MemoryError):
+            list(analysis.streamEHVA(self.path, memory_budget=2e5))
+        self.assertEqual(len(list(analysis.streamEHVA(self.path))), 20)
+
+
+class TestExtractFeatures(unittest.TestCase):
+    """Tests for `analysis.extract_features`."""
+
+    def setUp(self):
+        self.wavl = np.linspace(1500, 1600, 20001)
+        phase = 2 * np.pi * 155e3 * 4.2 / self.wavl
+        self.data = 10 * np.log10(0.51 + 0.49 * np.cos(phase) + 1e-9)
+
+    def test_reference(self):
+        features = analysis.extract_features(self.wavl, self.data, delta_length=155e3,
+                                             kappa=True)
+        fsr_wavl, fsr, troughs = analysis.getFSR(self.wavl, self.data)
+        np.testing.assert_array_equal(features['troughs'], troughs)
+        np.testing.assert_allclose(features['fsr'], fsr)
+        np.testing.assert_allclose(features['fsr_wavl'], fsr_wavl)
+        np.testing.assert_allclose(
+            features['ng'], analysis.getGroupIndex(fsr_wavl, fsr, 155e3))
+        # every peak is paired with the next trough
+        self.assertTrue(np.all(features['er_wavl'] < self.wavl[troughs[-1]]))
+        self.assertEqual(features['er'].size, np.sum(features['peaks'] < troughs[-1]))
+        np.testing.assert_allclose(features['er'], 10 * np.log10(1 / 0.02), rtol=0.05)
+        np.testing.assert_allclose(features['kappa'],
+                                   0.5 - 0.5 * np.sqrt(10**(-features['er'] / 10)))
+
+    def test_batch(self):
+        block = np.stack([self.data, self.data[::-1] - 1, np.roll(self.data, 777)])
+        features = analysis.extract_features(self.wavl, block)
+        self.assertEqual(len(features), 3)
+        for i in range(3):
+            single = analysis.extract_features(self.wavl, block[i])
+            np.testing.assert_array_equal(features[i]['fsr'], single['fsr'])
+            self.assertNotIn('ng', single)
+
+
+class TestBandwidth(unittest.TestCase):
+    """Tests for `analysis.bandwidth`."""
+
+    def setUp(self):
+        self.wavl = np.linspace(1500, 1600, 1001)
+        self.data = -3 * ((self.wavl - 1550.03) / 10)**2
+
+    def test_interpolated_edges(self):
+        bw, center = analysis.bandwidth(self.wavl, self.data)
+        self.assertAlmostEqual(bw, 20.0, places=3)
+        self.assertAlmostEqual(center, 1550.03, places=3)
+        bw, center = analysis.bandwidth(self.wavl, self.data, threshold=[1, 3, 12])
+        np.testing.assert_allclose(bw, 20 * np.sqrt([1 / 3, 1, 4]), rtol=1e-4)
+
+    def test_batch(self):
+        block = np.stack([self.data, self.data - 5, np.roll(self.data, 200)])
+        bw, center = analysis.bandwidth(self.wavl, block, threshold=[1, 3, 10])
+        self.assertEqual(bw.shape, (3, 3))
+        for i in range(3):
+            for j, threshold in enumerate([1, 3, 10]):
+                single = analysis.bandwidth(self.wavl, block[i], threshold)
+                self.assertEqual(bw[i, j], single[0])
+                self.assertEqual(center[i, j], single[1])
+        np.testing.assert_allclose(center[2], 1570.03, atol=1e-3)
+
+    def test_sweep_edge(self):
+        bw, center = analysis.bandwidth(self.wavl, self.data, threshold=[3, 100])
+        self.assertFalse(np.isnan(bw[0]))
+        self.assertTrue(np.isnan(bw[1]) and np.isnan(center[1]))
+
+
+class TestSortedGrid(unittest.TestCase):
+    """Tests for the sorted grid paths of `find_nearest` and `truncate_data`."""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.wavl = np.round(np.sort(rng.uniform(1500, 1600, 500)), 1)  # with repeats
+        self.queries = np.concatenate([rng.uniform(1490, 1610, 500), self.wavl[:50],
+                                       (self.wavl[1:51] + self.wavl[:50]) / 2])
+        self.data = rng.normal(size=(4, self.wavl.size))
+
+    def test_find_nearest(self):
+        for grid in [self.wavl, self.wavl[::-1]]:
+            expected = [np.abs(grid - i).argmin() for i in self.queries]
+            np.testing.assert_array_equal(
+                analysis.find_nearest(grid, self.queries, assume_sorted=True), expected)
+            np.testing.assert_array_equal(analysis.find_nearest(grid, self.queries), expected)
+            self.assertEqual(analysis.find_nearest(grid, 1550.0, assume_sorted=True),
+                             np.abs(grid - 1550.0).argmin())
+
+    def test_truncate_data(self):
+        wavl, data = analysis.truncate_data(self.wavl, self.data, 1520, 1540.5,
+                                            assume_sorted=True)
+        mask = (self.wavl >= 1520) & (self.wavl <= 1540.5)
+        np.testing.assert_array_equal(wavl, self.wavl[mask])
+        np.testing.assert_array_equal(data, self.data[:, mask])
+        self.assertTrue(np.shares_memory(data, self.data))
+        wavl_copy, data_copy = analysis.truncate_data(self.wavl, self.data[1], 1520, 1540.5)
+        np.testing.assert_array_equal(data_copy, data[1])
+
+        ranges = analysis.truncate_data(self.wavl, self.data, [1500, 1550, 1700],
+                                        [1510, 1600, 1800], assume_sorted=True)
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual(ranges[2][1].shape, (4, 0))
+        np.testing.assert_array_equal(ranges[0][0], self.wavl[self.wavl <= 1510])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""Tests for the `siepic_analysis_package.cache` module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from siepic_analysis_package import analysis, cache, core
+from tests.test_analysis import CSV_PCM, EXAMPLES
+
+
+class TestParseCache(unittest.TestCase):
+    """Tests for `cache.ParseCache`."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.default = cache.parse_cache
+        cache.parse_cache = cache.ParseCache(os.path.join(self.tmp, 'cache'))
+
+    def tearDown(self):
+        cache.parse_cache = self.default
+        shutil.rmtree(self.tmp)
+
+    def test_processCSV_roundtrip(self):
+        cold = analysis.processCSV(CSV_PCM)
+        self.assertEqual(len(os.listdir(cache.parse_cache.directory)), 1)
+        warm = analysis.processCSV(CSV_PCM)
+        for field in ['deviceID', 'coordsGDS', 'sweepSpd', 'wavlStart', 'user']:
+            self.assertEqual(getattr(warm, field), getattr(cold, field))
+        np.testing.assert_array_equal(warm.wavl, cold.wavl)
+        np.testing.assert_array_equal(warm.pwr, cold.pwr)
+
+    def test_parse_response_roundtrip(self):
+        mat = os.path.join(EXAMPLES, 'parse_response', 'MZI_data.mat')
+        cold = core.parse_response(mat, 0, use_cache=False)
+        core.parse_response(mat, 0)
+        warm = core.parse_response(mat, 0)
+        np.testing.assert_array_equal(warm[0], cold[0])
+        np.testing.assert_array_equal(warm[1], cold[1])
+
+    def test_opt_out(self):
+        analysis.processCSV(CSV_PCM, use_cache=False)
+        self.assertFalse(os.path.exists(cache.parse_cache.directory))
+
+    def test_key_invalidation(self):
+        path = os.path.join(self.tmp, 'device.csv')
+        shutil.copy(CSV_PCM, path)
+        key = cache.parse_cache.key(path, 'processCSV-1')
+        self.assertNotEqual(key, cache.parse_cache.key(path, 'processCSV-2'))
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertNotEqual(key, cache.parse_cache.key(path, 'processCSV-1'))
+
+    def test_lru_eviction(self):
+        parse_cache = cache.parse_cache
+        parse_cache.store('a', {}, {'x': np.zeros(1000)})
+        entry_size = os.path.getsize(os.path.join(parse_cache.directory, 'a.npz'))
+        parse_cache.max_size = 2 * entry_size
+        os.utime(os.path.join(parse_cache.directory, 'a.npz'), (0, 0))
+        parse_cache.store('b', {}, {'x': np.ones(1000)})
+        os.utime(os.path.join(parse_cache.directory, 'b.npz'), (1, 1))
+        parse_cache.load('a')  # a becomes the most recently used entry
+        parse_cache.store('c', {}, {'x': np.ones(1000)})
+        self.assertEqual(sorted(os.listdir(parse_cache.directory)), ['a.npz', 'c.npz'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""Tests for the `siepic_analysis_package.core` module."""
+
+import unittest
+
+import numpy as np
+from scipy.signal import savgol_filter
+
+from siepic_analysis_package import core
+
+
+class TestSmooth(unittest.TestCase):
+    """Tests for `core.smooth`."""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.x = np.linspace(1500, 1600, 5001)
+        self.y = np.sin(self.x / 2) + rng.normal(0, 0.1, (4, self.x.size))
+
+    def test_reference(self):
+        delta = self.x[1] - self.x[0]
+        for window, order, deriv in [(51, 5, 0), (210, 3, 0), (211, 3, 1), (7, 6, 0)]:
+            expected = savgol_filter(self.y, window, order, deriv=deriv, delta=delta)
+            for method in ['direct', 'fft', 'auto']:
+                if method == 'fft' and window % 2 == 0:
+                    continue
+                result = core.smooth(self.x, self.y, window, order, deriv=deriv,
+                                     method=method)
+                np.testing.assert_allclose(result, expected, rtol=0,
+                                           atol=1e-10 * np.abs(expected).max())
+
+    def test_axis(self):
+        result = core.smooth(self.x, self.y.T, window=51, axis=0)
+        np.testing.assert_allclose(result.T, core.smooth(self.x, self.y, window=51))
+        single = core.smooth(self.x, self.y[2], window=51)
+        self.assertEqual(single.shape, self.x.shape)
+        np.testing.assert_allclose(single, result[:, 2])
+
+    def test_nan(self):
+        y = self.y[0, :2001].copy()
+        y[1000] = np.nan
+        expected = savgol_filter(y, 101, 3)
+        result = core.smooth(self.x[:2001], y, window=101, order=3)
+        np.testing.assert_array_equal(np.isnan(result), np.isnan(expected))
+        self.assertEqual(np.isnan(result).sum(), 101)
+        finite = np.isfinite(expected)
+        np.testing.assert_allclose(result[finite], expected[finite], rtol=0, atol=1e-10)
+
+    def test_kernel_cache(self):
+        core.smooth(self.x, self.y, window=31, order=3)
+        hits = core._savgol_kernel.cache_info().hits
+        core.smooth(self.x, self.y[0], window=31, order=3)
+        self.assertEqual(core._savgol_kernel.cache_info().hits, hits + 1)
+        with self.assertRaises(ValueError):
+            core.smooth(self.x, self.y, window=30, method='fft')
+
+
+if __name__ == '__main__':
+    unittest.main()
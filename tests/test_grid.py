@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""Tests for the `siepic_analysis_package.grid` module."""
+
+import pickle
+import unittest
+
+import numpy as np
+
+from siepic_analysis_package import analysis
+from siepic_analysis_package.grid import WavelengthGrid
+
+from tests.test_analysis import CSV_PCM
+
+
+class TestWavelengthGrid(unittest.TestCase):
+    """Tests for `grid.WavelengthGrid`."""
+
+    def test_interning(self):
+        grid = WavelengthGrid(1500.0, 0.01, 1001, 2)
+        self.assertIs(WavelengthGrid(1500, 0.01, 1001, 2), grid)
+        self.assertIsNot(WavelengthGrid(1500.0, 0.01, 1001), grid)
+        self.assertIs(pickle.loads(pickle.dumps(grid)), grid)
+        self.assertEqual(len({grid, WavelengthGrid(1500.0, 0.01, 1001, 2)}), 1)
+
+    def test_from_array(self):
+        wavl = np.round(1260.08 + 0.08 * np.arange(1463), 2)  # decimals in a file
+        grid = WavelengthGrid.from_array(wavl)
+        self.assertIsNotNone(grid)
+        np.testing.assert_array_equal(grid, wavl)
+        self.assertEqual(grid[5], wavl[5])
+        self.assertEqual(grid[-1], wavl[-1])
+        self.assertIs(WavelengthGrid.from_array(wavl.copy()), grid)
+        self.assertIsNone(WavelengthGrid.from_array(np.sort(np.random.rand(100))))
+        self.assertIsNone(WavelengthGrid.from_array([1.0]))
+
+    def test_array_behaviour(self):
+        wavl = np.linspace(1500, 1600, 101)
+        grid = WavelengthGrid.from_array(wavl)
+        self.assertEqual(grid.size, 101)
+        self.assertEqual(grid.shape, (101,))
+        np.testing.assert_array_equal(grid * 1e-9, wavl * 1e-9)
+        np.testing.assert_array_equal(np.mean(grid), np.mean(wavl))
+        np.testing.assert_array_equal(grid[10:20], wavl[10:20])
+        self.assertIs(np.asarray(grid, dtype=float), grid.values)
+        with self.assertRaises(ValueError):
+            grid.values[0] = 0
+        with self.assertRaises(TypeError):
+            grid[:] = wavl
+        copy = np.array(grid)
+        copy *= 1e-9
+        np.testing.assert_array_equal(grid, wavl)
+        np.testing.assert_array_equal(copy, wavl * 1e-9)
+
+    def test_index_and_truncate(self):
+        wavl = np.round(1457 + 0.008 * np.arange(15751), 3)
+        grid = WavelengthGrid.from_array(wavl)
+        for value in np.concatenate([np.linspace(1450, 1590, 307), wavl[::997],
+                                     wavl[:40:7] + 0.004]):
+            self.assertEqual(grid.index(value), np.abs(wavl - value).argmin())
+            self.assertEqual(analysis.find_nearest(grid, value),
+                             np.abs(wavl - value).argmin())
+            mask = (wavl >= value) & (wavl <= value + 2.5)
+            np.testing.assert_array_equal(wavl[grid.truncate(value, value + 2.5)],
+                                          wavl[mask])
+        for value in [np.nan, np.inf, -np.inf]:
+            self.assertEqual(grid.index(value), np.abs(wavl - value).argmin())
+            self.assertEqual(analysis.find_nearest(grid, value), 0)
+        np.testing.assert_array_equal(analysis.find_nearest(grid, [np.nan, wavl[9]]),
+                                      [0, 9])
+        pwr = np.random.rand(3, wavl.size)
+        x, y = analysis.truncate_data(grid, pwr, 1500, 1510)
+        mask = (wavl >= 1500) & (wavl <= 1510)
+        np.testing.assert_array_equal(x, wavl[mask])
+        np.testing.assert_array_equal(y, pwr[:, mask])
+        self.assertTrue(np.shares_memory(y, pwr))
+
+    def test_processCSV(self):
+        device = analysis.processCSV(CSV_PCM)
+        self.assertIsInstance(device.wavl, WavelengthGrid)
+        self.assertIs(analysis.processCSV(CSV_PCM, use_cache=False).wavl, device.wavl)
+        self.assertEqual(device.wavl[0], device.wavlStart)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,518 @@
+#!/usr/bin/env python
+
+"""Tests for the `siepic_analysis_package.lumerical` module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from siepic_analysis_package import lumerical
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), '..', 'examples')
+DAT_GC = os.path.join(EXAMPLES, 's_param_file', 'grating_coupler.dat')
+
+
+def read_blocks(path):
+    """Reference: data rows of every dataset, parsed line by line."""
+    with open(path) as f:
+        lines = [line.strip() for line in f]
+    blocks = []
+    for i, line in enumerate(lines):
+        if line.startswith('("'):
+            num_points = int(lines[i + 1].strip('()').split(',')[0])
+            blocks.append([[float(v) for v in row.split()]
+                           for row in lines[i + 2:i + 2 + num_points]])
+    return blocks
+
+
+class TestProcessDat(unittest.TestCase):
+    """Tests for `lumerical.process_dat`."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, text, name='component.dat'):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w', newline='') as f:
+            f.write(text)
+        return path
+
+    def test_reference(self):
+        spar = lumerical.process_dat(DAT_GC, verbose=False)
+        self.assertEqual(spar.name, 'grating_coupler.dat')
+        self.assertEqual([(p.name, p.direction) for p in spar.ports],
+                         [('port 1', 'LEFT'), ('port 2', 'RIGHT')])
+        self.assertEqual([d.idn for d in spar.data], ['11_11', '12_11', '21_11', '22_11'])
+        self.assertEqual(spar.data[1].group_delay, '3.8277940284508814e-13')
+        for data, rows in zip(spar.data, read_blocks(DAT_GC)):
+            self.assertIsInstance(data.f, np.ndarray)
+            np.testing.assert_array_equal(np.column_stack([data.f, data.s_mag, data.s_phase]),
+                                          rows)
+
+    def test_line_endings(self):
+        text = ('["port 1","LEFT"]\r\n'
+                '("port 1","TE",1,"port 1",1,"transmission",1e-14)\r\n'
+                '(2, 3)\r\n1.5e14 0.5 -1\r\n1.6e14 0.25 2')
+        spar = lumerical.process_dat(self.write(text), verbose=False)
+        np.testing.assert_array_equal(spar.data[0].f, [1.5e14, 1.6e14])
+        np.testing.assert_array_equal(spar.data[0].s_phase, [-1, 2])
+
+    def test_empty(self):
+        self.assertEqual(lumerical.process_dat(self.write(''), verbose=False).data, [])
+
+    def test_malformed(self):
+        header = '("port 1","TE",1,"port 1",1,"transmission",1e-14)\n'
+        for block in ['(3, 3)\n1 2 3\n4 5 6\n', '(2, 3)\n1 2 3\n4 x 6\n', '(2, 3)\n1 2 3\n4 5\n']:
+            with self.assertRaises(ValueError):
+                lumerical.process_dat(self.write(header + block), verbose=False)
+
+    def test_lazy(self):
+        eager = lumerical.process_dat(DAT_GC, verbose=False)
+        spar = lumerical.process_dat(DAT_GC, verbose=False, lazy=True)
+        self.assertEqual([d.idn for d in spar.data], [d.idn for d in eager.data])
+        self.assertFalse(any(d.loaded for d in spar.data))
+        np.testing.assert_array_equal(spar.S(2, 1).s_mag, eager.S(2, 1).s_mag)
+        self.assertEqual([d.loaded for d in spar.data], [False, True, False, False])
+        np.testing.assert_array_equal(spar.to_array(), eager.to_array())
+
+    def test_lazy_malformed(self):
+        header = '("port 1","TE",1,"port 1",1,"transmission",1e-14)\n'
+        path = self.write(header + '(2, 3)\n1 2 3\n4 x 6\n')
+        spar = lumerical.process_dat(path, verbose=False, lazy=True)
+        with self.assertRaises(ValueError):
+            spar.data[0].f
+        with self.assertRaises(ValueError):
+            lumerical.process_dat(self.write(header + '(3, 3)\n1 2 3\n'), verbose=False, lazy=True)
+        self.assertEqual(lumerical.process_dat(self.write(''), verbose=False, lazy=True).data, [])
+
+
+def make_sparameters(ports=3, modes=2, points=5):
+    """Component with every (port, mode) pair, entry values tagged by key."""
+    spar = lumerical.sparameters('component')
+    f = np.linspace(1.8e14, 2.0e14, points)
+    for out_port in range(1, ports + 1):
+        for in_port in range(1, ports + 1):
+            for out_mode in range(1, modes + 1):
+                for in_mode in range(1, modes + 1):
+                    tag = 1000 * out_port + 100 * in_port + 10 * out_mode + in_mode
+                    spar.add_data('port %d' % in_port, 'port %d' % out_port, 'TE',
+                                  str(in_mode), str(out_mode), 'transmission', '0',
+                                  f, np.full(points, tag / 1e4), np.zeros(points))
+    return spar
+
+
+class TestSparametersIndex(unittest.TestCase):
+    """Tests for the `lumerical.sparameters` entry index."""
+
+    def test_lookup(self):
+        spar = make_sparameters()
+        for d in spar.data:
+            out_port, in_port = int(d.out_port[-1]), int(d.in_port[-1])
+            entry = spar.S(in_port=in_port, out_port=out_port,
+                           in_modeid=int(d.in_modeid), out_modeid=int(d.out_modeid))
+            self.assertIs(entry, d)
+            self.assertIs(spar.S(in_port=d.in_port, out_port=d.out_port,
+                                 in_modeid=d.in_modeid, out_modeid=d.out_modeid), d)
+        with self.assertLogs(lumerical.logger, level='WARNING'):
+            self.assertIsNone(spar.S(in_port=4))
+
+    def test_multi_digit_ports(self):
+        spar = lumerical.sparameters('component')
+        for out_port, in_port in [(1, 12), (11, 2)]:
+            spar.add_data('port %d' % in_port, 'port %d' % out_port, 'TE', '1', '1',
+                          'transmission', '0', [1.0], [out_port], [in_port])
+        self.assertIs(spar.S(in_port=12, out_port=1), spar.data[0])
+        self.assertIs(spar.S(in_port=2, out_port=11), spar.data[1])
+
+    def test_many(self):
+        spar = make_sparameters()
+        keys = [(2, 1, 1, 2), (3, 3, 2, 2), (1, 2, 1, 1)]
+        entries = spar.S_many(keys)
+        self.assertEqual([e.s_mag[0] for e in entries], [0.2112, 0.3322, 0.1211])
+        self.assertEqual(len(spar.S_many()), len(spar.data))
+        with self.assertLogs(lumerical.logger, level='WARNING'):
+            self.assertEqual(spar.S_many([(4, 1, 1, 1), (1, 1, 1, 1)])[0], None)
+
+    def test_direct_data_changes(self):
+        spar = make_sparameters(ports=1, modes=1)
+        extra = lumerical.s([1.0], [0.5], [0.0], in_port='port 2', out_port='port 1',
+                            in_modeid='1', out_modeid='1')
+        spar.data.append(extra)
+        self.assertIs(spar.S(in_port=2), extra)
+        spar.data = spar.data[1:]
+        self.assertIsNone(spar.S_many([(1, 1, 1, 1)])[0])
+
+    def test_in_place_changes(self):
+        spar = make_sparameters(ports=2, modes=1)
+        spar.to_array()
+        other = lumerical.s([1.8e14], [0.5], [0.0], in_port='port 1', out_port='port 1',
+                            in_modeid='2', out_modeid='2')
+        old = spar.data[0]
+        spar.data[0] = other  # replaced entry
+        self.assertIsNone(spar.S_many([(1, 1, 1, 1)])[0])
+        self.assertIs(spar.S(in_modeid=2, out_modeid=2), other)
+        spar.data[0] = old
+        spar.data[1].out_port = 'port 3'  # entry whose ports changed
+        self.assertIs(spar.S(in_port=2, out_port=3), spar.data[1])
+        with self.assertLogs(lumerical.logger, level='WARNING'):
+            self.assertIsNone(spar.S(in_port=2, out_port=1))
+        spar.data[2].in_modeid = '2'
+        self.assertIs(spar.S_many([(2, 1, 1, 2)])[0], spar.data[2])
+        f, ports, modes = spar.array_axes()
+        self.assertEqual((sorted(ports), modes), ([1, 2, 3], [1, 2]))
+        del spar.data[3]
+        self.assertEqual(len(spar.S_many()), 3)
+
+    def test_miss_keeps_array(self):
+        spar = make_sparameters(ports=2, modes=1)
+        S = spar.to_array()
+        with self.assertLogs(lumerical.logger, level='WARNING'):
+            for _ in range(3):
+                self.assertIsNone(spar.S(in_port=5))
+            self.assertIsNone(spar.S_many([(1, 5, 1, 1)])[0])
+        self.assertIs(spar.to_array(), S)
+        # a change of another component's entry rebuilds the index, not the array
+        make_sparameters(ports=1, modes=1).data[0].out_port = 'port 2'
+        self.assertIs(spar.S(in_port=2, out_port=1), spar.data[1])
+        self.assertIs(spar.to_array(), S)
+
+
+class TestSparametersArray(unittest.TestCase):
+    """Tests for `lumerical.sparameters.to_array` and `from_array`."""
+
+    def test_to_array(self):
+        spar = make_sparameters(ports=3, modes=2)
+        S = spar.to_array()
+        f, ports, modes = spar.array_axes()
+        self.assertEqual(S.shape, (5, 3, 2, 3, 2))
+        self.assertEqual((ports, modes), ([1, 2, 3], [1, 2]))
+        for d in spar.data:
+            o, i = ports.index(int(d.out_port[-1])), ports.index(int(d.in_port[-1]))
+            om, im = modes.index(int(d.out_modeid)), modes.index(int(d.in_modeid))
+            np.testing.assert_array_equal(S[:, o, om, i, im],
+                                          d.s_mag * np.exp(1j * d.s_phase))
+        self.assertFalse(S.flags.writeable)
+
+    def test_cache(self):
+        spar = make_sparameters(ports=2, modes=1)
+        S = spar.to_array()
+        self.assertIs(spar.to_array(), S)
+        spar.add_data('port 3', 'port 1', 'TE', '1', '1', 'transmission', '0',
+                      spar.data[0].f, np.ones(5), np.zeros(5))
+        S = spar.to_array()
+        self.assertEqual(S.shape, (5, 3, 1, 3, 1))
+        np.testing.assert_array_equal(S[:, 0, 0, 2, 0], 1)
+        np.testing.assert_array_equal(S[:, 2, 0, 0, 0], 0)
+
+    def test_round_trip(self):
+        rng = np.random.default_rng(5)
+        S = rng.normal(size=(7, 3, 2, 3, 2)) + 1j * rng.normal(size=(7, 3, 2, 3, 2))
+        f = np.linspace(1.8e14, 2.0e14, 7)
+        spar = lumerical.sparameters.from_array(S, f, name='random')
+        self.assertEqual(len(spar.data), 36)
+        self.assertEqual([p.name for p in spar.ports], ['port 1', 'port 2', 'port 3'])
+        np.testing.assert_allclose(spar.to_array(), S, rtol=1e-14)
+        entry = spar.S(in_port=3, out_port=1, in_modeid=2, out_modeid=1)
+        np.testing.assert_allclose(entry.s_mag, np.abs(S[:, 0, 0, 2, 1]))
+
+    def test_reciprocal(self):
+        rng = np.random.default_rng(6)
+        S = rng.normal(size=(4, 3, 2, 3, 2)) + 1j * rng.normal(size=(4, 3, 2, 3, 2))
+        S = S + S.transpose(0, 3, 4, 1, 2)
+        spar = lumerical.sparameters.from_array(S, np.arange(4.0), reciprocal=True)
+        self.assertEqual(len(spar.data), 21)
+        np.testing.assert_allclose(spar.to_array(), S, rtol=1e-14)
+        self.assertIs(spar.S(in_port=1, out_port=3, in_modeid=2, out_modeid=1),
+                      spar.S(in_port=3, out_port=1, in_modeid=1, out_modeid=2))
+
+    def test_invalid(self):
+        spar = make_sparameters(ports=2, modes=1)
+        spar.data[1].f = spar.data[1].f * 2
+        with self.assertRaises(ValueError):
+            spar.to_array()
+        with self.assertRaises(ValueError):
+            lumerical.sparameters.from_array(np.zeros((3, 2, 1, 2)), np.arange(3.0))
+
+
+def random_tensor(rng, points=50, ports=2, modes=1):
+    shape = (points, ports, modes, ports, modes)
+    return 0.3 * (rng.normal(size=shape) + 1j * rng.normal(size=shape))
+
+
+class TestNetlist(unittest.TestCase):
+    """Tests for `lumerical.connect` and `lumerical.netlist`."""
+
+    def setUp(self):
+        self.rng = np.random.default_rng(7)
+        self.f = np.linspace(1.8e14, 2.0e14, 50)
+
+    def component(self, name, ports=2, modes=1):
+        return lumerical.sparameters.from_array(
+            random_tensor(self.rng, self.f.size, ports, modes), self.f, name=name)
+
+    def test_two_port_cascade(self):
+        a, b = self.component('a'), self.component('b')
+        S = lumerical.connect(a, 2, b, 'port 1').to_array()[:, :, 0, :, 0]
+        A, B = a.to_array()[:, :, 0, :, 0], b.to_array()[:, :, 0, :, 0]
+        loop = 1 - A[:, 1, 1] * B[:, 0, 0]
+        np.testing.assert_allclose(S[:, 1, 0], A[:, 1, 0] * B[:, 1, 0] / loop)
+        np.testing.assert_allclose(S[:, 0, 1], A[:, 0, 1] * B[:, 0, 1] / loop)
+        np.testing.assert_allclose(S[:, 0, 0], A[:, 0, 0] + A[:, 0, 1] * B[:, 0, 0] * A[:, 1, 0] / loop)
+        np.testing.assert_allclose(S[:, 1, 1], B[:, 1, 1] + B[:, 1, 0] * A[:, 1, 1] * B[:, 0, 1] / loop)
+
+    def test_multimode_star_matches_loop(self):
+        a, b = self.component('a', 3, 2), self.component('b', 3, 2)
+        joined = lumerical.connect(a, 2, b, 3)
+        # same circuit as one block diagonal component with an internal loop
+        both = np.zeros((self.f.size, 6, 2, 6, 2), dtype=complex)
+        both[:, :3, :, :3] = a.to_array()
+        both[:, 3:, :, 3:] = b.to_array()
+        block = lumerical.sparameters.from_array(both, self.f)
+        looped = lumerical.connect(block, 2, block, 6)
+        np.testing.assert_allclose(joined.to_array(), looped.to_array(), atol=1e-12)
+        self.assertEqual(len(joined.ports), 4)
+
+    def test_chain(self):
+        parts = [self.component('c%d' % i) for i in range(5)]
+        circuit = lumerical.netlist(parts, [((i, 2), (i + 1, 1)) for i in range(4)])
+        expected = parts[0]
+        for part in parts[1:]:
+            expected = lumerical.connect(expected, 2, part, 1)
+        np.testing.assert_allclose(circuit.to_array(), expected.to_array(), atol=1e-12)
+
+        named = lumerical.netlist({'gc_in': parts[0], 'wg': parts[1], 'gc_out': parts[2]},
+                                  [(('wg', 2), ('gc_out', 1)), (('gc_in', 2), ('wg', 1))],
+                                  external=[('gc_out', 2), ('gc_in', 1)])
+        reference = lumerical.connect(lumerical.connect(parts[0], 2, parts[1], 1), 2, parts[2], 1)
+        np.testing.assert_allclose(named.to_array()[:, ::-1, :, ::-1],
+                                   reference.to_array(), atol=1e-12)
+
+    def test_resampling(self):
+        # smooth responses known on two grids
+        def waveguide(f, name):
+            phase = 2 * np.pi * (f - f[0]) / 2e12
+            S = np.zeros((f.size, 2, 1, 2, 1), dtype=complex)
+            S[:, 1, 0, 0, 0] = S[:, 0, 0, 1, 0] = 0.9 * np.exp(1j * phase)
+            return lumerical.sparameters.from_array(S, f, name=name)
+        fine = np.linspace(1.79e14, 2.01e14, 4001)
+        a = waveguide(self.f, 'a')
+        b = waveguide(fine, 'b')
+        b_fine = b.to_array()
+        circuit = lumerical.connect(a, 2, b, 1)
+        np.testing.assert_array_equal(circuit.array_axes()[0], self.f)
+        t_b = np.interp(self.f, fine, np.unwrap(np.angle(b_fine[:, 1, 0, 0, 0])))
+        expected = a.to_array()[:, 1, 0, 0, 0] * 0.9 * np.exp(1j * t_b)
+        np.testing.assert_allclose(circuit.to_array()[:, 1, 0, 0, 0], expected, atol=1e-12)
+
+    def test_invalid(self):
+        a, b = self.component('a'), self.component('b')
+        with self.assertRaises(ValueError):
+            lumerical.netlist([a, b], [((0, 2), (1, 1)), ((0, 2), (1, 2))])
+        with self.assertRaises(ValueError):
+            lumerical.connect(a, 3, b, 1)
+        with self.assertRaises(ValueError):
+            lumerical.connect(a, 2, self.component('m', 2, 2), 1)
+        with self.assertRaises(ValueError):
+            lumerical.netlist([a, b], [((0, 2), (2, 1))])
+
+
+class TestToDat(unittest.TestCase):
+    """Tests for `lumerical.sparameters.to_dat` and `lumerical.S_param_file`."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_reproduces_file(self):
+        path = os.path.join(self.tmp, 'gc.dat')
+        lumerical.process_dat(DAT_GC, verbose=False).to_dat(path)
+        with open(path, 'rb') as a, open(DAT_GC, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_round_trip(self):
+        rng = np.random.default_rng(8)
+        f = np.linspace(1.8e14, 2.0e14, 101) + rng.uniform(size=101)
+        spar = lumerical.sparameters.from_array(random_tensor(rng, 101, 3, 2), f)
+        spar.data[0].group_delay = 1.2345678901234567e-13
+        path = os.path.join(self.tmp, 'component.dat')
+        spar.to_dat(path)
+        copy = lumerical.process_dat(path, verbose=False)
+        self.assertEqual([(p.name, p.direction) for p in copy.ports],
+                         [(p.name, p.direction) for p in spar.ports])
+        self.assertEqual(float(copy.data[0].group_delay), spar.data[0].group_delay)
+        for a, b in zip(copy.data, spar.data):
+            self.assertEqual((a.out_port, a.in_port, a.out_modeid, a.in_modeid, a.mode_label,
+                              a.data_type), (b.out_port, b.in_port, b.out_modeid, b.in_modeid,
+                                             b.mode_label, b.data_type))
+            np.testing.assert_array_equal(a.f, b.f)
+            np.testing.assert_array_equal(a.s_mag, b.s_mag)
+            np.testing.assert_array_equal(a.s_phase, b.s_phase)
+        np.testing.assert_array_equal(copy.to_array(), spar.to_array())
+
+    def test_reciprocal(self):
+        rng = np.random.default_rng(10)
+        S = random_tensor(rng, 20, 2, 2)
+        S = S + S.transpose(0, 3, 4, 1, 2)
+        spar = lumerical.sparameters.from_array(S, np.linspace(1.8e14, 2.0e14, 20),
+                                                reciprocal=True)
+        path = os.path.join(self.tmp, 'component.dat')
+        spar.to_dat(path)
+        copy = lumerical.process_dat(path, verbose=False)
+        self.assertEqual(len(copy.data), 16)
+        self.assertEqual(len({(d.idn, d.out_modeid, d.in_modeid) for d in copy.data}), 16)
+        np.testing.assert_allclose(copy.to_array(), S, rtol=1e-12, atol=1e-15)
+        np.testing.assert_array_equal(copy.to_array(), spar.to_array())
+
+    def test_S_param_file(self):
+        sparams = lumerical.S_param_file()
+        sparams.name = os.path.join(self.tmp, 'sparams')
+        sparams.wavl = [1500e-9, 1600e-9, 1e-9]
+        x = np.linspace(0, 1, sparams.npoints())
+        sparams.data = [[x * (i + 1) / 4, x * 0 + i] for i in range(4)]
+        sparams.write_S()
+        spar = lumerical.process_dat(sparams.name + '.dat', verbose=False)
+        self.assertEqual([d.idn for d in spar.data], ['11_11', '12_11', '21_11', '22_11'])
+        self.assertEqual(spar.data[0].group_delay, '')
+        np.testing.assert_array_equal(spar.data[2].s_mag, x * 3 / 4)
+        np.testing.assert_array_equal(spar.data[2].f, np.flip(299792458 / np.linspace(
+            1500e-9, 1600e-9, sparams.npoints())))
+
+
+class TestBinary(unittest.TestCase):
+    """Tests for the binary s-parameters files and .dat sidecars."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dat = os.path.join(self.tmp, 'gc.dat')
+        shutil.copy(DAT_GC, self.dat)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def assert_same(self, a, b):
+        self.assertEqual([(p.name, p.direction) for p in a.ports],
+                         [(p.name, p.direction) for p in b.ports])
+        for x, y in zip(a.data, b.data):
+            self.assertEqual((x.idn, x.mode_label, x.data_type, x.group_delay),
+                             (y.idn, y.mode_label, y.data_type, y.group_delay))
+            for field in ['f', 's_mag', 's_phase']:
+                np.testing.assert_array_equal(getattr(x, field), getattr(y, field))
+        self.assertEqual(len(a.data), len(b.data))
+
+    def test_round_trip(self):
+        rng = np.random.default_rng(9)
+        spar = lumerical.sparameters.from_array(random_tensor(rng, 20, 2, 2),
+                                                np.linspace(1.8e14, 2.0e14, 20))
+        path = os.path.join(self.tmp, 'component.siap')
+        spar.to_binary(path)
+        copy = lumerical.read_binary(path)
+        self.assertEqual(copy.name, spar.name)
+        self.assert_same(copy, spar)
+        # frequency points shared by all the datasets are stored once
+        self.assertLess(os.path.getsize(path), 16 * 2 * 20 * len(spar.data) + 4096)
+
+    def test_reciprocal(self):
+        rng = np.random.default_rng(11)
+        spar = lumerical.sparameters.from_array(random_tensor(rng, 20, 3, 1),
+                                                np.linspace(1.8e14, 2.0e14, 20), reciprocal=True)
+        path = os.path.join(self.tmp, 'component.siap')
+        spar.to_binary(path)
+        copy = lumerical.read_binary(path)
+        self.assertTrue(copy.reciprocal)
+        np.testing.assert_array_equal(copy.to_array(), spar.to_array())
+        self.assertFalse(lumerical.write_sidecar(self.dat).reciprocal)
+        self.assertFalse(lumerical.read_binary(self.dat + lumerical.SIDECAR_SUFFIX).reciprocal)
+
+    def test_lazy(self):
+        spar = lumerical.write_sidecar(self.dat)
+        lazy = lumerical.process_dat(self.dat, verbose=False)
+        self.assertEqual(lazy.name, 'gc.dat')
+        self.assertFalse(any(d.loaded for d in lazy.data))
+        entry = lazy.S(in_port=1, out_port=2)
+        self.assertFalse(entry.loaded)
+        np.testing.assert_array_equal(entry.s_mag, spar.S(in_port=1, out_port=2).s_mag)
+        self.assertEqual([d.loaded for d in lazy.data], [False, False, True, False])
+        entry.s_mag = entry.s_mag * 2
+        np.testing.assert_array_equal(entry.s_mag, 2 * spar.data[2].s_mag)
+        self.assert_same(lumerical.process_dat(self.dat, verbose=False), spar)
+
+    def test_stale_sidecar(self):
+        lumerical.write_sidecar(self.dat)
+        with open(self.dat, 'a') as f:
+            f.write('\n')
+        spar = lumerical.process_dat(self.dat, verbose=False)
+        self.assertNotIsInstance(spar.data[0], lumerical._lazy_s)
+
+        with open(self.dat + lumerical.SIDECAR_SUFFIX, 'wb') as f:
+            f.write(b'corrupt')
+        spar = lumerical.process_dat(self.dat, verbose=False)
+        self.assertNotIsInstance(spar.data[0], lumerical._lazy_s)
+        with self.assertRaises(ValueError):
+            lumerical.read_binary(self.dat + lumerical.SIDECAR_SUFFIX)
+
+    def test_disabled(self):
+        lumerical.write_sidecar(self.dat)
+        spar = lumerical.process_dat(self.dat, verbose=False, use_sidecar=False)
+        self.assertNotIsInstance(spar.data[0], lumerical._lazy_s)
+
+
+class TestSparametersResample(unittest.TestCase):
+    """Tests for `lumerical.sparameters.resample`."""
+
+    def setUp(self):
+        self.spar = lumerical.process_dat(DAT_GC, verbose=False)
+        f = np.asarray(self.spar.data[0].f)
+        self.f_new = np.linspace(f.min(), f.max(), 37)
+
+    def test_linear(self):
+        spar = self.spar.resample(self.f_new)
+        self.assertEqual([d.idn for d in spar.data], [d.idn for d in self.spar.data])
+        self.assertEqual([p.name for p in spar.ports], [p.name for p in self.spar.ports])
+        for new, old in zip(spar.data, self.spar.data):
+            order = np.argsort(old.f)
+            f = np.asarray(old.f)[order]
+            np.testing.assert_array_equal(new.f, self.f_new)
+            np.testing.assert_allclose(new.s_mag, np.interp(self.f_new, f, np.asarray(old.s_mag)[order]),
+                                       rtol=1e-12, atol=1e-15)
+            np.testing.assert_allclose(
+                new.s_phase, np.interp(self.f_new, f, np.unwrap(np.asarray(old.s_phase)[order])),
+                rtol=1e-12, atol=1e-12)
+        self.assertEqual(spar.to_array().shape, (37, 2, 1, 2, 1))
+
+    def test_nearest_and_fill(self):
+        f = np.asarray(self.spar.data[0].f)
+        spar = self.spar.resample(f[[3, 0, 5]], kind='nearest')
+        np.testing.assert_array_equal(spar.data[0].s_mag, np.asarray(self.spar.data[0].s_mag)[[3, 0, 5]])
+        spar = self.spar.resample([f.min() - 1, f.max()])
+        self.assertTrue(np.isnan(spar.data[0].s_mag[0]))
+        self.assertFalse(np.isnan(spar.data[0].s_mag[1]))
+        with self.assertRaises(ValueError):
+            self.spar.resample(self.f_new, kind='cubic')
+
+    def test_stencil_cache(self):
+        f = np.asarray(self.spar.data[0].f, dtype=float)
+        self.spar.resample(self.f_new)
+        stencil = lumerical._stencil(f, self.f_new)
+        self.assertIs(lumerical._stencil(f.copy(), self.f_new.copy()), stencil)
+        self.assertIsNot(lumerical._stencil(f, self.f_new, 'nearest'), stencil)
+
+    def test_mixed_grids(self):
+        spar = make_sparameters(ports=2, modes=1, points=5)
+        spar.data[1].f = np.linspace(1.7e14, 2.1e14, 9)
+        spar.data[1].s_mag = np.linspace(0, 1, 9)
+        spar.data[1].s_phase = np.zeros(9)
+        new = spar.resample(np.linspace(1.8e14, 2.0e14, 3))
+        np.testing.assert_allclose(new.data[1].s_mag, [0.25, 0.5, 0.75])
+        np.testing.assert_allclose(new.data[0].s_mag, spar.data[0].s_mag[[0, 2, 4]])
+
+
+if __name__ == '__main__':
+    unittest.main()
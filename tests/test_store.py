@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""Tests for the `siepic_analysis_package.store` module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from siepic_analysis_package import analysis, store
+from tests.test_analysis import CSV_PCM, CUTBACK_ROOT
+
+
+class TestMeasurementStore(unittest.TestCase):
+    """Tests for `store.MeasurementStore`."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'wafer.siap')
+        self.devices, _ = analysis.load_directory(CUTBACK_ROOT,
+                                                  prefix='strip2rib_', workers=1)
+        self.devices.append(analysis.processCSV(CSV_PCM))
+        with store.MeasurementStore(self.path, mode='a') as mstore:
+            mstore.extend(self.devices)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_roundtrip(self):
+        mstore = store.MeasurementStore(self.path)
+        self.assertEqual(len(mstore), 4)
+        for device, stored in zip(self.devices, mstore):
+            self.assertEqual(stored.deviceID, device.deviceID)
+            self.assertEqual(stored.wavlStep, device.wavlStep)
+            np.testing.assert_array_equal(stored.wavl, device.wavl)
+            np.testing.assert_array_equal(stored.pwr, device.pwr)
+        self.assertIsInstance(mstore[3].pwr, np.memmap)
+
+    def test_append_reopen(self):
+        with store.MeasurementStore(self.path, mode='a') as mstore:
+            mstore.append(self.devices[0])
+            self.assertEqual(len(mstore), 5)
+        mstore = store.MeasurementStore(self.path)
+        np.testing.assert_array_equal(mstore[4].pwr, self.devices[0].pwr)
+        with self.assertRaises(IOError):
+            mstore.append(self.devices[0])
+
+    def test_truncated_index(self):
+        with open(self.path + '.idx', 'ab') as f:
+            f.write(b'partial')
+        self.assertEqual(len(store.MeasurementStore(self.path)), 4)
+
+    def test_interrupted_append(self):
+        sizes = [os.path.getsize(self.path + ext) for ext in ['', '.meta', '.idx']]
+        # data and metadata written, index record cut short
+        with store.MeasurementStore(self.path, mode='a') as mstore:
+            mstore.append(self.devices[0])
+        for ext, size in zip(['', '.meta', '.idx'], sizes):
+            with open(self.path + ext, 'r+b') as f:
+                f.truncate(size + (7 if ext == '.idx' else 100))
+        mstore = store.MeasurementStore(self.path)
+        self.assertEqual(len(mstore), 4)
+        # complete index record of missing data
+        with open(self.path + '.idx', 'r+b') as f:
+            f.truncate(sizes[2])
+            f.seek(0, os.SEEK_END)
+            f.write(np.array([(10**9, 10, 0, 10)], dtype=store._RECORD).tobytes())
+        self.assertEqual(len(store.MeasurementStore(self.path)), 4)
+
+        with store.MeasurementStore(self.path, mode='a') as mstore:
+            self.assertEqual([os.path.getsize(self.path + ext) for ext in ['', '.meta', '.idx']],
+                             sizes)
+            mstore.extend(self.devices)
+        mstore = store.MeasurementStore(self.path)
+        self.assertEqual(len(mstore), 8)
+        for device, stored in zip(self.devices, [mstore[i] for i in range(4, 8)]):
+            self.assertEqual(stored.deviceID, device.deviceID)
+            np.testing.assert_array_equal(stored.pwr, device.pwr)
+        self.assertEqual(mstore[-1].deviceID, self.devices[-1].deviceID)
+        self.assertEqual(len(mstore.index), 8)
+        with self.assertRaises(IndexError):
+            mstore[8]
+
+    def test_select(self):
+        mstore = store.MeasurementStore(self.path)
+        indices = mstore.where(deviceID=lambda i: i.startswith('strip2rib_'))
+        np.testing.assert_array_equal(indices, [0, 1, 2])
+        mset = mstore.to_set(indices)
+        self.assertEqual(mset.pwr.shape, (3,) + self.devices[0].pwr.shape)
+
+
+if __name__ == '__main__':
+    unittest.main()